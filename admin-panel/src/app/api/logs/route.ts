@@ -15,11 +15,16 @@ export async function GET(request: Request) {
 
     const { searchParams } = new URL(request.url);
     const service = searchParams.get('service') || 'bot';
-    const lines = searchParams.get('lines') || '100';
+    const params = new URLSearchParams({ lines: searchParams.get('lines') || '100' });
+    // Зміщення для дочитування нових/старіших рядків та фільтр
+    for (const key of ['after', 'before', 'grep']) {
+      const value = searchParams.get(key);
+      if (value) params.set(key, value);
+    }
 
     const API_URL = process.env.API_INTERNAL_URL || 'http://localhost:8001';
     
-    const response = await fetch(`${API_URL}/api/logs/${service}?lines=${lines}`, {
+    const response = await fetch(`${API_URL}/api/logs/${service}?${params}`, {
       headers: {
         'Authorization': `Bearer ${token}`,
         'Content-Type': 'application/json'
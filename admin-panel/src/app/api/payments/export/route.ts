@@ -15,7 +15,7 @@ export async function GET(request: NextRequest) {
     }
 
     // Робимо запит до FastAPI
-    const url = `${API_BASE_URL}/api/payments/export`;
+    const url = `${API_BASE_URL}/api/payments/export${request.nextUrl.search}`;
     
     console.log('Making request to FastAPI payments export:', url);
     
@@ -33,13 +33,18 @@ export async function GET(request: NextRequest) {
       throw new Error(errorData.detail || `HTTP ${apiResponse.status}`);
     }
 
-    // Повертаємо файл
-    const blob = await apiResponse.blob();
+    // Передаємо файл потоком, не буферизуючи його в пам'яті
     const headers = new Headers();
-    headers.set('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet');
-    headers.set('Content-Disposition', `attachment; filename="payments_${new Date().toISOString().split('T')[0]}.xlsx"`);
-
-    return new NextResponse(blob, {
+    headers.set(
+      'Content-Type',
+      apiResponse.headers.get('Content-Type') || 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    );
+    headers.set(
+      'Content-Disposition',
+      apiResponse.headers.get('Content-Disposition') || `attachment; filename="payments_${new Date().toISOString().split('T')[0]}.xlsx"`
+    );
+
+    return new NextResponse(apiResponse.body, {
       status: 200,
       headers,
     });
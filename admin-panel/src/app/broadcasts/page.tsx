@@ -36,10 +36,49 @@ interface Broadcast {
   failed_count: number;
   created_at: string;
   created_by_username: string;
-  error_log?: string;
-  full_log?: string;
+  error_counts?: Record<string, number>;
 }
 
+interface Delivery {
+  id: number;
+  telegram_id: number;
+  status: string;
+  error_code?: string;
+  error_message?: string;
+  sent_at?: string;
+}
+
+interface BroadcastProgress {
+  sent: number;
+  failed: number;
+  in_flight: number;
+  remaining: number;
+  recipients_per_second: number;
+  messages_per_second: number;
+  eta_seconds: number | null;
+  retry_after_pauses: number;
+  paused_for: number;
+}
+
+const DELIVERIES_PAGE_SIZE = 500;
+const PROGRESS_REFRESH_MS = 3000;
+
+// Прев'ю завантаженого зображення (API створює його при завантаженні); для зовнішніх URL - як є
+const imagePreviewUrl = (url: string) => {
+  if (!url.startsWith('/uploads/broadcasts/')) return url;
+  const filename = url.split('/').pop() || '';
+  const stem = filename.includes('.') ? filename.slice(0, filename.lastIndexOf('.')) : filename;
+  return `/api/uploads/broadcasts/variants/${stem}_preview.jpg`;
+};
+
+// Файли, завантажені до появи прев'ю, показуємо в оригіналі
+const fallbackToOriginal = (url: string) => (e: React.SyntheticEvent<HTMLImageElement>) => {
+  const original = url.startsWith('/uploads') ? `/api${url}` : url;
+  if (e.currentTarget.src !== new URL(original, window.location.origin).href) {
+    e.currentTarget.src = original;
+  }
+};
+
 export default function BroadcastsPage() {
   const [stats, setStats] = useState<BroadcastStats | null>(null);
   const [broadcasts, setBroadcasts] = useState<Broadcast[]>([]);
@@ -63,16 +102,57 @@ export default function BroadcastsPage() {
   
   // Error log modal state
   const [showErrorModal, setShowErrorModal] = useState(false);
-  const [errorLogContent, setErrorLogContent] = useState<string>('');
   
   // Full log modal state
   const [showFullLogModal, setShowFullLogModal] = useState(false);
-  const [fullLogContent, setFullLogContent] = useState<string>('');
+  
+  // Delivery log state (завантажується посторінково з /deliveries)
+  const [logBroadcast, setLogBroadcast] = useState<Broadcast | null>(null);
+  const [deliveries, setDeliveries] = useState<Delivery[]>([]);
+  const [nextAfterId, setNextAfterId] = useState<number | null>(null);
+  const [loadingDeliveries, setLoadingDeliveries] = useState(false);
+
+  // Live progress for broadcasts being sent
+  const [progressMap, setProgressMap] = useState<Record<number, BroadcastProgress>>({});
 
   useEffect(() => {
     loadData();
   }, [currentPage, itemsPerPage]);
 
+  useEffect(() => {
+    const processingIds = broadcasts.filter(b => b.status === 'processing').map(b => b.id);
+    if (processingIds.length === 0) {
+      return;
+    }
+
+    const refreshProgress = async () => {
+      const results = await Promise.all(processingIds.map(id =>
+        makeApiCall(`/api/broadcasts/${id}/progress`, { method: 'GET' }).catch(() => null)
+      ));
+      const updated: Record<number, BroadcastProgress> = {};
+      let finished = false;
+      results.forEach(result => {
+        if (!result) {
+          return;
+        }
+        if (result.progress) {
+          updated[result.id] = result.progress;
+        }
+        if (result.status !== 'processing') {
+          finished = true;
+        }
+      });
+      setProgressMap(prev => ({ ...prev, ...updated }));
+      if (finished) {
+        loadData();
+      }
+    };
+
+    refreshProgress();
+    const timer = setInterval(refreshProgress, PROGRESS_REFRESH_MS);
+    return () => clearInterval(timer);
+  }, [broadcasts]);
+
   const loadData = async () => {
     try {
       setLoading(true);
@@ -91,6 +171,70 @@ export default function BroadcastsPage() {
     }
   };
 
+  const loadDeliveries = async (broadcast: Broadcast, status?: string, afterId: number = 0) => {
+    try {
+      setLoadingDeliveries(true);
+      const params = new URLSearchParams({ after_id: String(afterId), limit: String(DELIVERIES_PAGE_SIZE) });
+      if (status) {
+        params.set('status', status);
+      }
+      const data = await makeApiCall(`/api/broadcasts/${broadcast.id}/deliveries?${params}`, { method: 'GET' });
+      const items: Delivery[] = data.deliveries || [];
+      setDeliveries(prev => afterId ? [...prev, ...items] : items);
+      setNextAfterId(data.next_after_id ?? null);
+    } catch (error) {
+      console.error('Error loading deliveries:', error);
+    } finally {
+      setLoadingDeliveries(false);
+    }
+  };
+
+  const openDeliveryLog = (broadcast: Broadcast, errorsOnly: boolean) => {
+    setLogBroadcast(broadcast);
+    setDeliveries([]);
+    setNextAfterId(null);
+    if (errorsOnly) {
+      setShowErrorModal(true);
+    } else {
+      setShowFullLogModal(true);
+    }
+    loadDeliveries(broadcast, errorsOnly ? 'failed' : undefined);
+  };
+
+  const formatDelivery = (delivery: Delivery) => {
+    if (delivery.status === 'sent') {
+      const sentAt = delivery.sent_at ? new Date(delivery.sent_at).toLocaleString('uk-UA') : '-';
+      return `✓ User ID: ${delivery.telegram_id} - Successfully sent at ${sentAt}`;
+    }
+    if (delivery.status === 'failed') {
+      return `✗ User ID: ${delivery.telegram_id} - Failed [${delivery.error_code || 'unknown'}]: ${delivery.error_message || ''}`;
+    }
+    return `… User ID: ${delivery.telegram_id} - ${delivery.status}`;
+  };
+
+  const formatProgress = (broadcast: Broadcast, progress?: BroadcastProgress) => {
+    if (!progress) {
+      return null;
+    }
+    const done = progress.sent + progress.failed;
+    const eta = progress.eta_seconds !== null
+      ? `~${Math.ceil(progress.eta_seconds / 60)} хв`
+      : '—';
+    const paused = progress.paused_for > 0 ? ` · пауза ${progress.paused_for}с` : '';
+    return `${done}/${broadcast.total_recipients} · ${progress.messages_per_second} msg/s · ETA ${eta}${paused}`;
+  };
+
+  const formatErrorCounts = (errorCounts?: Record<string, number>) => {
+    const entries = Object.entries(errorCounts || {});
+    if (entries.length === 0) {
+      return '';
+    }
+    return entries
+      .sort((a, b) => b[1] - a[1])
+      .map(([code, count]) => `${code}: ${count}`)
+      .join('\n') + '\n' + '='.repeat(50) + '\n\n';
+  };
+
   const handleFileUpload = async (file: File): Promise<{ url: string; type: string }> => {
     const formData = new FormData();
     formData.append('file', file);
@@ -356,6 +500,11 @@ export default function BroadcastsPage() {
                     </td>
                     <td className="admin-table__cell">
                       {getStatusBadge(broadcast.status)}
+                      {broadcast.status === 'processing' && progressMap[broadcast.id] && (
+                        <div style={{ fontSize: '12px', color: 'var(--color-text-secondary)', marginTop: '4px' }}>
+                          {formatProgress(broadcast, progressMap[broadcast.id])}
+                        </div>
+                      )}
                     </td>
                     <td className="admin-table__cell">{broadcast.total_recipients}</td>
                     <td className="admin-table__cell" style={{color: 'var(--color-success)'}}>{broadcast.sent_count}</td>
@@ -375,24 +524,18 @@ export default function BroadcastsPage() {
                         >
                           Переглянути
                         </button>
-                        {broadcast.full_log && (
+                        {broadcast.status !== 'pending' && (
                           <button
-                            onClick={() => {
-                              setFullLogContent(broadcast.full_log || '');
-                              setShowFullLogModal(true);
-                            }}
+                            onClick={() => openDeliveryLog(broadcast, false)}
                             className="admin-btn admin-btn--primary admin-btn--sm"
                             title="Переглянути повний лог розсилки"
                           >
                             Лог
                           </button>
                         )}
-                        {broadcast.failed_count > 0 && broadcast.error_log && (
+                        {broadcast.failed_count > 0 && (
                           <button
-                            onClick={() => {
-                              setErrorLogContent(broadcast.error_log || '');
-                              setShowErrorModal(true);
-                            }}
+                            onClick={() => openDeliveryLog(broadcast, true)}
                             className="admin-btn admin-btn--danger admin-btn--sm"
                             title="Переглянути помилки"
                           >
@@ -585,9 +728,8 @@ export default function BroadcastsPage() {
                                 backgroundColor: '#000'
                               }}>
                                 <img 
-                                  src={block.url.startsWith('/uploads') 
-                                    ? `/api${block.url}` 
-                                    : block.url}
+                                  src={imagePreviewUrl(block.url)}
+                                  onError={fallbackToOriginal(block.url)}
                                   alt="Preview"
                                   style={{
                                     width: '100%',
@@ -755,9 +897,8 @@ export default function BroadcastsPage() {
                           }}>
                             {selectedBroadcast.attachment_type === 'image' && (
                               <img 
-                                src={selectedBroadcast.attachment_url.startsWith('/uploads') 
-                                  ? `/api${selectedBroadcast.attachment_url}` 
-                                  : selectedBroadcast.attachment_url}
+                                src={imagePreviewUrl(selectedBroadcast.attachment_url)}
+                                onError={fallbackToOriginal(selectedBroadcast.attachment_url)}
                                 alt="Preview"
                                 style={{
                                   width: '100%',
@@ -1010,11 +1151,23 @@ export default function BroadcastsPage() {
                 whiteSpace: 'pre-wrap',
                 wordBreak: 'break-word'
               }}>
-                {fullLogContent || 'Немає даних про лог'}
+                {deliveries.length > 0
+                  ? deliveries.map(formatDelivery).join('\n')
+                  : (loadingDeliveries ? 'Завантаження...' : 'Немає даних про лог')}
               </div>
             </div>
 
             <div className="admin-modal__actions">
+              {nextAfterId !== null && logBroadcast && (
+                <button
+                  type="button"
+                  className="admin-btn admin-btn--primary"
+                  disabled={loadingDeliveries}
+                  onClick={() => loadDeliveries(logBroadcast, undefined, nextAfterId)}
+                >
+                  {loadingDeliveries ? 'Завантаження...' : 'Завантажити ще'}
+                </button>
+              )}
               <button
                 type="button"
                 className="admin-btn admin-btn--secondary"
@@ -1058,11 +1211,23 @@ export default function BroadcastsPage() {
                 whiteSpace: 'pre-wrap',
                 wordBreak: 'break-word'
               }}>
-                {errorLogContent || 'Немає даних про помилки'}
+                {deliveries.length > 0
+                  ? formatErrorCounts(logBroadcast?.error_counts) + deliveries.map(formatDelivery).join('\n')
+                  : (loadingDeliveries ? 'Завантаження...' : 'Немає даних про помилки')}
               </div>
             </div>
 
             <div className="admin-modal__actions">
+              {nextAfterId !== null && logBroadcast && (
+                <button
+                  type="button"
+                  className="admin-btn admin-btn--primary"
+                  disabled={loadingDeliveries}
+                  onClick={() => loadDeliveries(logBroadcast, 'failed', nextAfterId)}
+                >
+                  {loadingDeliveries ? 'Завантаження...' : 'Завантажити ще'}
+                </button>
+              )}
               <button
                 type="button"
                 className="admin-btn admin-btn--secondary"
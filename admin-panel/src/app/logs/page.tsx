@@ -1,6 +1,6 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import './logs.css';
 
 type ServiceType = 'bot' | 'api' | 'webhook' | 'admin' | 'system';
@@ -10,6 +10,10 @@ interface LogsData {
   service: string;
   logs: string[];
   total_lines: number;
+  start_offset?: number;
+  end_offset?: number;
+  has_more?: boolean;
+  reset?: boolean;
   file_path?: string;
   message?: string;
 }
@@ -45,6 +49,9 @@ export default function SystemLogs() {
   const [autoRefresh, setAutoRefresh] = useState(false);
   const [lines, setLines] = useState(100);
   const [page, setPage] = useState(1);
+  const [grep, setGrep] = useState('');
+  // Кінець уже показаних логів: авто-оновлення дочитує лише нові рядки
+  const endOffsetRef = useRef<number | null>(null);
 
   const services = [
     { id: 'system' as ServiceType, name: 'Автоматичні задачі' },
@@ -70,11 +77,14 @@ export default function SystemLogs() {
         setLogsData(null);
       } else {
         // Завантажуємо звичайні логи
-        const response = await fetch(`/api/logs?service=${service}&lines=${lines}`);
+        const params = new URLSearchParams({ service, lines: String(lines) });
+        if (grep) params.set('grep', grep);
+        const response = await fetch(`/api/logs?${params}`);
         if (!response.ok) {
           throw new Error('Failed to fetch logs');
         }
         const data = await response.json();
+        endOffsetRef.current = data.end_offset ?? null;
         setLogsData(data);
         setSystemLogsData(null);
       }
@@ -86,19 +96,50 @@ export default function SystemLogs() {
     }
   };
 
+  // Дочитати рядки, що з'явились після останнього запиту
+  const fetchNewLogs = async (service: ServiceType) => {
+    if (service === 'system' || endOffsetRef.current === null) {
+      return fetchLogs(service);
+    }
+
+    try {
+      const params = new URLSearchParams({
+        service,
+        lines: String(lines),
+        after: String(endOffsetRef.current)
+      });
+      if (grep) params.set('grep', grep);
+      const response = await fetch(`/api/logs?${params}`);
+      if (!response.ok) {
+        throw new Error('Failed to fetch logs');
+      }
+      const data: LogsData = await response.json();
+      endOffsetRef.current = data.end_offset ?? null;
+      setLogsData(prev => {
+        if (!prev || data.reset) return data;
+        const logs = [...prev.logs, ...data.logs].slice(-lines);
+        return { ...prev, logs, total_lines: logs.length, end_offset: data.end_offset };
+      });
+    } catch (err) {
+      console.error('Error fetching logs:', err);
+      setError('Помилка завантаження логів');
+    }
+  };
+
   useEffect(() => {
+    endOffsetRef.current = null;
     fetchLogs(activeTab);
-  }, [activeTab, lines, page]);
+  }, [activeTab, lines, page, grep]);
 
   useEffect(() => {
     if (autoRefresh) {
       const interval = setInterval(() => {
-        fetchLogs(activeTab);
+        fetchNewLogs(activeTab);
       }, 5000); // Оновлюємо кожні 5 секунд
 
       return () => clearInterval(interval);
     }
-  }, [autoRefresh, activeTab]);
+  }, [autoRefresh, activeTab, lines, grep]);
 
   const handleTabChange = (service: ServiceType) => {
     setActiveTab(service);
@@ -162,6 +203,16 @@ export default function SystemLogs() {
             </select>
           </label>
 
+          {activeTab !== 'system' && (
+            <input
+              type="text"
+              value={grep}
+              onChange={(e) => setGrep(e.target.value)}
+              placeholder="Фільтр рядків..."
+              className="admin-form__input"
+            />
+          )}
+
           <label className="logs-controls__checkbox">
             <input
               type="checkbox"
@@ -98,8 +98,7 @@ export interface Broadcast {
   status: 'draft' | 'sending' | 'sent';
   created_at: string;
   sent_count?: number;
-  error_log?: string;
-  full_log?: string;
+  error_counts?: Record<string, number>;
 }
 
 // Утиліти
@@ -0,0 +1,232 @@
+"""
+Фонові експорти користувачів і платежів: задача створюється запитом, файл пишеться
+в exports/ окремим потоком і зберігається export_artifact_ttl секунд.
+
+Повторний експорт з тими самими фільтрами отримує вже готовий файл (або задачу, що ще
+виконується), якщо відбиток даних таблиць (data_version) з того часу не змінився.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from api.exports import build_export_query, check_export_format, normalize_filters, write_export
+from config import settings
+from database.models import DatabaseManager, ExportJob, database_connection
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+EXPORTS_DIR = PROJECT_ROOT / "exports"
+
+# Таблиці, з яких читає кожен експорт
+EXPORT_TABLES = {
+    'users': ('users',),
+    'payments': ('payments', 'users'),
+}
+
+ACTIVE_STATUSES = ('pending', 'processing')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Пул потоків для експортів (створюється при першій задачі)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.export_workers),
+                    thread_name_prefix='export'
+                )
+    return _executor
+
+
+def filters_hash(filters: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def data_version(export: str) -> str:
+    """Відбиток даних таблиць експорту лише за індексованими агрегатами.
+
+    Нові рядки змінюють MAX(id) (первинний ключ), змінені - MAX(updated_at) (індекс
+    idx_*_updated; ORM оновлює колонку сам, raw-запити API - явно). Зміни, що не
+    оновлюють updated_at, але позначають статистику застарілою, ловить
+    stats_snapshots.invalidated_at. Видалення рядка з середини таблиці потрапить в
+    експорт після export_artifact_ttl.
+    """
+    columns = []
+    for table in EXPORT_TABLES[export]:
+        columns.append(f"(SELECT MAX(id) FROM {table}) AS {table}")
+        columns.append(f"(SELECT MAX(updated_at) FROM {table}) AS {table}_updated_at")
+    columns.append("(SELECT MAX(invalidated_at) FROM stats_snapshots) AS invalidated_at")
+    with database_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute(f"SELECT {', '.join(columns)}")
+            state = cursor.fetchone()
+        finally:
+            cursor.close()
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def serialize_job(job: ExportJob) -> Dict[str, Any]:
+    """Задача експорту для відповіді API"""
+    return {
+        'job_id': job.id,
+        'export': job.export_type,
+        'format': job.export_format,
+        'filters': json.loads(job.filters or '{}'),
+        'status': job.status,
+        'row_count': job.row_count,
+        'file_size': job.file_size,
+        'error_message': job.error_message,
+        'created_at': _isoformat(job.created_at),
+        'started_at': _isoformat(job.started_at),
+        'completed_at': _isoformat(job.completed_at),
+        'expires_at': _isoformat(job.expires_at),
+        'download_url': f"/api/exports/{job.id}/download" if job.status == 'completed' else None,
+    }
+
+
+def artifact_path(job: ExportJob) -> Optional[Path]:
+    """Файл готового експорту, якщо він ще існує"""
+    if job.status != 'completed' or not job.file_path:
+        return None
+    path = PROJECT_ROOT / job.file_path
+    return path if path.is_file() else None
+
+
+def create_export_job(export: str, export_format: str, filters: Optional[Dict[str, Any]],
+                      admin_id: Optional[int] = None) -> Tuple[Dict[str, Any], bool]:
+    """Створити задачу експорту або знайти існуючу для тих самих фільтрів і даних.
+
+    Повертає (задача, reused).
+    """
+    check_export_format(export_format)
+    filters = normalize_filters(export, filters)
+    build_export_query(export, filters)  # некоректні дати - 400 одразу, а не в задачі
+
+    hashed = filters_hash(filters)
+    version = data_version(export)
+    now = datetime.utcnow()
+
+    with DatabaseManager() as db:
+        candidates = db.query(ExportJob).filter(
+            ExportJob.export_type == export,
+            ExportJob.export_format == export_format,
+            ExportJob.filters_hash == hashed,
+            ExportJob.status.in_(ACTIVE_STATUSES + ('completed',)),
+            ExportJob.data_version == version
+        ).order_by(ExportJob.id.desc()).all()
+
+        for job in candidates:
+            if job.status in ACTIVE_STATUSES or (job.expires_at > now and artifact_path(job)):
+                return serialize_job(job), True
+
+        job = ExportJob(
+            created_by=admin_id,
+            export_type=export,
+            export_format=export_format,
+            filters=json.dumps(filters, sort_keys=True),
+            filters_hash=hashed,
+            data_version=version,
+            status='pending'
+        )
+        db.add(job)
+        db.flush()
+        result = serialize_job(job)
+
+    # Задача вже збережена (commit при виході з DatabaseManager), воркер її побачить
+    _get_executor().submit(run_export_job, result['job_id'])
+    return result, False
+
+
+def get_export_job(job_id: int) -> Optional[ExportJob]:
+    with DatabaseManager() as db:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if job:
+            db.expunge(job)
+        return job
+
+
+def _update_job(job_id: int, **values):
+    with DatabaseManager() as db:
+        db.query(ExportJob).filter(ExportJob.id == job_id).update(values, synchronize_session=False)
+
+
+def run_export_job(job_id: int):
+    """Виконати задачу експорту: файл пишеться у .part і перейменовується після завершення"""
+    with DatabaseManager() as db:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id, ExportJob.status == 'pending').first()
+        if not job:
+            return
+        job.status = 'processing'
+        job.started_at = datetime.utcnow()
+        export, export_format = job.export_type, job.export_format
+        filters = json.loads(job.filters or '{}')
+
+    EXPORTS_DIR.mkdir(exist_ok=True)
+    path = EXPORTS_DIR / f"{export}_{job_id}.{export_format}"
+    part_path = path.with_name(path.name + '.part')
+    try:
+        with open(part_path, 'wb') as target:
+            row_count = write_export(export, export_format, filters, target)
+        os.replace(part_path, path)
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}")
+        part_path.unlink(missing_ok=True)
+        _update_job(job_id, status='failed', error_message=str(e), completed_at=datetime.utcnow())
+        return
+
+    now = datetime.utcnow()
+    _update_job(
+        job_id,
+        status='completed',
+        file_path=str(path.relative_to(PROJECT_ROOT)),
+        file_size=path.stat().st_size,
+        row_count=row_count,
+        completed_at=now,
+        expires_at=now + timedelta(seconds=settings.export_artifact_ttl)
+    )
+    logger.info(f"Export job {job_id}: {export}.{export_format}, {row_count} rows")
+
+
+def cleanup_expired_exports() -> int:
+    """Видалити файли прострочених експортів (при старті API та щогодини з планувальника); повертає кількість"""
+    with DatabaseManager() as db:
+        expired = db.query(ExportJob).filter(
+            ExportJob.status == 'completed',
+            ExportJob.expires_at < datetime.utcnow()
+        ).all()
+        for job in expired:
+            if job.file_path:
+                (PROJECT_ROOT / job.file_path).unlink(missing_ok=True)
+            job.status = 'expired'
+        return len(expired)
+
+
+def recover_export_jobs():
+    """Після перезапуску API: незавершені задачі вже не виконаються, недописані файли видаляються"""
+    with DatabaseManager() as db:
+        db.query(ExportJob).filter(ExportJob.status.in_(ACTIVE_STATUSES)).update({
+            ExportJob.status: 'failed',
+            ExportJob.error_message: 'Interrupted by API restart',
+            ExportJob.completed_at: datetime.utcnow()
+        }, synchronize_session=False)
+
+    if EXPORTS_DIR.exists():
+        for part_path in EXPORTS_DIR.glob('*.part'):
+            part_path.unlink(missing_ok=True)
+    cleanup_expired_exports()
@@ -0,0 +1,258 @@
+"""
+Експорт користувачів і платежів у CSV / XLSX.
+
+Рядки читаються небуферизованим курсором порціями і одразу записуються у вихідний
+файл, тому пам'ять не залежить від розміру таблиці. CSV віддається потоком з першої
+порції; XLSX збирається openpyxl у write-only режимі в тимчасовий файл і віддається частинами.
+"""
+import csv
+import io
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from api.filters import build_users_filter, build_payments_filter
+from config import settings
+from database.models import database_connection, set_query_timeout
+
+# Скільки рядків читати з БД за раз
+EXPORT_BATCH_SIZE = 1000
+# Розмір частини файлу при відправці
+STREAM_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Колонка експорту: заголовок, ширина в XLSX, значення з рядка БД
+ExportColumn = namedtuple('ExportColumn', ['header', 'width', 'value'])
+
+USER_COLUMNS = (
+    ExportColumn('ID', 8, lambda row: row['id']),
+    ExportColumn('Telegram ID', 14, lambda row: row['telegram_id']),
+    ExportColumn('Username', 22, lambda row: row['username']),
+    ExportColumn("Ім'я", 20, lambda row: row['first_name']),
+    ExportColumn('Прізвище', 20, lambda row: row['last_name']),
+    ExportColumn('Статус', 12, lambda row: row['subscription_status'] or 'inactive'),
+    ExportColumn('Підписка активна', 18, lambda row: 'Так' if row['subscription_active'] == 1 else 'Ні'),
+    ExportColumn('Підписка до', 20, lambda row: row['subscription_end_date']),
+    ExportColumn('Дата реєстрації', 20, lambda row: row['created_at']),
+    ExportColumn('Останнє оновлення', 20, lambda row: row['updated_at']),
+)
+
+PAYMENT_COLUMNS = (
+    ExportColumn('ID', 8, lambda row: row['id']),
+    ExportColumn('User ID', 10, lambda row: row['user_id']),
+    ExportColumn('Telegram ID', 14, lambda row: row['telegram_id']),
+    ExportColumn('Username', 22, lambda row: row['username']),
+    ExportColumn("Ім'я користувача", 28, lambda row: f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()),
+    ExportColumn('Сума (EUR)', 12, lambda row: float(row['amount'] or 0)),  # Сума вже в євро
+    ExportColumn('Валюта', 8, lambda row: (row['currency'] or '').upper()),
+    ExportColumn('Статус', 12, lambda row: row['status']),
+    ExportColumn('Stripe Invoice ID', 32, lambda row: row['stripe_invoice_id']),
+    ExportColumn('Stripe Payment ID', 32, lambda row: row['stripe_payment_intent_id']),
+    ExportColumn('Дата створення', 20, lambda row: row['created_at']),
+    ExportColumn('Дата оплати', 20, lambda row: row['paid_at']),
+)
+
+# Опис експорту: назва аркуша, запит без WHERE/ORDER BY, сортування, колонки,
+# побудова WHERE з фільтрів та дозволені фільтри (ті ж, що у списках адмін-панелі)
+ExportSpec = namedtuple('ExportSpec', ['title', 'sql', 'order_by', 'columns', 'build_filter', 'filter_keys'])
+
+EXPORTS = {
+    'users': ExportSpec('Користувачі', """
+        SELECT id, telegram_id, username, first_name, last_name, subscription_status,
+               subscription_active, subscription_end_date, created_at, updated_at
+        FROM users
+    """, "ORDER BY created_at DESC, id DESC", USER_COLUMNS, build_users_filter,
+        ('search', 'subscription_status', 'date_from', 'date_to')),
+    'payments': ExportSpec('Платежі', """
+        SELECT p.id, p.user_id, p.amount, p.currency, p.status, p.stripe_invoice_id,
+               p.stripe_payment_intent_id, p.created_at, p.paid_at,
+               u.telegram_id, u.first_name, u.last_name, u.username
+        FROM payments p
+        JOIN users u ON p.user_id = u.id
+    """, "ORDER BY p.created_at DESC, p.id DESC", PAYMENT_COLUMNS, build_payments_filter,
+        ('search', 'status', 'date_from', 'date_to', 'min_amount', 'max_amount')),
+}
+
+# Числові фільтри (з JSON та query string приходять як рядки або числа)
+NUMERIC_FILTERS = ('min_amount', 'max_amount')
+
+
+def normalize_filters(export: str, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Фільтри експорту без порожніх значень (400 для невідомого експорту чи фільтра)"""
+    if export not in EXPORTS:
+        raise HTTPException(status_code=400, detail=f"export must be one of: {', '.join(EXPORTS)}")
+
+    allowed = EXPORTS[export].filter_keys
+    normalized = {}
+    for key, value in (filters or {}).items():
+        if key not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown filter for {export}: {key}")
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        if key in NUMERIC_FILTERS:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail=f"{key} must be a number")
+        else:
+            value = str(value)
+        normalized[key] = value
+    return normalized
+
+
+def build_export_query(export: str, filters: Dict[str, Any]) -> Tuple[str, tuple]:
+    """Запит експорту з WHERE за фільтрами"""
+    spec = EXPORTS[export]
+    where_clause, params = spec.build_filter(**filters)
+    return f"{spec.sql} WHERE {where_clause} {spec.order_by}", tuple(params)
+
+
+def iter_export_rows(sql: str, params: tuple = ()) -> Iterator[dict]:
+    """Рядки запиту порціями через небуферизований курсор (весь результат не тримається в пам'яті)"""
+    with database_connection() as db:
+        # Експорт може читатися довше за звичайний ліміт запиту
+        set_query_timeout(db, settings.export_query_timeout)
+        cursor = db.cursor(dictionary=True)
+        completed = False
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+            completed = True
+        finally:
+            if completed:
+                # Звичайний ліміт повертається при наступній видачі з'єднання з пулу
+                cursor.close()
+            else:
+                # Непрочитаний результат лишився на з'єднанні - не повертаємо його в пул
+                db.invalidate()
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def stream_csv(export: str, filters: Dict[str, Any]) -> Iterator[bytes]:
+    """CSV експорт частинами по EXPORT_BATCH_SIZE рядків"""
+    columns = EXPORTS[export].columns
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')  # BOM, щоб Excel правильно відкрив UTF-8
+    writer.writerow([column.header for column in columns])
+    for count, row in enumerate(iter_export_rows(*build_export_query(export, filters)), 1):
+        writer.writerow([_csv_value(column.value(row)) for column in columns])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_csv(export: str, filters: Dict[str, Any], target) -> int:
+    """Записати CSV експорт у двійковий файл; повертає кількість рядків"""
+    columns = EXPORTS[export].columns
+    text = io.TextIOWrapper(target, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+
+    text.write('\ufeff')  # BOM, щоб Excel правильно відкрив UTF-8
+    writer.writerow([column.header for column in columns])
+    row_count = 0
+    for row in iter_export_rows(*build_export_query(export, filters)):
+        writer.writerow([_csv_value(column.value(row)) for column in columns])
+        row_count += 1
+    text.flush()
+    text.detach()  # файл закриває той, хто його відкрив
+    return row_count
+
+
+def write_xlsx(export: str, filters: Dict[str, Any], target) -> int:
+    """Записати XLSX експорт у файл (write-only режим: рядки не зберігаються в пам'яті); повертає кількість рядків"""
+    spec = EXPORTS[export]
+    columns = spec.columns
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(spec.title)
+
+    # Ширини задані заздалегідь - другий прохід по клітинках для автоширини не потрібен
+    for index, column in enumerate(columns, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = column.width
+
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column.header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header.append(cell)
+    sheet.append(header)
+
+    row_count = 0
+    for row in iter_export_rows(*build_export_query(export, filters)):
+        sheet.append([column.value(row) for column in columns])
+        row_count += 1
+
+    workbook.save(target)
+    return row_count
+
+
+def stream_xlsx(export: str, filters: Dict[str, Any]) -> Iterator[bytes]:
+    """XLSX експорт: збирається в тимчасовий файл і віддається частинами"""
+    with tempfile.TemporaryFile() as tmp:
+        write_xlsx(export, filters, tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def check_export_format(export_format: str):
+    """400 для непідтримуваного формату"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+
+def write_export(export: str, export_format: str, filters: Dict[str, Any], target) -> int:
+    """Записати експорт у файл у потрібному форматі; повертає кількість рядків"""
+    writer = write_csv if export_format == 'csv' else write_xlsx
+    return writer(export, filters, target)
+
+
+def export_response(export: str, export_format: str, filters: Optional[Dict[str, Any]] = None) -> StreamingResponse:
+    """Потокова відповідь з файлом експорту"""
+    check_export_format(export_format)
+    filters = normalize_filters(export, filters)
+    build_export_query(export, filters)  # некоректні дати - 400 ще до початку потоку
+
+    stream = stream_csv(export, filters) if export_format == 'csv' else stream_xlsx(export, filters)
+    filename = f"{export}_{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,159 @@
+"""
+Фільтри списків адмін-панелі (користувачі, платежі): спільні для списків та експорту
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+# Пошук користувачів: точні збіги для telegram_id та email, FULLTEXT для тексту,
+# префіксний LIKE для слів, коротших за мінімальну довжину токена FULLTEXT
+FULLTEXT_MIN_TERM_LENGTH = 3
+FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def escape_like(value: str) -> str:
+    """Екранувати спецсимволи LIKE"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_user_search(search: Optional[str]) -> Tuple[Optional[str], list]:
+    """Умова пошуку по колонках таблиці users (None якщо шукати нічого)"""
+    search = (search or '').strip()
+    if not search:
+        return None, []
+
+    if search.isdigit():
+        return "telegram_id = %s", [int(search)]
+    if '@' in search[1:] and ' ' not in search:
+        return "email = %s", [search]
+    if search.startswith('@'):
+        return "username LIKE %s", [escape_like(search[1:]) + '%']
+
+    terms = FULLTEXT_OPERATORS.sub(' ', search).split()
+    if not terms:
+        return None, []
+
+    conditions = []
+    params = []
+    long_terms = [term for term in terms if len(term) >= FULLTEXT_MIN_TERM_LENGTH]
+    if long_terms:
+        # Кожне слово обов'язкове, з пошуком по префіксу
+        conditions.append("MATCH(first_name, last_name, username, email) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(' '.join(f'+{term}*' for term in long_terms))
+    for term in terms:
+        if len(term) < FULLTEXT_MIN_TERM_LENGTH:
+            prefix = escape_like(term) + '%'
+            conditions.append("(first_name LIKE %s OR last_name LIKE %s OR username LIKE %s)")
+            params.extend([prefix, prefix, prefix])
+
+    return " AND ".join(conditions), params
+
+
+def date_range_params(date_from: Optional[str], date_to: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Межі [date_from 00:00, date_to+1 день 00:00) для фільтра по даті (400 якщо дата некоректна)"""
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+        end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    return start, end
+
+
+def build_users_filter(
+    search: Optional[str] = None,
+    subscription_status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> Tuple[str, list]:
+    """WHERE для таблиці users: (умова, параметри)"""
+    where_conditions = []
+    query_params = []
+
+    # Пошук по імені, username, telegram_id, email
+    search_condition, search_params = build_user_search(search)
+    if search_condition:
+        where_conditions.append(f"({search_condition})")
+        query_params.extend(search_params)
+
+    # Фільтр по статусу підписки
+    if subscription_status == "active":
+        # Активна - активна підписка з увімкненим автоплатежем
+        where_conditions.append("subscription_active = 1 AND auto_payment_enabled = 1")
+    elif subscription_status == "with_access":
+        # З доступом зараз - активні з автоплатежем + призупинені/скасовані але ще в межах періоду
+        where_conditions.append("""(
+            (subscription_active = 1 AND auto_payment_enabled = 1)
+            OR (subscription_cancelled = 1 AND subscription_end_date >= NOW())
+            OR (subscription_paused = 1 AND subscription_end_date >= NOW())
+        )""")
+    elif subscription_status == "cancelled":
+        # Скасована - автоматично або сам скасував
+        where_conditions.append("subscription_cancelled = 1")
+    elif subscription_status == "paused":
+        # Призупинена
+        where_conditions.append("subscription_paused = 1")
+    elif subscription_status == "no_subscription":
+        # Без підписки - авторизувався, але ніколи не купив
+        where_conditions.append("subscription_active = 0 AND subscription_cancelled = 0 AND subscription_paused = 0")
+
+    # Фільтр по даті реєстрації (діапазон, щоб працював індекс по created_at)
+    created_from, created_to = date_range_params(date_from, date_to)
+    if created_from:
+        where_conditions.append("created_at >= %s")
+        query_params.append(created_from)
+    if created_to:
+        where_conditions.append("created_at < %s")
+        query_params.append(created_to)
+
+    where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
+    return where_clause, query_params
+
+
+def build_payments_filter(
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None
+) -> Tuple[str, list]:
+    """WHERE для payments p (JOIN users u): (умова, параметри)"""
+    where_conditions = []
+    query_params = []
+
+    # Пошук по користувачу або ID платежу
+    search_condition, search_params = build_user_search(search)
+    if search_condition:
+        if search.strip().isdigit():
+            where_conditions.append(f"(p.id = %s OR p.user_id IN (SELECT id FROM users WHERE {search_condition}))")
+            query_params.append(int(search.strip()))
+        else:
+            where_conditions.append(f"p.user_id IN (SELECT id FROM users WHERE {search_condition})")
+        query_params.extend(search_params)
+
+    # Фільтр по статусу
+    if status:
+        where_conditions.append("p.status = %s")
+        query_params.append(status)
+
+    # Фільтр по даті (діапазон, щоб працював індекс по created_at)
+    created_from, created_to = date_range_params(date_from, date_to)
+    if created_from:
+        where_conditions.append("p.created_at >= %s")
+        query_params.append(created_from)
+    if created_to:
+        where_conditions.append("p.created_at < %s")
+        query_params.append(created_to)
+
+    # Фільтр по сумі
+    if min_amount is not None:
+        where_conditions.append("p.amount >= %s")
+        query_params.append(min_amount)
+    if max_amount is not None:
+        where_conditions.append("p.amount <= %s")
+        query_params.append(max_amount)
+
+    where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
+    return where_clause, query_params
@@ -0,0 +1,154 @@
+"""
+Читання лог-файлів сервісів для адмін-панелі без завантаження всього файлу.
+
+Останні рядки читаються блоками з кінця файлу, нові - від байтового зміщення,
+яке повертає попередній запит (end_offset). Час і пам'ять залежать від кількості
+запитаних рядків, а не від розміру файлу. Повертаються лише завершені рядки:
+недописаний рядок у кінці файлу прийде наступним запитом.
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BLOCK_SIZE = 64 * 1024
+MAX_LINES = 5000
+# Скільки байт максимум переглядається за запит з фільтром (щоб рідкісний grep не читав увесь файл)
+MAX_SCAN_BYTES = 64 * 1024 * 1024
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode('utf-8', errors='ignore').rstrip('\r')
+
+
+def _matches(line: str, grep: Optional[str]) -> bool:
+    return not grep or grep in line.lower()
+
+
+def _complete_end(f, end: int) -> int:
+    """Зміщення одразу після останнього \\n до end (0, якщо завершених рядків немає)"""
+    position = end
+    while position > 0:
+        read_size = min(BLOCK_SIZE, position)
+        position -= read_size
+        f.seek(position)
+        index = f.read(read_size).rfind(b'\n')
+        if index != -1:
+            return position + index + 1
+    return 0
+
+
+def _is_line_start(f, offset: int) -> bool:
+    if offset == 0:
+        return True
+    f.seek(offset - 1)
+    return f.read(1) == b'\n'
+
+
+def read_tail(path: Path, lines: int, grep: Optional[str] = None, before: Optional[int] = None) -> Dict[str, Any]:
+    """Останні lines рядків (з фільтром grep), що закінчуються до зміщення before.
+
+    start_offset - початок найстарішого переглянутого рядка (before для попередньої сторінки),
+    end_offset - кінець останнього завершеного рядка (after для опитування нових рядків).
+    """
+    lines = max(1, min(lines, MAX_LINES))
+    grep = grep.lower() if grep else None
+
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = _complete_end(f, size if before is None else max(0, min(before, size)))
+
+        result: List[str] = []  # від новіших до старіших
+        oldest = end
+        # Байт end - 1 це \n останнього рядка; leftover - початок рядка, що закінчується перед уже прочитаним
+        position = max(0, end - 1)
+        leftover = b''
+        scanned = 0
+        while position > 0 and len(result) < lines and scanned < MAX_SCAN_BYTES:
+            read_size = min(BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            parts = (f.read(read_size) + leftover).split(b'\n')
+            scanned += read_size
+
+            leftover = parts[0]
+            starts = []
+            offset = position + len(leftover) + 1
+            for part in parts[1:]:
+                starts.append(offset)
+                offset += len(part) + 1
+
+            for part, start in zip(reversed(parts[1:]), reversed(starts)):
+                oldest = start
+                line = _decode(part)
+                if _matches(line, grep):
+                    result.append(line)
+                    if len(result) == lines:
+                        break
+
+        # Перший рядок файлу
+        if end > 0 and position == 0 and len(result) < lines and oldest > 0:
+            oldest = 0
+            line = _decode(leftover)
+            if _matches(line, grep):
+                result.append(line)
+
+    result.reverse()
+    return {
+        'lines': result,
+        'start_offset': oldest,
+        'end_offset': end,
+        'has_more': oldest > 0,
+        'reset': False,
+    }
+
+
+def read_after(path: Path, after: int, lines: int, grep: Optional[str] = None) -> Dict[str, Any]:
+    """Рядки, дописані після зміщення after (не більше lines).
+
+    Якщо файл обрізали чи замінили (after вже не на межі рядка), повертаються
+    останні рядки файлу з reset=True.
+    """
+    lines = max(1, min(lines, MAX_LINES))
+    grep_lower = grep.lower() if grep else None
+
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if after < 0 or after > size or not _is_line_start(f, after):
+            chunk = read_tail(path, lines, grep)
+            chunk['reset'] = True
+            return chunk
+
+        f.seek(after)
+        result: List[str] = []
+        position = after
+        leftover = b''
+        scanned = 0
+        limited = False
+        while scanned < MAX_SCAN_BYTES:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            scanned += len(block)
+            parts = (leftover + block).split(b'\n')
+            leftover = parts.pop()  # недописаний рядок
+
+            for part in parts:
+                position += len(part) + 1
+                line = _decode(part)
+                if _matches(line, grep_lower):
+                    result.append(line)
+                    if len(result) == lines:
+                        limited = True
+                        break
+            if limited:
+                break
+        else:
+            limited = True
+
+    return {
+        'lines': result,
+        'start_offset': after,
+        'end_offset': position,
+        'has_more': limited and position < size,
+        'reset': False,
+    }
@@ -0,0 +1,329 @@
+"""
+Підготовка медіафайлів розсилок без блокування API.
+
+Завантаження копіюється на диск частинами (Starlette вже тримає його в тимчасовому
+файлі) і зберігається під іменем з SHA-256 свого вмісту: повторне завантаження
+того самого файлу повертає вже підготовлений файл без повторної обробки.
+
+Оригінал після збереження не змінюється. Результати обробки - похідні версії в
+підкаталозі variants/ з іменем оригіналу: прев'ю та версія зображення для Telegram
+(готуються в пулі процесів) і оптимізоване відео (фонова задача ffmpeg; поки вона
+триває, бот відправляє оригінал).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+from fastapi.staticfiles import StaticFiles
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Похідні версії у підкаталозі variants/; для зображень: назва -> (максимальна сторона, якість JPEG)
+VARIANTS_DIR_NAME = 'variants'
+IMAGE_VARIANTS = {
+    'preview': (640, 80),  # прев'ю розсилок в адмін-панелі
+    'telegram': (2560, 87),  # Telegram зберігає фото до 2560px по більшій стороні
+}
+# Версія для Telegram потрібна лише оригіналам, більшим за ліміти фото (інакше відправляється оригінал)
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+# Версія, яку відправляє бот: зображення (IMAGE_VARIANTS) або оптимізоване відео у контейнері MP4
+TELEGRAM_VARIANT = 'telegram'
+VIDEO_VARIANT_SUFFIX = '.mp4'
+# Скільки секунд зберігається статус завершеної задачі оптимізації
+TRANSCODE_JOB_RETENTION = 3600
+
+# FFmpeg команда для оптимізації відео
+# -c:v libx264 - кодек H.264 для стиснення
+# -crf 23 - якість (18-28, де 23 - баланс якості/розміру)
+# -preset fast - швидкість кодування
+# -movflags +faststart - оптимізація для streaming
+# -vf "scale='min(1920,iw)':'min(1080,ih)':force_original_aspect_ratio=decrease" - обмеження роздільної здатності до 1080p зберігаючи пропорції
+# -c:a aac -b:a 128k - аудіо кодек AAC з бітрейтом 128k
+FFMPEG_ARGS = [
+    '-c:v', 'libx264',
+    '-crf', '23',
+    '-preset', 'fast',
+    '-movflags', '+faststart',
+    '-vf', "scale='min(1920,iw)':'min(1080,ih)':force_original_aspect_ratio=decrease",
+    '-c:a', 'aac',
+    '-b:a', '128k',
+]
+
+
+class UploadTooLarge(Exception):
+    """Файл більший за дозволений розмір"""
+
+
+def copy_upload(source, target: Path, max_size: int) -> Tuple[int, str]:
+    """Скопіювати завантажений файл на диск частинами; повертає (розмір у байтах, SHA-256)"""
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with open(target, 'wb') as output:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                output.write(chunk)
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+def file_extension(filename: Optional[str]) -> str:
+    """Розширення з імені файлу (лише латиниця й цифри, нижній регістр)"""
+    if not filename or '.' not in filename:
+        return ''
+    return re.sub(r'[^a-z0-9]', '', filename.rsplit('.', 1)[-1].lower())[:10]
+
+
+def store_upload(source, directory: Path, extension: str, max_size: int) -> Tuple[str, int, bool]:
+    """Зберегти завантаження під іменем <sha256>.<розширення>.
+
+    Повертає (ім'я файлу, розмір, deduplicated). Якщо такий вміст уже завантажували,
+    новий файл не зберігається: поруч уже лежать його похідні версії.
+    """
+    tmp_path = directory / f".upload-{uuid.uuid4().hex}.part"
+    size, digest = copy_upload(source, tmp_path, max_size)
+    filename = f"{digest}.{extension}" if extension else digest
+    target = directory / filename
+    if target.exists():
+        tmp_path.unlink(missing_ok=True)
+        # Оновлюємо mtime: очищення файлів без посилань відлічує період очікування заново
+        os.utime(target)
+        return filename, size, True
+    os.replace(tmp_path, target)
+    return filename, size, False
+
+
+def variant_path(path: Path, variant: str, suffix: str = '.jpg') -> Path:
+    """Шлях похідної версії файлу (uploads/broadcasts/variants/<ім'я>_<версія><suffix>)"""
+    return path.parent / VARIANTS_DIR_NAME / f"{path.stem}_{variant}{suffix}"
+
+
+def existing_variants(path: Path) -> Dict[str, Path]:
+    """Вже створені похідні версії файлу (зображення чи відео)"""
+    variants = {}
+    for variant, suffix in [(name, '.jpg') for name in IMAGE_VARIANTS] + [(TELEGRAM_VARIANT, VIDEO_VARIANT_SUFFIX)]:
+        candidate = variant_path(path, variant, suffix)
+        if candidate.is_file():
+            variants[variant] = candidate
+    return variants
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Конвертуємо в RGB якщо потрібно (для JPEG), прозорість - на білому фоні"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return rgb_img
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _save_jpeg(img: Image.Image, target: Path, quality: int):
+    """Зберегти JPEG через тимчасовий файл, щоб не лишити пошкоджений"""
+    tmp_path = f"{target}.resize"
+    img.save(tmp_path, format='JPEG', quality=quality, optimize=True)
+    os.replace(tmp_path, target)
+
+
+def create_image_variants(path: str) -> List[str]:
+    """Створити похідні версії зображення (виконується в окремому процесі); повертає їх назви"""
+    source = Path(path)
+    created = []
+    with Image.open(source) as img:
+        img.load()
+        for variant, (max_side, quality) in IMAGE_VARIANTS.items():
+            fits = max(img.size) <= max_side
+            if variant == 'telegram':
+                # Оригінал у межах лімітів Telegram відправляється без змін
+                if fits and source.stat().st_size <= TELEGRAM_PHOTO_MAX_BYTES:
+                    continue
+            elif img.format == 'JPEG' and fits:
+                # Невеликий JPEG і так підходить - повторне стиснення лише погіршить якість
+                continue
+            target = variant_path(source, variant)
+            target.parent.mkdir(exist_ok=True)
+            copy = img.copy()
+            copy.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            _save_jpeg(_to_rgb(copy), target, quality)
+            created.append(variant)
+    return created
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Пул процесів для обробки зображень (створюється при першому зверненні)"""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(max_workers=max(1, settings.media_process_workers))
+    return _process_pool
+
+
+async def optimize_image(path: Path) -> Dict[str, Path]:
+    """Похідні версії зображення в пулі процесів; при помилці відправляється оригінал"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_get_process_pool(), create_image_variants, str(path))
+    except Exception as e:
+        logger.warning(f"Image processing failed for {path.name}, keeping original: {e}")
+    return existing_variants(path)
+
+
+class UploadStaticFiles(StaticFiles):
+    """Статика завантажень з Cache-Control (ETag і Last-Modified додає StaticFiles).
+
+    Похідні версії не змінюються після створення, тож кешуються назавжди. Оригінали
+    браузер перевіряє при кожному запиті (304 за ETag): файл з тим самим іменем
+    може бути видалений і завантажений знову.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if Path(full_path).parent.name == VARIANTS_DIR_NAME:
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+# Задачі оптимізації відео (в пам'яті процесу API: після перезапуску відправляється оригінал)
+_transcode_jobs: Dict[str, Dict[str, Any]] = {}
+_transcode_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_transcode_semaphore() -> asyncio.Semaphore:
+    global _transcode_semaphore
+    if _transcode_semaphore is None:
+        _transcode_semaphore = asyncio.Semaphore(max(1, settings.media_transcode_concurrency))
+    return _transcode_semaphore
+
+
+def _purge_transcode_jobs():
+    now = time.monotonic()
+    for job_id, job in list(_transcode_jobs.items()):
+        if job['finished_monotonic'] and now - job['finished_monotonic'] > TRANSCODE_JOB_RETENTION:
+            del _transcode_jobs[job_id]
+
+
+def start_video_optimization(path: Path, url: str) -> str:
+    """Запустити фонову оптимізацію відео; повертає ID задачі для перевірки статусу"""
+    _purge_transcode_jobs()
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'url': url,
+        'status': 'pending',
+        'original_size': path.stat().st_size,
+        'optimized_size': None,
+        'optimized_url': None,
+        'error': None,
+        'created_at': datetime.utcnow().isoformat(),
+        'finished_at': None,
+        'finished_monotonic': None,
+    }
+    _transcode_jobs[job_id] = job
+    # Посилання на задачу тримаємо в job, щоб її не зібрав GC
+    job['task'] = asyncio.create_task(_optimize_video(job, path))
+    return job_id
+
+
+def find_active_transcode_job(url: str) -> Optional[str]:
+    """ID незавершеної задачі оптимізації файлу з цим URL"""
+    for job_id, job in _transcode_jobs.items():
+        if job['url'] == url and job['status'] in ('pending', 'processing'):
+            return job_id
+    return None
+
+
+def get_transcode_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Статус задачі оптимізації відео"""
+    job = _transcode_jobs.get(job_id)
+    if not job:
+        return None
+    return {key: value for key, value in job.items() if key not in ('task', 'finished_monotonic')}
+
+
+def _finish_job(job: Dict[str, Any], status: str, error: Optional[str] = None):
+    job['status'] = status
+    job['error'] = error
+    job['finished_at'] = datetime.utcnow().isoformat()
+    job['finished_monotonic'] = time.monotonic()
+
+
+async def _optimize_video(job: Dict[str, Any], path: Path):
+    """Перекодувати відео ffmpeg і зберегти як похідну версію, якщо результат менший за оригінал"""
+    optimized_path = path.with_suffix('.optimized' + VIDEO_VARIANT_SUFFIX)
+    try:
+        async with _get_transcode_semaphore():
+            job['status'] = 'processing'
+            process = await asyncio.create_subprocess_exec(
+                'ffmpeg', '-i', str(path), *FFMPEG_ARGS, '-y', str(optimized_path),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=settings.media_transcode_timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise RuntimeError(f"ffmpeg timed out after {settings.media_transcode_timeout}s")
+
+        if process.returncode != 0 or not optimized_path.exists():
+            message = stderr.decode('utf-8', errors='ignore')[-2000:]
+            logger.warning(f"Video optimization failed: {message}")
+            _finish_job(job, 'failed', message)
+            return
+
+        if not path.exists():
+            # Файл видалили, поки він оброблявся
+            _finish_job(job, 'skipped', 'Original file was deleted')
+            return
+
+        optimized_size = optimized_path.stat().st_size
+        original_size = path.stat().st_size
+        # Використовуємо оптимізований тільки якщо він менший; оригінал лишається без змін
+        if optimized_size < original_size:
+            target = variant_path(path, TELEGRAM_VARIANT, VIDEO_VARIANT_SUFFIX)
+            target.parent.mkdir(exist_ok=True)
+            os.replace(optimized_path, target)
+            job['optimized_size'] = optimized_size
+            job['optimized_url'] = f"{job['url'].rsplit('/', 1)[0]}/{VARIANTS_DIR_NAME}/{target.name}"
+            logger.info(f"Video optimized: {original_size} -> {optimized_size} bytes ({100 * optimized_size / original_size:.1f}%)")
+            _finish_job(job, 'completed')
+        else:
+            logger.info("Video optimization skipped - optimized file is larger")
+            _finish_job(job, 'skipped')
+    except Exception as e:
+        # Продовжуємо з оригінальним файлом при помилці оптимізації
+        logger.error(f"Video optimization error: {e}")
+        _finish_job(job, 'failed', str(e))
+    finally:
+        optimized_path.unlink(missing_ok=True)
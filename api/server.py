@@ -1,10 +1,15 @@
 from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials, HTTPBearer
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
-from typing import List, Dict, Any, Optional
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional, Tuple
 import secrets
+import base64
+import hashlib
+import hmac
+import threading
+import time
 from datetime import datetime, timedelta
 import bcrypt
 import jwt
@@ -13,14 +18,11 @@ import sys
 from pathlib import Path
 from pydantic import BaseModel
 import os
-import uuid
 import shutil
-from PIL import Image
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+import json
 import asyncio
 import logging
+import anyio
 
 # Логер для цього модуля
 logger = logging.getLogger(__name__)
@@ -29,32 +31,21 @@ logger = logging.getLogger(__name__)
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-from database.models import get_database, DatabaseManager, User
+from database.models import get_database, database_connection, DatabaseManager, User, enable_query_timeout, recipient_not_suppressed
+from sqlalchemy import insert, literal, select
 from database.encryption import settings_manager
+from api.stats import get_stats, invalidate_stats
+from api.exports import EXPORT_FORMATS, export_response
+from api.export_jobs import artifact_path, create_export_job, get_export_job, recover_export_jobs, serialize_job
+from api.filters import build_users_filter, build_payments_filter
+from api.log_reader import read_tail as read_log_tail, read_after as read_log_after
+from api.media import (
+    VARIANTS_DIR_NAME, UploadStaticFiles, UploadTooLarge, file_extension, store_upload,
+    optimize_image, existing_variants, start_video_optimization, find_active_transcode_job,
+    get_transcode_job
+)
 from config import settings
 
-# Асинхронна функція для обробки розсилки
-async def process_broadcast_async(broadcast_id: int):
-    """Обробити розсилку в фоновому режимі"""
-    try:
-        from telegram import Bot
-        from bot.broadcast_handler import BroadcastHandler
-        
-        # Створюємо Bot instance
-        bot = Bot(token=settings.telegram_bot_token)
-        handler = BroadcastHandler(bot)
-        
-        # Обробляємо тільки цю розсилку
-        from database.models import DatabaseManager, Broadcast
-        with DatabaseManager() as db:
-            broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
-            if broadcast and broadcast.status == 'pending':
-                await handler._process_broadcast(broadcast)
-                logger.info(f"Broadcast {broadcast_id} processing started")
-            
-    except Exception as e:
-        logger.error(f"Error processing broadcast {broadcast_id}: {e}")
-
 # Pydantic моделі
 class LoginRequest(BaseModel):
     username: str
@@ -106,7 +97,8 @@ BROADCASTS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Монтуємо статичні файли
 # /api/uploads — бо nginx проксює /api/* → FastAPI, тому браузер запитує /api/uploads/...
-app.mount("/api/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# (з Cache-Control: похідні версії зображень кешуються назавжди)
+app.mount("/api/uploads", UploadStaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
 # CORS для Next.js
 app.add_middleware(
@@ -117,17 +109,142 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Доступ до БД з async-коду: блокуючі запити виконуються в обмеженому пулі потоків.
+# Звичайні (def) ендпоінти FastAPI й так виконує в цьому пулі.
+@app.on_event("startup")
+async def configure_threadpool():
+    """Обмежити кількість потоків для блокуючих ендпоінтів і запитів до БД"""
+    # Потоків не більше, ніж з'єднань у пулі: зайві потоки лише чекали б на з'єднання (DB_POOL_TIMEOUT)
+    pool_capacity = settings.db_pool_size + settings.db_max_overflow
+    limit = settings.api_thread_limit
+    if limit > pool_capacity:
+        logger.warning(f"API_THREAD_LIMIT={limit} exceeds DB pool capacity {pool_capacity}, using {pool_capacity}")
+        limit = pool_capacity
+    anyio.to_thread.current_default_thread_limiter().total_tokens = max(1, limit)
+    # Ліміт часу SELECT-запитів лише для з'єднань процесу API
+    enable_query_timeout(settings.db_query_timeout)
+
+@app.on_event("startup")
+def recover_exports():
+    """Позначити експорти, перервані перезапуском API, як невдалі"""
+    try:
+        recover_export_jobs()
+    except Exception as e:
+        logger.error(f"Error recovering export jobs: {e}")
+
+async def run_db(func, *args, timeout: Optional[float] = None, **kwargs):
+    """Виконати блокуючу функцію роботи з БД у пулі потоків з таймаутом"""
+    try:
+        return await asyncio.wait_for(
+            run_in_threadpool(func, *args, **kwargs),
+            timeout=timeout or settings.db_query_timeout
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database query timed out")
+
+# Курсорна пагінація списків: токен after кодує (created_at, id) останнього рядка сторінки.
+# Без after працюють номери сторінок (OFFSET) - для невеликих вибірок і зворотної сумісності.
+PAGE_COUNT_MODES = ('exact', 'estimated', 'none')
+
+def encode_page_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    """Непрозорий токен позиції в списку (порожня дата - рядок з created_at = NULL)"""
+    raw = f"{created_at.isoformat() if created_at else ''}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_cursor(token: str) -> Tuple[Optional[datetime], int]:
+    """Розібрати токен позиції (400 якщо токен пошкоджений)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        created_at, row_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def count_rows(cursor, from_sql: str, where_clause: str, params: list, mode: str) -> Tuple[Optional[int], bool]:
+    """Кількість рядків: точна (COUNT), оцінка планувальника (EXPLAIN) або без підрахунку"""
+    if mode == 'none':
+        return None, False
+    if mode == 'estimated':
+        cursor.execute(f"EXPLAIN SELECT 1 {from_sql} WHERE {where_clause}", tuple(params))
+        plan = cursor.fetchall() or []
+        return max((int(row.get('rows') or 0) for row in plan), default=0), True
+    cursor.execute(f"SELECT COUNT(*) as total {from_sql} WHERE {where_clause}", tuple(params))
+    result = cursor.fetchone()
+    return (result["total"] if result else 0), False
+
+def paginate_query(
+    cursor,
+    select_sql: str,
+    from_sql: str,
+    where_clause: str,
+    params: list,
+    limit: int,
+    page: int = 1,
+    after: Optional[str] = None,
+    count: Optional[str] = None,
+    alias: str = ""
+) -> Dict[str, Any]:
+    """Сторінка рядків, відсортованих за (created_at, id) DESC, з курсором наступної сторінки"""
+    column = f"{alias}." if alias else ""
+    # З курсором точний COUNT на кожну сторінку не потрібен - за замовчуванням лише оцінка
+    count = count or ('estimated' if after else 'exact')
+    if count not in PAGE_COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(PAGE_COUNT_MODES)}")
+    
+    total, total_is_estimate = count_rows(cursor, from_sql, where_clause, params, count)
+    
+    page_params = list(params)
+    if after:
+        created_at, row_id = decode_page_cursor(after)
+        if created_at is None:
+            # MySQL ставить NULL останніми при DESC - далі лише рядки без дати з меншим id
+            where_clause = f"({where_clause}) AND {column}created_at IS NULL AND {column}id < %s"
+            page_params.append(row_id)
+        else:
+            where_clause = (
+                f"({where_clause}) AND ({column}created_at < %s OR ({column}created_at = %s AND {column}id < %s)"
+                f" OR {column}created_at IS NULL)"
+            )
+            page_params.extend([created_at, created_at, row_id])
+        offset = 0
+    else:
+        offset = (max(page, 1) - 1) * limit
+    
+    # Беремо на один рядок більше, щоб знати чи є наступна сторінка
+    cursor.execute(f"""
+        {select_sql}
+        {from_sql}
+        WHERE {where_clause}
+        ORDER BY {column}created_at DESC, {column}id DESC
+        LIMIT %s OFFSET %s
+    """, tuple(page_params + [limit + 1, offset]))
+    rows = cursor.fetchall() or []
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_page_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    
+    return {
+        "rows": rows,
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "total_pages": max(1, (total + limit - 1) // limit) if total is not None else None,
+        "current_page": None if after else max(page, 1),
+        "next_cursor": next_cursor,
+    }
+
 # Health check endpoint
 @app.get("/health")
-async def health_check():
+def health_check():
     """Health check endpoint для моніторингу"""
     try:
         # Перевіримо з'єднання з базою даних
-        db = get_database()
-        cursor = db.cursor()
-        cursor.execute("SELECT 1")
-        cursor.close()
-        db.close()
+        with database_connection() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
         
         return {
             "status": "healthy",
@@ -180,29 +297,61 @@ def hash_password(password: str) -> str:
 
 def get_admin_by_username(username: str) -> Optional[Dict]:
     """Отримати адміна за ім'ям користувача"""
-    db = get_database()
-    cursor = db.cursor(dictionary=True)
-    
-    try:
-        cursor.execute("SELECT * FROM admins WHERE username = %s AND is_active = TRUE", (username,))
-        admin = cursor.fetchone()
-        return admin
-    finally:
-        cursor.close()
-        db.close()
+    with database_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM admins WHERE username = %s AND is_active = TRUE", (username,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
 
 def get_admin_by_id(admin_id: int) -> Optional[Dict]:
     """Отримати адміна за ID"""
-    db = get_database()
-    cursor = db.cursor(dictionary=True)
+    with database_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM admins WHERE id = %s AND is_active = TRUE", (admin_id,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+# Кеш авторизації: активні адміни за id і перевірені Basic Auth креди (в межах процесу API).
+# Скидається ендпоінтами зміни/видалення адмінів і зміни пароля, інакше живе ADMIN_AUTH_CACHE_TTL секунд.
+_admin_cache: Dict[int, Tuple[float, Dict]] = {}
+_basic_auth_cache: Dict[bytes, Tuple[float, int]] = {}
+_auth_cache_lock = threading.Lock()
+# Ключ для відбитків Basic Auth кредів, щоб не тримати паролі в пам'яті
+_basic_auth_cache_key = secrets.token_bytes(32)
+
+def _basic_auth_fingerprint(username: str, password: str) -> bytes:
+    return hmac.new(_basic_auth_cache_key, f"{username}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+
+def get_cached_admin(admin_id: int) -> Optional[Dict]:
+    """Активний адмін за ID з кешу (з БД, якщо запису немає або він застарів)"""
+    now = time.monotonic()
+    with _auth_cache_lock:
+        cached = _admin_cache.get(admin_id)
+    if cached and cached[0] > now:
+        return cached[1]
     
-    try:
-        cursor.execute("SELECT * FROM admins WHERE id = %s AND is_active = TRUE", (admin_id,))
-        admin = cursor.fetchone()
-        return admin
-    finally:
-        cursor.close()
-        db.close()
+    admin = get_admin_by_id(admin_id)
+    with _auth_cache_lock:
+        if admin:
+            _admin_cache[admin_id] = (now + settings.admin_auth_cache_ttl, admin)
+        else:
+            _admin_cache.pop(admin_id, None)
+    return admin
+
+def invalidate_admin_cache(admin_id: Optional[int] = None):
+    """Скинути кеш авторизації адміна (або всіх адмінів)"""
+    with _auth_cache_lock:
+        if admin_id is None:
+            _admin_cache.clear()
+            _basic_auth_cache.clear()
+            return
+        _admin_cache.pop(admin_id, None)
+        for fingerprint in [k for k, (_, cached_id) in _basic_auth_cache.items() if cached_id == admin_id]:
+            del _basic_auth_cache[fingerprint]
 
 def get_current_admin_from_token(token: str = Depends(bearer_security)) -> Dict:
     """Отримати поточного адміна з JWT токена"""
@@ -232,7 +381,7 @@ def get_current_admin_from_token(token: str = Depends(bearer_security)) -> Dict:
             detail="Invalid token",
         )
     
-    admin = get_admin_by_id(admin_id)
+    admin = get_cached_admin(admin_id)
     if admin is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -250,9 +399,22 @@ def get_current_admin(credentials: Optional[HTTPBasicCredentials] = Depends(secu
             headers={"WWW-Authenticate": "Basic"},
         )
     
+    # Креди, які вже пройшли перевірку bcrypt, беремо з кешу
+    fingerprint = _basic_auth_fingerprint(credentials.username, credentials.password)
+    now = time.monotonic()
+    with _auth_cache_lock:
+        cached = _basic_auth_cache.get(fingerprint)
+    if cached and cached[0] > now:
+        admin = get_cached_admin(cached[1])
+        if admin and admin["username"] == credentials.username:
+            return admin
+    
     # Спочатку перевіряємо в базі даних
     admin = get_admin_by_username(credentials.username)
     if admin and verify_password(credentials.password, admin["password_hash"]):
+        with _auth_cache_lock:
+            _basic_auth_cache[fingerprint] = (now + settings.admin_auth_cache_ttl, admin["id"])
+            _admin_cache[admin["id"]] = (now + settings.admin_auth_cache_ttl, admin)
         return admin
     
     # Якщо не знайдено в БД, перевіряємо старі дефолтні креди
@@ -280,7 +442,7 @@ def get_current_admin_flexible(
             admin_id_str: str = payload.get("sub")
             if admin_id_str:
                 admin_id = int(admin_id_str)  # Конвертуємо назад в int
-                admin = get_admin_by_id(admin_id)
+                admin = get_cached_admin(admin_id)
                 if admin:
                     return admin
         except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, ValueError):
@@ -303,89 +465,34 @@ def check_admin_permission(admin: Dict, permission: str) -> bool:
     return True
 
 @app.get("/api/dashboard")
-async def get_dashboard(admin: Dict = Depends(get_current_admin_flexible)) -> Dict[str, Any]:
+def get_dashboard(admin: Dict = Depends(get_current_admin_flexible)) -> Dict[str, Any]:
     """Отримати статистику для дашборду"""
     try:
-        db = get_database()
-        cursor = db.cursor(dictionary=True)
-        
-        # Total users
-        cursor.execute("SELECT COUNT(*) as total FROM users")
-        result = cursor.fetchone()
-        total_users = result["total"] if result else 0
-        
-        # Active users (з увімкненим автоплатежем)
-        cursor.execute("SELECT COUNT(*) as active FROM users WHERE subscription_active = 1 AND auto_payment_enabled = 1")
-        result = cursor.fetchone()
-        active_users = result["active"] if result else 0
-        
-        # Inactive users (без активної підписки або без автоплатежу)
-        cursor.execute("SELECT COUNT(*) as inactive FROM users WHERE subscription_active = 0 OR auto_payment_enabled = 0")
-        result = cursor.fetchone()
-        inactive_users = result["inactive"] if result else 0
-        
-        # Total revenue from successful payments (сума вже в євро)
-        cursor.execute("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE status IN ('succeeded', 'completed')")
-        result = cursor.fetchone()
-        if result and result["total"]:
-            from decimal import Decimal
-            total_amount = result["total"]
-            if isinstance(total_amount, Decimal):
-                total_revenue = float(total_amount)  # Сума вже в євро
-            else:
-                total_revenue = float(total_amount)
-        else:
-            total_revenue = 0.0
-        
-        # Today's payments count
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM payments 
-            WHERE status IN ('succeeded', 'completed') 
-            AND DATE(created_at) = CURDATE()
-        """)
-        result = cursor.fetchone()
-        payments_today = result["count"] if result else 0
-        
-        # Users with access (з доступом до студії зараз - активні з автоплатежем + скасовані/призупинені але ще в межах періоду)
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE (
-                (subscription_active = 1 AND auto_payment_enabled = 1)
-                OR (subscription_cancelled = 1 AND subscription_end_date >= NOW())
-                OR (subscription_paused = 1 AND subscription_end_date >= NOW())
-            )
-        """)
-        result = cursor.fetchone()
-        with_access_count = result["count"] if result else 0
-        
-        cursor.close()
-        db.close()
-        
+        stats = get_stats()
         return {
-            "total_users": total_users,
-            "active_users": active_users,
-            "inactive_users": inactive_users,
-            "with_access": with_access_count,
-            "payments_today": payments_today
+            "total_users": stats["total"],
+            # Активні - з увімкненим автоплатежем
+            "active_users": stats["active_auto_payment"],
+            "inactive_users": stats["inactive"],
+            # З доступом до студії зараз - активні з автоплатежем + скасовані/призупинені але ще в межах періоду
+            "with_access": stats["with_access"],
+            "payments_today": stats["payments_today"],
+            "total_revenue": stats["total_revenue"],
+            "computed_at": stats["computed_at"]
         }
     except Exception as e:
-        if 'db' in locals():
-            try:
-                db.close()
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/users")
-async def get_users(
+def get_users(
     page: int = 1, 
     limit: int = 50, 
     search: str = "", 
     subscription_status: Optional[str] = None,  # active, inactive, paused, cancelled
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    after: Optional[str] = None,  # курсор з pagination.next_cursor замість page
+    count: Optional[str] = None,  # exact, estimated, none
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
     """Отримати список користувачів з фільтрацією"""
@@ -393,92 +500,26 @@ async def get_users(
         db = get_database()
         cursor = db.cursor(dictionary=True)
         
-        offset = (page - 1) * limit
+        # Будуємо WHERE умови (пошук, статус підписки, дата реєстрації)
+        where_clause, query_params = build_users_filter(search, subscription_status, date_from, date_to)
         
-        # Будуємо WHERE умови
-        where_conditions = []
-        query_params = []
-        
-        # Пошук по імені, username, telegram_id, email
-        if search:
-            search_query = f"%{search}%"
-            where_conditions.append(
-                "(CAST(telegram_id AS CHAR) LIKE %s OR first_name LIKE %s OR last_name LIKE %s OR username LIKE %s OR email LIKE %s)"
-            )
-            query_params.extend([search_query, search_query, search_query, search_query, search_query])
-        
-        # Фільтр по статусу підписки
-        if subscription_status:
-            if subscription_status == "active":
-                # Активна - активна підписка з увімкненим автоплатежем
-                where_conditions.append("subscription_active = 1 AND auto_payment_enabled = 1")
-            elif subscription_status == "with_access":
-                # З доступом зараз - активні з автоплатежем + призупинені/скасовані але ще в межах періоду
-                where_conditions.append("""(
-                    (subscription_active = 1 AND auto_payment_enabled = 1)
-                    OR (subscription_cancelled = 1 AND subscription_end_date >= NOW())
-                    OR (subscription_paused = 1 AND subscription_end_date >= NOW())
-                )""")
-            elif subscription_status == "cancelled":
-                # Скасована - автоматично або сам скасував
-                where_conditions.append("subscription_cancelled = 1")
-            elif subscription_status == "paused":
-                # Призупинена
-                where_conditions.append("subscription_paused = 1")
-            elif subscription_status == "no_subscription":
-                # Без підписки - авторизувався, але ніколи не купив
-                where_conditions.append("subscription_active = 0 AND subscription_cancelled = 0 AND subscription_paused = 0")
-        
-        # Фільтр по даті реєстрації
-        if date_from:
-            where_conditions.append("DATE(created_at) >= %s")
-            query_params.append(date_from)
-        
-        if date_to:
-            where_conditions.append("DATE(created_at) <= %s")
-            query_params.append(date_to)
-        
-        # Формуємо WHERE clause
-        where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-        
-        # Підраховуємо загальну кількість
-        count_sql = f"SELECT COUNT(*) as total FROM users WHERE {where_clause}"
-        cursor.execute(count_sql, tuple(query_params))
-        result = cursor.fetchone()
-        total_users = result["total"] if result else 0
-        
-        # Додаємо статистику по статусах підписки
-        stats_sql = """
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN subscription_active = 1 AND auto_payment_enabled = 1 THEN 1 ELSE 0 END) as active,
-                SUM(CASE WHEN subscription_paused = 1 THEN 1 ELSE 0 END) as paused,
-                SUM(CASE WHEN subscription_cancelled = 1 THEN 1 ELSE 0 END) as cancelled,
-                SUM(CASE WHEN subscription_active = 0 AND subscription_cancelled = 0 AND subscription_paused = 0 THEN 1 ELSE 0 END) as no_subscription
-            FROM users
-        """
-        cursor.execute(stats_sql)
-        stats = cursor.fetchone() or {}
-        
-        # Конвертуємо статистику в int (MySQL повертає Decimal/str)
+        # Статистика по статусах підписки (спільний знімок з дашбордом)
+        stats = get_stats()
         stats_converted = {
-            "total": int(stats.get('total', 0)) if stats.get('total') is not None else 0,
-            "active": int(stats.get('active', 0)) if stats.get('active') is not None else 0,
-            "paused": int(stats.get('paused', 0)) if stats.get('paused') is not None else 0,
-            "cancelled": int(stats.get('cancelled', 0)) if stats.get('cancelled') is not None else 0,
-            "no_subscription": int(stats.get('no_subscription', 0)) if stats.get('no_subscription') is not None else 0
+            "total": stats["total"],
+            "active": stats["active_auto_payment"],
+            "paused": stats["paused"],
+            "cancelled": stats["cancelled"],
+            "no_subscription": stats["no_subscription"]
         }
         
         # Отримуємо користувачів
-        users_sql = f"""
-            SELECT * FROM users 
-            WHERE {where_clause}
-            ORDER BY created_at DESC 
-            LIMIT %s OFFSET %s
-        """
-        cursor.execute(users_sql, tuple(query_params + [limit, offset]))
-        
-        users = cursor.fetchall() or []
+        result = paginate_query(
+            cursor, "SELECT *", "FROM users", where_clause, query_params,
+            limit, page=page, after=after, count=count
+        )
+        users = result["rows"]
+        total_users = result["total"]
         
         # Convert datetime objects to ISO strings with explicit UTC (Z suffix)
         # БД зберігає naive datetime (без timezone), але всі дати — UTC за замовчуванням
@@ -496,8 +537,6 @@ async def get_users(
             if user.get('member_since'):
                 user['member_since'] = user['member_since'].isoformat() + 'Z'
         
-        total_pages = (total_users + limit - 1) // limit if total_users > 0 else 1
-        
         cursor.close()
         db.close()
         
@@ -506,12 +545,19 @@ async def get_users(
             "total": total_users,
             "stats": stats_converted,
             "pagination": {
-                "current_page": page,
-                "total_pages": total_pages,
+                "current_page": result["current_page"],
+                "total_pages": result["total_pages"],
                 "total_users": total_users,
-                "per_page": limit
+                "total_is_estimate": result["total_is_estimate"],
+                "per_page": limit,
+                "next_cursor": result["next_cursor"],
+                "has_more": result["next_cursor"] is not None
             }
         }
+    except HTTPException:
+        if 'db' in locals():
+            db.close()
+        raise
     except Exception as e:
         if 'db' in locals():
             try:
@@ -521,91 +567,24 @@ async def get_users(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/users/export")
-async def export_users(
+def export_users(
+    format: str = "xlsx",  # xlsx або csv
+    search: str = "",
+    subscription_status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
     admin: Dict = Depends(get_current_admin_flexible)
 ):
-    """Експорт користувачів в Excel"""
-    try:
-        db = get_database()
-        cursor = db.cursor(dictionary=True)
-        
-        cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users = cursor.fetchall() or []
-        
-        # Створюємо Excel файл
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Користувачі"
-        
-        # Заголовки
-        headers = [
-            'ID', 'Telegram ID', 'Username', "Ім'я", 'Прізвище',
-            'Статус', 'Підписка активна', 'Підписка до', 
-            'Дата реєстрації', 'Останнє оновлення'
-        ]
-        
-        # Стилізація заголовків
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Дані
-        for row_num, user in enumerate(users, 2):
-            ws.cell(row=row_num, column=1, value=user.get('id'))
-            ws.cell(row=row_num, column=2, value=user.get('telegram_id'))
-            ws.cell(row=row_num, column=3, value=user.get('username', ''))
-            ws.cell(row=row_num, column=4, value=user.get('first_name', ''))
-            ws.cell(row=row_num, column=5, value=user.get('last_name', ''))
-            ws.cell(row=row_num, column=6, value=user.get('subscription_status', 'inactive'))
-            ws.cell(row=row_num, column=7, value='Так' if user.get('subscription_active') == 1 else 'Ні')
-            ws.cell(row=row_num, column=8, value=user.get('subscription_end_date', ''))
-            ws.cell(row=row_num, column=9, value=user.get('created_at', ''))
-            ws.cell(row=row_num, column=10, value=user.get('updated_at', ''))
-        
-        # Автоширина колонок
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Зберігаємо в пам'ять
-        excel_file = io.BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-        
-        cursor.close()
-        db.close()
-        
-        # Повертаємо файл
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=users_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-        )
-        
-    except Exception as e:
-        if 'db' in locals():
-            try:
-                db.close()
-            except:
-                pass
-        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+    """Експорт користувачів в Excel / CSV (потоком, з фільтрами списку)"""
+    return export_response('users', format, {
+        "search": search,
+        "subscription_status": subscription_status,
+        "date_from": date_from,
+        "date_to": date_to
+    })
 
 @app.get("/api/payments")
-async def get_payments(
+def get_payments(
     page: int = 1, 
     limit: int = 50,
     search: str = "",
@@ -614,6 +593,8 @@ async def get_payments(
     date_to: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
+    after: Optional[str] = None,  # курсор з pagination.next_cursor замість page
+    count: Optional[str] = None,  # exact, estimated, none
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
     """Отримати список платежів з фільтрацією"""
@@ -621,69 +602,19 @@ async def get_payments(
         db = get_database()
         cursor = db.cursor(dictionary=True)
         
-        offset = (page - 1) * limit
-        
-        # Будуємо WHERE умови
-        where_conditions = []
-        query_params = []
-        
-        # Пошук по користувачу або ID
-        if search:
-            search_query = f"%{search}%"
-            where_conditions.append(
-                "(CAST(u.telegram_id AS CHAR) LIKE %s OR u.first_name LIKE %s OR u.last_name LIKE %s OR u.username LIKE %s OR CAST(p.id AS CHAR) LIKE %s)"
-            )
-            query_params.extend([search_query, search_query, search_query, search_query, search_query])
-        
-        # Фільтр по статусу
-        if status:
-            where_conditions.append("p.status = %s")
-            query_params.append(status)
-        
-        # Фільтр по даті
-        if date_from:
-            where_conditions.append("DATE(p.created_at) >= %s")
-            query_params.append(date_from)
-        
-        if date_to:
-            where_conditions.append("DATE(p.created_at) <= %s")
-            query_params.append(date_to)
-        
-        # Фільтр по сумі
-        if min_amount is not None:
-            where_conditions.append("p.amount >= %s")
-            query_params.append(min_amount)
-        
-        if max_amount is not None:
-            where_conditions.append("p.amount <= %s")
-            query_params.append(max_amount)
-        
-        # Формуємо WHERE clause
-        where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-        
-        # Підраховуємо загальну кількість
-        count_sql = f"""
-            SELECT COUNT(*) as total 
-            FROM payments p
-            JOIN users u ON p.user_id = u.id
-            WHERE {where_clause}
-        """
-        cursor.execute(count_sql, tuple(query_params))
-        result = cursor.fetchone()
-        total_payments = result["total"] if result else 0
+        # Будуємо WHERE умови (пошук, статус, дата, сума)
+        where_clause, query_params = build_payments_filter(search, status, date_from, date_to, min_amount, max_amount)
         
         # Отримуємо платежі
-        payments_sql = f"""
-            SELECT p.*, u.telegram_id, u.first_name, u.last_name
-            FROM payments p
-            JOIN users u ON p.user_id = u.id
-            WHERE {where_clause}
-            ORDER BY p.created_at DESC
-            LIMIT %s OFFSET %s
-        """
-        cursor.execute(payments_sql, tuple(query_params + [limit, offset]))
-        
-        payments = cursor.fetchall() or []
+        result = paginate_query(
+            cursor,
+            "SELECT p.*, u.telegram_id, u.first_name, u.last_name",
+            "FROM payments p JOIN users u ON p.user_id = u.id",
+            where_clause, query_params,
+            limit, page=page, after=after, count=count, alias="p"
+        )
+        payments = result["rows"]
+        total_payments = result["total"]
         
         # Convert datetime objects to ISO strings with Z (UTC)
         for payment in payments:
@@ -697,8 +628,6 @@ async def get_payments(
             if payment.get('amount'):
                 payment['amount'] = float(payment['amount'])
         
-        total_pages = (total_payments + limit - 1) // limit if total_payments > 0 else 1
-        
         cursor.close()
         db.close()
         
@@ -706,12 +635,19 @@ async def get_payments(
             "data": payments,
             "total": total_payments,
             "pagination": {
-                "current_page": page,
-                "total_pages": total_pages,
+                "current_page": result["current_page"],
+                "total_pages": result["total_pages"],
                 "total_payments": total_payments,
-                "per_page": limit
+                "total_is_estimate": result["total_is_estimate"],
+                "per_page": limit,
+                "next_cursor": result["next_cursor"],
+                "has_more": result["next_cursor"] is not None
             }
         }
+    except HTTPException:
+        if 'db' in locals():
+            db.close()
+        raise
     except Exception as e:
         if 'db' in locals():
             try:
@@ -721,98 +657,78 @@ async def get_payments(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/payments/export")
-async def export_payments(
+def export_payments(
+    format: str = "xlsx",  # xlsx або csv
+    search: str = "",
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
     admin: Dict = Depends(get_current_admin_flexible)
 ):
-    """Експорт платежів в Excel"""
-    try:
-        db = get_database()
-        cursor = db.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT p.*, u.telegram_id, u.first_name, u.last_name, u.username
-            FROM payments p
-            JOIN users u ON p.user_id = u.id
-            ORDER BY p.created_at DESC
-        """)
-        payments = cursor.fetchall() or []
-        
-        # Створюємо Excel файл
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Платежі"
-        
-        # Заголовки
-        headers = [
-            'ID', 'User ID', 'Telegram ID', 'Username', "Ім'я користувача",
-            'Сума (EUR)', 'Валюта', 'Статус', 'Stripe Invoice ID', 'Stripe Payment ID',
-            'Дата створення', 'Дата оплати'
-        ]
-        
-        # Стилізація заголовків
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Дані
-        for row_num, payment in enumerate(payments, 2):
-            ws.cell(row=row_num, column=1, value=payment.get('id'))
-            ws.cell(row=row_num, column=2, value=payment.get('user_id'))
-            ws.cell(row=row_num, column=3, value=payment.get('telegram_id'))
-            ws.cell(row=row_num, column=4, value=payment.get('username', ''))
-            ws.cell(row=row_num, column=5, value=f"{payment.get('first_name', '')} {payment.get('last_name', '')}".strip())
-            ws.cell(row=row_num, column=6, value=float(payment.get('amount', 0)))  # Сума вже в євро
-            ws.cell(row=row_num, column=7, value=payment.get('currency', '').upper())
-            ws.cell(row=row_num, column=8, value=payment.get('status', ''))
-            ws.cell(row=row_num, column=9, value=payment.get('stripe_invoice_id', ''))
-            ws.cell(row=row_num, column=10, value=payment.get('stripe_payment_intent_id', ''))
-            ws.cell(row=row_num, column=11, value=str(payment.get('created_at', '')))
-            ws.cell(row=row_num, column=12, value=str(payment.get('paid_at', '')))
-        
-        # Автоширина колонок
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Зберігаємо в пам'ять
-        excel_file = io.BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-        
-        cursor.close()
-        db.close()
-        
-        # Повертаємо файл
-        return StreamingResponse(
-            excel_file,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=payments_{datetime.now().strftime('%Y%m%d')}.xlsx"}
-        )
-        
-    except Exception as e:
-        if 'db' in locals():
-            try:
-                db.close()
-            except:
-                pass
-        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+    """Експорт платежів в Excel / CSV (потоком, з фільтрами списку)"""
+    return export_response('payments', format, {
+        "search": search,
+        "status": status,
+        "date_from": date_from,
+        "date_to": date_to,
+        "min_amount": min_amount,
+        "max_amount": max_amount
+    })
+
+# Фонові експорти: великі вибірки формуються у файл, який можна завантажити пізніше
+class ExportJobCreate(BaseModel):
+    export: str  # users або payments
+    format: str = "xlsx"  # xlsx або csv
+    filters: Dict[str, Any] = {}  # ті ж фільтри, що у списку
+
+@app.post("/api/exports")
+async def create_export(
+    request: ExportJobCreate,
+    admin: Dict = Depends(get_current_admin_flexible)
+):
+    """Запустити фоновий експорт (або отримати готовий з тими ж фільтрами, якщо дані не змінились)"""
+    job, reused = await run_db(create_export_job, request.export, request.format, request.filters, admin.get("id"))
+    return {**job, "reused": reused}
+
+@app.get("/api/exports/{job_id}")
+def get_export(
+    job_id: int,
+    admin: Dict = Depends(get_current_admin_flexible)
+):
+    """Статус фонового експорту"""
+    job = get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return serialize_job(job)
+
+@app.get("/api/exports/{job_id}/download")
+def download_export(
+    job_id: int,
+    admin: Dict = Depends(get_current_admin_flexible)
+):
+    """Завантажити файл фонового експорту"""
+    job = get_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job.status in ("pending", "processing"):
+        raise HTTPException(status_code=409, detail="Export is not ready yet")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Export failed: {job.error_message}")
+
+    path = artifact_path(job)
+    if not path or job.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Export file has expired")
+
+    return FileResponse(
+        path,
+        media_type=EXPORT_FORMATS[job.export_format],
+        filename=f"{job.export_type}_{job.completed_at.strftime('%Y%m%d')}.{job.export_format}"
+    )
 
 @app.post("/api/users/{user_id}/subscription")
-async def update_user_subscription(
+def update_user_subscription(
     user_id: int,
     action: str,
     admin: Dict = Depends(get_current_admin_flexible)
@@ -830,7 +746,8 @@ async def update_user_subscription(
                 UPDATE users 
                 SET subscription_status = 'active',
                     subscription_active = true,
-                    subscription_end_date = DATE_ADD(NOW(), INTERVAL 1 MONTH)
+                    subscription_end_date = DATE_ADD(NOW(), INTERVAL 1 MONTH),
+                    updated_at = UTC_TIMESTAMP()
                 WHERE id = %s
             """, (user_id,))
         elif action == "deactivate":
@@ -838,19 +755,22 @@ async def update_user_subscription(
                 UPDATE users 
                 SET subscription_status = 'inactive',
                     subscription_active = false,
-                    subscription_end_date = NOW()
+                    subscription_end_date = NOW(),
+                    updated_at = UTC_TIMESTAMP()
                 WHERE id = %s
             """, (user_id,))
         elif action == "extend":
             cursor.execute("""
                 UPDATE users 
-                SET subscription_end_date = DATE_ADD(COALESCE(subscription_end_date, NOW()), INTERVAL 1 MONTH)
+                SET subscription_end_date = DATE_ADD(COALESCE(subscription_end_date, NOW()), INTERVAL 1 MONTH),
+                    updated_at = UTC_TIMESTAMP()
                 WHERE id = %s
             """, (user_id,))
         
         db.commit()
         cursor.close()
         db.close()
+        invalidate_stats()
         
         return {"success": True, "message": f"Subscription {action} successful"}
     except Exception as e:
@@ -862,7 +782,7 @@ async def update_user_subscription(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.delete("/api/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     admin: Dict = Depends(get_current_admin_flexible)
 ):
@@ -907,6 +827,7 @@ async def delete_user(
         db.commit()
         cursor.close()
         db.close()
+        invalidate_stats()
         
         return {"success": True, "message": "User deleted successfully"}
     except HTTPException:
@@ -927,7 +848,7 @@ async def delete_user(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.put("/api/users/{user_id}")
-async def update_user(
+def update_user(
     user_id: int,
     user_data: UserUpdate,
     admin: Dict = Depends(get_current_admin_flexible)
@@ -981,6 +902,9 @@ async def update_user(
             db.close()
             raise HTTPException(status_code=400, detail="No fields to update")
         
+        # updated_at (UTC, як у ORM) - для відбитку даних експорту
+        update_fields.append("updated_at = UTC_TIMESTAMP()")
+        
         # Add user_id to values
         update_values.append(user_id)
         
@@ -988,6 +912,7 @@ async def update_user(
         query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = %s"
         cursor.execute(query, tuple(update_values))
         db.commit()
+        invalidate_stats()
         
         # Fetch updated user
         cursor.execute("""
@@ -1040,7 +965,7 @@ async def update_user(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.post("/api/auth/login")
-async def login(login_data: LoginRequest):
+def login(login_data: LoginRequest):
     """Авторизація адміна"""
     admin = get_admin_by_username(login_data.username)
     
@@ -1062,6 +987,7 @@ async def login(login_data: LoginRequest):
     finally:
         cursor.close()
         db.close()
+    invalidate_admin_cache(admin["id"])
     
     # Створюємо JWT токен
     access_token = create_access_token(data={"sub": admin["id"]})
@@ -1093,7 +1019,7 @@ async def get_current_user(admin: Dict = Depends(get_current_admin_from_token)):
     }
 
 @app.get("/api/admins")
-async def get_admins(admin: Dict = Depends(get_current_admin_from_token)):
+def get_admins(admin: Dict = Depends(get_current_admin_from_token)):
     """Отримати список адмінів"""
     if not check_admin_permission(admin, "manage_admins"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1126,7 +1052,7 @@ async def get_admins(admin: Dict = Depends(get_current_admin_from_token)):
         db.close()
 
 @app.post("/api/admins")
-async def create_admin(admin_data: AdminCreate, admin: Dict = Depends(get_current_admin_from_token)):
+def create_admin(admin_data: AdminCreate, admin: Dict = Depends(get_current_admin_from_token)):
     """Створити нового адміна"""
     if not check_admin_permission(admin, "manage_admins"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1175,7 +1101,7 @@ async def create_admin(admin_data: AdminCreate, admin: Dict = Depends(get_curren
         db.close()
 
 @app.put("/api/admins/{admin_id}")
-async def update_admin(admin_id: int, admin_data: AdminUpdate, admin: Dict = Depends(get_current_admin_from_token)):
+def update_admin(admin_id: int, admin_data: AdminUpdate, admin: Dict = Depends(get_current_admin_from_token)):
     """Оновити адміна"""
     if not check_admin_permission(admin, "manage_admins"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1200,10 +1126,11 @@ async def update_admin(admin_id: int, admin_data: AdminUpdate, admin: Dict = Dep
         if update_fields:
             update_values.append(admin_id)
             cursor.execute(
-                f"UPDATE admins SET {', '.join(update_fields)}, updated_at = NOW() WHERE id = %s",
+                f"UPDATE admins SET {', '.join(update_fields)}, updated_at = UTC_TIMESTAMP() WHERE id = %s",
                 update_values
             )
             db.commit()
+            invalidate_admin_cache(admin_id)
         
         return {"success": True, "message": "Admin updated successfully"}
         
@@ -1217,7 +1144,7 @@ async def update_admin(admin_id: int, admin_data: AdminUpdate, admin: Dict = Dep
         db.close()
 
 @app.delete("/api/admins/{admin_id}")
-async def delete_admin(admin_id: int, admin: Dict = Depends(get_current_admin_from_token)):
+def delete_admin(admin_id: int, admin: Dict = Depends(get_current_admin_from_token)):
     """Видалити адміна"""
     if not check_admin_permission(admin, "manage_admins"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1236,6 +1163,7 @@ async def delete_admin(admin_id: int, admin: Dict = Depends(get_current_admin_fr
             raise HTTPException(status_code=404, detail="Admin not found")
         
         db.commit()
+        invalidate_admin_cache(admin_id)
         return {"success": True, "message": "Admin deleted successfully"}
         
     except HTTPException:
@@ -1248,7 +1176,7 @@ async def delete_admin(admin_id: int, admin: Dict = Depends(get_current_admin_fr
         db.close()
 
 @app.post("/api/admins/{admin_id}/change-password")
-async def change_admin_password(admin_id: int, password_data: AdminPasswordChange, admin: Dict = Depends(get_current_admin_from_token)):
+def change_admin_password(admin_id: int, password_data: AdminPasswordChange, admin: Dict = Depends(get_current_admin_from_token)):
     """Змінити пароль адміна (для управління іншими адмінами)"""
     # Можна змінити свій пароль або якщо є права manage_admins
     if admin["id"] != admin_id and not check_admin_permission(admin, "manage_admins"):
@@ -1274,11 +1202,12 @@ async def change_admin_password(admin_id: int, password_data: AdminPasswordChang
         
         # Оновлюємо пароль
         cursor.execute(
-            "UPDATE admins SET password_hash = %s, updated_at = NOW() WHERE id = %s",
+            "UPDATE admins SET password_hash = %s, updated_at = UTC_TIMESTAMP() WHERE id = %s",
             (new_password_hash, admin_id)
         )
         
         db.commit()
+        invalidate_admin_cache(admin_id)
         return {"success": True, "message": "Password changed successfully"}
         
     except HTTPException:
@@ -1291,7 +1220,7 @@ async def change_admin_password(admin_id: int, password_data: AdminPasswordChang
         db.close()
 
 @app.get("/api/settings")
-async def get_settings(admin: Dict = Depends(get_current_admin_flexible)):
+def get_settings(admin: Dict = Depends(get_current_admin_flexible)):
     """Отримати налаштування системи"""
     # Для адмін панелі повертаємо всі налаштування, включаючи sensitive
     all_settings = settings_manager.get_all_settings(include_sensitive=True)
@@ -1313,7 +1242,7 @@ async def get_settings(admin: Dict = Depends(get_current_admin_flexible)):
     }
 
 @app.get("/api/settings/all")
-async def get_all_settings(admin: Dict = Depends(get_current_admin_from_token)):
+def get_all_settings(admin: Dict = Depends(get_current_admin_from_token)):
     """Отримати всі налаштування для редагування"""
     if not check_admin_permission(admin, "manage_settings"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1352,7 +1281,7 @@ async def get_all_settings(admin: Dict = Depends(get_current_admin_from_token)):
         db.close()
 
 @app.put("/api/settings/{setting_key}")
-async def update_setting(setting_key: str, setting_data: SettingUpdate, admin: Dict = Depends(get_current_admin_flexible)):
+def update_setting(setting_key: str, setting_data: SettingUpdate, admin: Dict = Depends(get_current_admin_flexible)):
     """Оновити налаштування"""
     if not check_admin_permission(admin, "manage_settings"):
         raise HTTPException(status_code=403, detail="Permission denied")
@@ -1410,137 +1339,115 @@ class BroadcastCreate(BaseModel):
     button_url: Optional[str] = None
     message_blocks: Optional[list] = None  # Всі блоки повідомлення
 
+def parse_error_counts(value: Optional[str]) -> Dict[str, int]:
+    """Лічильники помилок розсилки з JSON колонки"""
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+
+def get_broadcast_target_filter(target_group: str) -> Optional[list]:
+    """Умови вибірки користувачів для цільової групи розсилки (None якщо група невідома)"""
+    if target_group == 'active':
+        # Активна - активна підписка (включає тих у кого йдуть спроби оплати)
+        return [
+            User.subscription_active == True,
+            User.subscription_cancelled == False,
+            User.subscription_paused == False
+        ]
+    if target_group == 'cancelled':
+        # Скасовані (автоматично + самі скасували)
+        return [User.subscription_cancelled == True]
+    if target_group == 'paused':
+        # Призупинені
+        return [User.subscription_paused == True]
+    if target_group == 'no_subscription':
+        # Без підписки (авторизувалися, але ніколи не купили)
+        return [
+            User.subscription_active == False,
+            User.subscription_cancelled == False,
+            User.subscription_paused == False
+        ]
+    return None
+
 @app.get("/api/broadcasts")
-async def get_broadcasts(
+def get_broadcasts(
     page: int = 1,
     limit: int = 50,
+    after: Optional[str] = None,  # курсор з next_cursor замість page
+    count: Optional[str] = None,  # exact, estimated, none
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
     """Отримати список розсилок"""
     try:
-        db = get_database()
-        cursor = db.cursor(dictionary=True)
-        
-        offset = (page - 1) * limit
-        
-        # Отримуємо розсилки з інформацією про адміна
-        cursor.execute("""
-            SELECT 
-                b.id,
-                b.target_group,
-                b.title,
-                b.message_text,
-                b.attachment_type,
-                b.attachment_url,
-                b.button_text,
-                b.button_url,
-                b.status,
-                b.total_recipients,
-                b.sent_count,
-                b.failed_count,
-                b.created_at,
-                b.started_at,
-                b.completed_at,
-                b.error_log,
-                b.full_log,
-                a.username as created_by_username
-            FROM broadcasts b
-            LEFT JOIN admins a ON b.created_by = a.id
-            ORDER BY b.created_at DESC
-            LIMIT %s OFFSET %s
-        """, (limit, offset))
-        
-        broadcasts = cursor.fetchall()
+        with database_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            try:
+                # Отримуємо розсилки з інформацією про адміна
+                result = paginate_query(
+                    cursor,
+                    """
+                    SELECT 
+                        b.id,
+                        b.target_group,
+                        b.title,
+                        b.message_text,
+                        b.attachment_type,
+                        b.attachment_url,
+                        b.button_text,
+                        b.button_url,
+                        b.status,
+                        b.total_recipients,
+                        b.sent_count,
+                        b.failed_count,
+                        b.created_at,
+                        b.started_at,
+                        b.completed_at,
+                        b.error_counts,
+                        a.username as created_by_username
+                    """,
+                    "FROM broadcasts b LEFT JOIN admins a ON b.created_by = a.id",
+                    "1=1", [],
+                    limit, page=page, after=after, count=count, alias="b"
+                )
+            finally:
+                cursor.close()
         
-        # Total count
-        cursor.execute("SELECT COUNT(*) as total FROM broadcasts")
-        result = cursor.fetchone()
-        total = result["total"] if result else 0
-        
-        cursor.close()
-        db.close()
+        broadcasts = result["rows"]
+        for broadcast in broadcasts:
+            broadcast["error_counts"] = parse_error_counts(broadcast["error_counts"])
         
         return {
             "broadcasts": broadcasts,
-            "total": total,
-            "page": page,
+            "total": result["total"],
+            "total_is_estimate": result["total_is_estimate"],
+            "page": result["current_page"],
             "limit": limit,
-            "pages": (total + limit - 1) // limit
+            "pages": result["total_pages"],
+            "next_cursor": result["next_cursor"],
+            "has_more": result["next_cursor"] is not None
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching broadcasts: {str(e)}")
 
 @app.get("/api/broadcasts/stats")
-async def get_broadcast_stats(admin: Dict = Depends(get_current_admin_flexible)) -> Dict[str, Any]:
+def get_broadcast_stats(admin: Dict = Depends(get_current_admin_flexible)) -> Dict[str, Any]:
     """Отримати статистику по групам користувачів для розсилок"""
     try:
-        db = get_database()
-        cursor = db.cursor(dictionary=True)
-        
-        # Активні підписники (включає тих у кого йдуть спроби оплати)
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE subscription_active = 1 
-            AND subscription_cancelled = 0 
-            AND subscription_paused = 0
-        """)
-        result = cursor.fetchone()
-        active_count = result["count"] if result else 0
-        
-        # Скасовані (автоматично + самі скасували)
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE subscription_cancelled = 1
-        """)
-        result = cursor.fetchone()
-        cancelled_count = result["count"] if result else 0
-        
-        # Призупинені
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE subscription_paused = 1
-        """)
-        result = cursor.fetchone()
-        paused_count = result["count"] if result else 0
-        
-        # Без підписки (авторизувалися, але ніколи не купили)
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE subscription_active = 0 
-            AND subscription_cancelled = 0 
-            AND subscription_paused = 0
-        """)
-        result = cursor.fetchone()
-        no_subscription_count = result["count"] if result else 0
-        
-        # Користувачі з доступом (для звірки хто має бути в чаті/спільноті)
-        # Включає: активні + скасовані але ще не закінчилися + призупинені але не закінчилися
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM users 
-            WHERE (
-                (subscription_active = 1 AND subscription_cancelled = 0 AND subscription_paused = 0)
-                OR (subscription_cancelled = 1 AND subscription_end_date >= NOW())
-                OR (subscription_paused = 1 AND subscription_end_date >= NOW())
-            )
-        """)
-        result = cursor.fetchone()
-        with_access_count = result["count"] if result else 0
-        
-        cursor.close()
-        db.close()
-        
+        stats = get_stats()
         return {
-            "active": active_count,
-            "cancelled": cancelled_count,
-            "paused": paused_count,
-            "no_subscription": no_subscription_count,
-            "with_access": with_access_count
+            # Активні підписники (включає тих у кого йдуть спроби оплати)
+            "active": stats["active"],
+            "cancelled": stats["cancelled"],
+            "paused": stats["paused"],
+            "no_subscription": stats["no_subscription"],
+            # Користувачі з доступом (для звірки хто має бути в чаті/спільноті)
+            "with_access": stats["with_access_subscribers"]
         }
         
     except Exception as e:
@@ -1551,7 +1458,7 @@ async def upload_broadcast_file(
     file: UploadFile = File(...),
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
-    """Завантажити файл для розсилки"""
+    """Завантажити файл для розсилки (відео оптимізується у фоні)"""
     if not check_admin_permission(admin, "manage_broadcasts"):
         raise HTTPException(status_code=403, detail="Permission denied")
     
@@ -1571,114 +1478,33 @@ async def upload_broadcast_file(
                 detail=f"File type {file.content_type} not allowed. Allowed types: images, videos, PDF, ZIP, DOCX, XLSX"
             )
         
-        # Перевіряємо розмір (максимум 50MB)
+        # Копіюємо на диск частинами з перевіркою розміру (максимум 50MB);
+        # ім'я файлу - SHA-256 вмісту, тож повторне завантаження не зберігається вдруге
         max_size = 50 * 1024 * 1024  # 50MB
-        file_content = await file.read()
-        if len(file_content) > max_size:
+        try:
+            stored_filename, file_size, deduplicated = await run_in_threadpool(
+                store_upload, file.file, BROADCASTS_DIR, file_extension(file.filename), max_size
+            )
+        except UploadTooLarge:
             raise HTTPException(status_code=400, detail="File too large. Maximum size is 50MB")
+        file_path = BROADCASTS_DIR / stored_filename
         
-        # Генеруємо унікальне ім'я файлу
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else ''
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = BROADCASTS_DIR / unique_filename
-        
-        # Обробка зображень - ресайз якщо занадто великі
-        if file.content_type.startswith('image/'):
-            try:
-                img = Image.open(io.BytesIO(file_content))
-                
-                # Telegram обмеження: рекомендовано до 5000x5000, макс 10000x10000
-                max_dimension = 4096
-                if img.width > max_dimension or img.height > max_dimension:
-                    # Зберігаємо пропорції
-                    ratio = min(max_dimension / img.width, max_dimension / img.height)
-                    new_size = (int(img.width * ratio), int(img.height * ratio))
-                    
-                    # Ресайз з високою якістю
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
-                    
-                    # Конвертуємо в RGB якщо потрібно (для JPEG)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = rgb_img
-                    
-                    # Зберігаємо оптимізоване зображення
-                    img.save(file_path, format='JPEG', quality=85, optimize=True)
-                else:
-                    # Зберігаємо оригінал якщо розмір прийнятний
-                    with open(file_path, 'wb') as f:
-                        f.write(file_content)
-            except Exception as e:
-                # Якщо помилка обробки - зберігаємо оригінал
-                with open(file_path, 'wb') as f:
-                    f.write(file_content)
-        else:
-            # Зберігаємо файл як є (відео, документи)
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
-            
-            # Оптимізуємо відео якщо це відео
-            if file.content_type.startswith('video/'):
-                try:
-                    import subprocess
-                    import tempfile
-                    
-                    # Створюємо тимчасовий файл для оптимізованого відео
-                    optimized_path = file_path.with_suffix('.optimized' + file_path.suffix)
-                    
-                    # FFmpeg команда для оптимізації відео
-                    # -c:v libx264 - кодек H.264 для стиснення
-                    # -crf 23 - якість (18-28, де 23 - баланс якості/розміру)
-                    # -preset fast - швидкість кодування
-                    # -movflags +faststart - оптимізація для streaming
-                    # -vf "scale='min(1920,iw)':'min(1080,ih)':force_original_aspect_ratio=decrease" - обмеження роздільної здатності до 1080p зберігаючи пропорції
-                    # -c:a aac -b:a 128k - аудіо кодек AAC з бітрейтом 128k
-                    cmd = [
-                        'ffmpeg',
-                        '-i', str(file_path),  # вхідний файл
-                        '-c:v', 'libx264',  # відео кодек
-                        '-crf', '23',  # якість
-                        '-preset', 'fast',  # швидкість обробки
-                        '-movflags', '+faststart',  # оптимізація для streaming
-                        '-vf', "scale='min(1920,iw)':'min(1080,ih)':force_original_aspect_ratio=decrease",  # обмеження роздільної здатності
-                        '-c:a', 'aac',  # аудіо кодек
-                        '-b:a', '128k',  # бітрейт аудіо
-                        '-y',  # перезаписати якщо існує
-                        str(optimized_path)
-                    ]
-                    
-                    # Запускаємо ffmpeg
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=300  # 5 хвилин максимум
-                    )
-                    
-                    # Якщо оптимізація успішна і файл менший
-                    if result.returncode == 0 and optimized_path.exists():
-                        optimized_size = optimized_path.stat().st_size
-                        original_size = file_path.stat().st_size
-                        
-                        # Використовуємо оптимізований тільки якщо він менший
-                        if optimized_size < original_size:
-                            os.remove(file_path)  # Видаляємо оригінал
-                            os.rename(optimized_path, file_path)  # Перейменовуємо оптимізований
-                            logger.info(f"Video optimized: {original_size} -> {optimized_size} bytes ({100 * optimized_size / original_size:.1f}%)")
-                        else:
-                            os.remove(optimized_path)  # Видаляємо оптимізований якщо він більший
-                            logger.info(f"Video optimization skipped - optimized file is larger")
-                    else:
-                        logger.warning(f"Video optimization failed: {result.stderr}")
-                        if optimized_path.exists():
-                            os.remove(optimized_path)
-                            
-                except Exception as e:
-                    logger.error(f"Video optimization error: {e}")
-                    # Продовжуємо з оригінальним файлом при помилці оптимізації
+        # Формуємо URL для доступу до файлу
+        file_url = f"/uploads/broadcasts/{stored_filename}"
+        
+        # Обробка в окремому процесі / фоні; оригінал не змінюється, результати - у variants/
+        optimization_job = None
+        variants = {}
+        if deduplicated:
+            # Файл уже оброблений раніше (або оптимізується зараз)
+            optimization_job = find_active_transcode_job(file_url)
+            variants = existing_variants(file_path)
+        elif file.content_type.startswith('image/'):
+            # Прев'ю для адмін-панелі та версія для Telegram (якщо оригінал більший за ліміти фото)
+            variants = await optimize_image(file_path)
+        elif file.content_type.startswith('video/'):
+            # Оптимізація відео у фоні; до її завершення бот відправляє оригінал
+            optimization_job = start_video_optimization(file_path, file_url)
         
         # Визначаємо тип вкладення
         attachment_type = None
@@ -1689,16 +1515,20 @@ async def upload_broadcast_file(
         else:
             attachment_type = 'document'  # Змінено з 'file' на 'document' для сумісності з фронтендом
         
-        # Формуємо URL для доступу до файлу
-        file_url = f"/uploads/broadcasts/{unique_filename}"
-        
         return {
             "success": True,
             "filename": file.filename,
             "url": file_url,
             "attachment_type": attachment_type,
-            "size": len(file_content),
-            "content_type": file.content_type
+            "size": file_size,
+            "content_type": file.content_type,
+            "processing": optimization_job is not None,
+            "job_id": optimization_job,
+            "deduplicated": deduplicated,
+            "variants": {
+                name: f"/uploads/broadcasts/{VARIANTS_DIR_NAME}/{path.name}"
+                for name, path in variants.items()
+            }
         }
         
     except HTTPException:
@@ -1706,8 +1536,22 @@ async def upload_broadcast_file(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+@app.get("/api/broadcasts/upload/{job_id}")
+def get_upload_processing_status(
+    job_id: str,
+    admin: Dict = Depends(get_current_admin_flexible)
+) -> Dict[str, Any]:
+    """Статус фонової оптимізації завантаженого відео"""
+    if not check_admin_permission(admin, "manage_broadcasts"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    job = get_transcode_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Processing job not found")
+    return job
+
 @app.delete("/api/broadcasts/file")
-async def delete_broadcast_file(
+def delete_broadcast_file(
     file_url: str,
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
@@ -1737,9 +1581,16 @@ async def delete_broadcast_file(
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid file path")
         
+        # Один файл може використовуватись кількома розсилками (однаковий вміст - одне ім'я)
+        references = DatabaseManager.count_media_references(file_url)
+        if references:
+            return {"success": True, "message": f"File is used by {references} broadcast(s), kept", "references": references}
+        
         # Видаляємо файл якщо він існує
         if file_path.exists() and file_path.is_file():
             os.remove(file_path)
+            for variant_file in existing_variants(file_path).values():
+                variant_file.unlink(missing_ok=True)
             return {"success": True, "message": "File deleted"}
         else:
             return {"success": True, "message": "File not found"}
@@ -1750,7 +1601,7 @@ async def delete_broadcast_file(
         raise HTTPException(status_code=500, detail=f"Error deleting file: {str(e)}")
 
 @app.post("/api/broadcasts")
-async def create_broadcast(
+def create_broadcast(
     broadcast_data: BroadcastCreate,
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
@@ -1770,6 +1621,10 @@ async def create_broadcast(
         logger.info(f"  message_text: {broadcast_data.message_text[:50] if broadcast_data.message_text else None}")
         logger.info(f"  attachment_type: {broadcast_data.attachment_type}")
         
+        target_filter = get_broadcast_target_filter(broadcast_data.target_group)
+        if target_filter is None:
+            raise HTTPException(status_code=400, detail="Invalid target group")
+        
         with DatabaseManager() as db:
             # Створюємо розсилку
             broadcast = Broadcast(
@@ -1794,59 +1649,38 @@ async def create_broadcast(
             
             logger.info(f"Broadcast created with ID: {broadcast.id}, title in object: '{broadcast.title}'")
             
-            # Вибираємо користувачів за групою
-            if broadcast_data.target_group == 'active':
-                # Активна - активна підписка (включає тих у кого йдуть спроби оплати)
-                users = db.query(User).filter(
-                    User.subscription_active == True,
-                    User.subscription_cancelled == False,
-                    User.subscription_paused == False
-                ).all()
-            elif broadcast_data.target_group == 'cancelled':
-                # Скасовані (автоматично + самі скасували)
-                users = db.query(User).filter(User.subscription_cancelled == True).all()
-            elif broadcast_data.target_group == 'paused':
-                # Призупинені
-                users = db.query(User).filter(User.subscription_paused == True).all()
-            elif broadcast_data.target_group == 'no_subscription':
-                # Без підписки (авторизувалися, але ніколи не купили)
-                users = db.query(User).filter(
-                    User.subscription_active == False,
-                    User.subscription_cancelled == False,
-                    User.subscription_paused == False
-                ).all()
-            else:
-                raise HTTPException(status_code=400, detail="Invalid target group")
-            
-            # Додаємо користувачів в чергу
-            for user in users:
-                queue_item = BroadcastQueue(
-                    broadcast_id=broadcast.id,
-                    user_id=user.id,
-                    telegram_id=user.telegram_id
+            # Заповнюємо чергу одним INSERT ... SELECT за умовою цільової групи
+            # Користувачі зі списку недоступних (заблокували бота тощо) в чергу не потрапляють
+            recipients = select(
+                literal(broadcast.id), User.id, User.telegram_id, literal('pending'), literal(datetime.utcnow())
+            ).where(*target_filter, recipient_not_suppressed())
+            result = db.execute(
+                insert(BroadcastQueue).from_select(
+                    ['broadcast_id', 'user_id', 'telegram_id', 'status', 'created_at'],
+                    recipients
                 )
-                db.add(queue_item)
+            )
+            total_recipients = result.rowcount
             
-            broadcast.total_recipients = len(users)
+            broadcast.total_recipients = total_recipients
             db.commit()
             
-            # Запускаємо обробку розсилки в фоновому режимі
-            broadcast_id_to_process = broadcast.id
-            
-        # Запускаємо обробку після commit (поза контекстом db)
-        asyncio.create_task(process_broadcast_async(broadcast_id_to_process))
+            # Розсилку відправляє воркер (start_broadcast_worker.py), API лише ставить її в чергу
+            broadcast_id = broadcast.id
             
         return {
             "success": True,
-            "broadcast_id": broadcast_id_to_process,
-            "total_recipients": len(users)
+            "broadcast_id": broadcast_id,
+            "total_recipients": total_recipients
         }
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating broadcast: {str(e)}")
 
 @app.get("/api/broadcasts/{broadcast_id}")
-async def get_broadcast_detail(
+def get_broadcast_detail(
     broadcast_id: int,
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
@@ -1872,6 +1706,11 @@ async def get_broadcast_detail(
         cursor.close()
         db.close()
         
+        # Деталі доставки віддаються окремо через /deliveries
+        broadcast.pop("error_log", None)
+        broadcast.pop("full_log", None)
+        broadcast["error_counts"] = parse_error_counts(broadcast.get("error_counts"))
+        
         return {"broadcast": broadcast}
         
     except HTTPException:
@@ -1879,13 +1718,130 @@ async def get_broadcast_detail(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching broadcast: {str(e)}")
 
+@app.get("/api/broadcasts/{broadcast_id}/deliveries")
+def get_broadcast_deliveries(
+    broadcast_id: int,
+    status: Optional[str] = None,
+    error_code: Optional[str] = None,
+    after_id: int = 0,
+    limit: int = 100,
+    admin: Dict = Depends(get_current_admin_flexible)
+) -> Dict[str, Any]:
+    """Результати доставки розсилки по отримувачах (посторінково за id)"""
+    limit = max(1, min(limit, 1000))
+    
+    try:
+        db = get_database()
+        cursor = db.cursor(dictionary=True)
+        
+        where = ["broadcast_id = %s", "id > %s"]
+        params = [broadcast_id, after_id]
+        if status:
+            where.append("status = %s")
+            params.append(status)
+        if error_code:
+            where.append("error_code = %s")
+            params.append(error_code)
+        
+        cursor.execute(f"""
+            SELECT id, user_id, telegram_id, status, error_code, error_message, sent_at
+            FROM broadcast_queue
+            WHERE {' AND '.join(where)}
+            ORDER BY id
+            LIMIT %s
+        """, (*params, limit))
+        
+        deliveries = cursor.fetchall()
+        
+        cursor.close()
+        db.close()
+        
+        return {
+            "deliveries": deliveries,
+            "next_after_id": deliveries[-1]["id"] if len(deliveries) == limit else None
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching broadcast deliveries: {str(e)}")
+
+def fetch_broadcast_progress(broadcast_id: int) -> Optional[Dict[str, Any]]:
+    """Статус, лічильники та останній знімок прогресу розсилки (None якщо не знайдено)"""
+    with database_connection() as db:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT id, status, total_recipients, sent_count, failed_count,
+                   started_at, completed_at, progress
+            FROM broadcasts
+            WHERE id = %s
+        """, (broadcast_id,))
+        broadcast = cursor.fetchone()
+        cursor.close()
+    
+    if broadcast:
+        broadcast["progress"] = json.loads(broadcast["progress"]) if broadcast["progress"] else None
+    return broadcast
+
+@app.get("/api/broadcasts/{broadcast_id}/progress")
+def get_broadcast_progress(
+    broadcast_id: int,
+    admin: Dict = Depends(get_current_admin_flexible)
+) -> Dict[str, Any]:
+    """Поточний прогрес розсилки (відправлено, швидкість, ETA)"""
+    try:
+        broadcast = fetch_broadcast_progress(broadcast_id)
+        if not broadcast:
+            raise HTTPException(status_code=404, detail="Broadcast not found")
+        return broadcast
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching broadcast progress: {str(e)}")
+
+@app.get("/api/broadcasts/{broadcast_id}/progress/stream")
+async def stream_broadcast_progress(
+    broadcast_id: int,
+    admin: Dict = Depends(get_current_admin_flexible)
+):
+    """Прогрес розсилки як Server-Sent Events (до завершення розсилки)"""
+    if not await run_db(fetch_broadcast_progress, broadcast_id):
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    
+    async def event_stream():
+        last_payload = None
+        while True:
+            broadcast = await run_db(fetch_broadcast_progress, broadcast_id)
+            if not broadcast:
+                break
+            
+            payload = json.dumps(broadcast, default=str)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            else:
+                # Коментар SSE, щоб проксі не закривав з'єднання
+                yield ": keep-alive\n\n"
+            
+            if broadcast["status"] not in ('pending', 'processing'):
+                break
+            await asyncio.sleep(settings.broadcast_progress_interval)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/logs/{service}")
-async def get_service_logs(
+def get_service_logs(
     service: str,
     lines: int = 100,
+    after: Optional[int] = None,  # end_offset попередньої відповіді - лише нові рядки
+    before: Optional[int] = None,  # start_offset попередньої відповіді - старіші рядки
+    grep: Optional[str] = None,  # фільтр рядків (підрядок, без урахування регістру)
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
-    """Отримати логи сервісу"""
+    """Отримати логи сервісу (читаються лише потрібні рядки з кінця файлу)"""
     try:
         # Мапінг сервісів на файли логів
         log_files = {
@@ -1911,16 +1867,20 @@ async def get_service_logs(
                 "message": f"Log file {log_files[service]} not found"
             }
         
-        # Читаємо останні N рядків
-        with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
-            all_lines = f.readlines()
-            log_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
+        if after is not None:
+            chunk = read_log_after(log_path, after, lines, grep)
+        else:
+            chunk = read_log_tail(log_path, lines, grep, before)
         
         return {
             "success": True,
             "service": service,
-            "logs": [line.rstrip('\n') for line in log_lines],
-            "total_lines": len(log_lines),
+            "logs": chunk["lines"],
+            "total_lines": len(chunk["lines"]),
+            "start_offset": chunk["start_offset"],
+            "end_offset": chunk["end_offset"],
+            "has_more": chunk["has_more"],
+            "reset": chunk["reset"],
             "file_path": str(log_path)
         }
         
@@ -1931,11 +1891,13 @@ async def get_service_logs(
 
 
 @app.get("/api/system-logs")
-async def get_system_logs(
+def get_system_logs(
     page: int = 1,
     limit: int = 50,
     task_type: Optional[str] = None,
     status: Optional[str] = None,
+    after: Optional[str] = None,  # курсор з pagination.next_cursor замість page
+    count: Optional[str] = None,  # exact, estimated, none
     admin: Dict = Depends(get_current_admin_flexible)
 ) -> Dict[str, Any]:
     """Отримати системні логи автоматичних задач"""
@@ -1943,8 +1905,6 @@ async def get_system_logs(
         db = get_database()
         cursor = db.cursor(dictionary=True)
         
-        offset = (page - 1) * limit
-        
         # Будуємо WHERE умови
         where_conditions = []
         query_params = []
@@ -1959,21 +1919,13 @@ async def get_system_logs(
         
         where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
         
-        # Підраховуємо загальну кількість
-        count_sql = f"SELECT COUNT(*) as total FROM system_logs WHERE {where_clause}"
-        cursor.execute(count_sql, tuple(query_params))
-        result = cursor.fetchone()
-        total_logs = result["total"] if result else 0
-        
         # Отримуємо логи
-        logs_sql = f"""
-            SELECT * FROM system_logs 
-            WHERE {where_clause}
-            ORDER BY created_at DESC 
-            LIMIT %s OFFSET %s
-        """
-        cursor.execute(logs_sql, tuple(query_params + [limit, offset]))
-        logs = cursor.fetchall() or []
+        result = paginate_query(
+            cursor, "SELECT *", "FROM system_logs", where_clause, query_params,
+            limit, page=page, after=after, count=count
+        )
+        logs = result["rows"]
+        total_logs = result["total"]
         
         # Convert datetime objects to ISO strings
         for log in logs:
@@ -1987,8 +1939,6 @@ async def get_system_logs(
                 except:
                     pass
         
-        total_pages = (total_logs + limit - 1) // limit if total_logs > 0 else 1
-        
         # Отримуємо статистику
         stats_sql = """
             SELECT 
@@ -2012,12 +1962,19 @@ async def get_system_logs(
             "total": total_logs,
             "stats": stats,
             "pagination": {
-                "current_page": page,
-                "total_pages": total_pages,
+                "current_page": result["current_page"],
+                "total_pages": result["total_pages"],
                 "total_logs": total_logs,
-                "per_page": limit
+                "total_is_estimate": result["total_is_estimate"],
+                "per_page": limit,
+                "next_cursor": result["next_cursor"],
+                "has_more": result["next_cursor"] is not None
             }
         }
+    except HTTPException:
+        if 'db' in locals():
+            db.close()
+        raise
     except Exception as e:
         if 'db' in locals():
             try:
@@ -2039,10 +1996,9 @@ async def test_check_upcoming_payment(data: dict, admin: Dict = Depends(get_curr
         
         from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
         bot = Bot(token=settings.telegram_bot_token)
         
@@ -2077,10 +2033,9 @@ async def test_expired_subscription(data: dict, admin: Dict = Depends(get_curren
         from telegram import Bot
         from bot.keyboards import get_subscription_offer_keyboard
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
         bot = Bot(token=settings.telegram_bot_token)
         
@@ -2137,26 +2092,25 @@ async def test_paused_subscription_reminder(data: dict, admin: Dict = Depends(ge
         
         from telegram import Bot
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            bot = Bot(token=settings.telegram_bot_token)
-            
-            # Нагадування за 7 днів до закінчення доступу до студії та спільноти
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton("✨ В головне меню", callback_data="main_menu")],
-                [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
-            ])
-            
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text="🎀 Доступ до студії та спільноти закінчиться через 7 днів.\n\nЩоб продовжити доступ понови підписку у своєму кабінеті.",
-                reply_markup=keyboard
-            )
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        bot = Bot(token=settings.telegram_bot_token)
+        
+        # Нагадування за 7 днів до закінчення доступу до студії та спільноти
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("✨ В головне меню", callback_data="main_menu")],
+            [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
+        ])
+        
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text="🎀 Доступ до студії та спільноти закінчиться через 7 днів.\n\nЩоб продовжити доступ понови підписку у своєму кабінеті.",
+            reply_markup=keyboard
+        )
         
         return {"success": True, "message": "Test reminder sent successfully"}
     except HTTPException:
@@ -2176,32 +2130,31 @@ async def test_join_reminder(data: dict, admin: Dict = Depends(get_current_admin
         
         from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            # Отримуємо реальні посилання з БД
-            invite_links = DatabaseManager.get_active_invite_links()
-            
-            keyboard = []
-            for link in invite_links:
-                if link.chat_type == "channel":
-                    button_text = "🩵 Приєднатися до каналу"
-                    keyboard.append([InlineKeyboardButton(text=button_text, url=link.invite_link)])
-                elif link.chat_type == "group" or link.link_type == "group":
-                    button_text = "💬 Приєднатися до чату"
-                    keyboard.append([InlineKeyboardButton(text=button_text, url=link.invite_link)])
-            
-            bot = Bot(token=settings.telegram_bot_token)
-            
-            # Реальний текст з scheduler.py _get_join_channel_reminder
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text="⏰ Нагадування!\n\nВи ще не приєдналися до каналу та чату. \nДля участі у тренуваннях обов'язково приєднайтеся:\n\n⚠️ Важливо: приєднайтеся протягом доби, інакше буду нагадувати",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        # Отримуємо реальні посилання з БД
+        invite_links = await run_db(DatabaseManager.get_active_invite_links)
+        
+        keyboard = []
+        for link in invite_links:
+            if link.chat_type == "channel":
+                button_text = "🩵 Приєднатися до каналу"
+                keyboard.append([InlineKeyboardButton(text=button_text, url=link.invite_link)])
+            elif link.chat_type == "group" or link.link_type == "group":
+                button_text = "💬 Приєднатися до чату"
+                keyboard.append([InlineKeyboardButton(text=button_text, url=link.invite_link)])
+        
+        bot = Bot(token=settings.telegram_bot_token)
+        
+        # Реальний текст з scheduler.py _get_join_channel_reminder
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text="⏰ Нагадування!\n\nВи ще не приєдналися до каналу та чату. \nДля участі у тренуваннях обов'язково приєднайтеся:\n\n⚠️ Важливо: приєднайтеся протягом доби, інакше буду нагадувати",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
         
         return {"success": True, "message": "Test join reminder sent successfully"}
     except HTTPException:
@@ -2222,44 +2175,43 @@ async def test_paused_expired_renewal(data: dict, admin: Dict = Depends(get_curr
         from telegram import Bot
         from bot.keyboards import get_subscription_offer_keyboard
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            bot = Bot(token=settings.telegram_bot_token)
-            
-            # Повідомлення про закінчення підписки з пропозицією оформлення
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-            from payments import StripeManager
-            
-            # Створюємо checkout session для оплати
-            bot_username = "upgrade21studio_bot"
-            success_url = f"https://t.me/{bot_username}"
-            cancel_url = f"https://t.me/{bot_username}?start=payment_cancelled"
-            
-            checkout_data = await StripeManager.create_checkout_session(
-                telegram_id=user.telegram_id,
-                success_url=success_url,
-                cancel_url=cancel_url
-            )
-            
-            if checkout_data:
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("💳 Оформити підписку", url=checkout_data['url'])],
-                    [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
-                ])
-            else:
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("💳 Оформити підписку", callback_data="create_subscription")],
-                    [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
-                ])
-            
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text="🎀 Твоя підписка закінчилась.\n\nЩоб відновити доступ до студії та спільноти, потрібно оформити нову підписку. Якщо у тебе виникли будь-які питання — буду рада відповісти.",
-                reply_markup=keyboard
-            )
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        bot = Bot(token=settings.telegram_bot_token)
+        
+        # Повідомлення про закінчення підписки з пропозицією оформлення
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        from payments import StripeManager
+        
+        # Створюємо checkout session для оплати
+        bot_username = "upgrade21studio_bot"
+        success_url = f"https://t.me/{bot_username}"
+        cancel_url = f"https://t.me/{bot_username}?start=payment_cancelled"
+        
+        checkout_data = await StripeManager.create_checkout_session(
+            telegram_id=user.telegram_id,
+            success_url=success_url,
+            cancel_url=cancel_url
+        )
+        
+        if checkout_data:
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("💳 Оформити підписку", url=checkout_data['url'])],
+                [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
+            ])
+        else:
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("💳 Оформити підписку", callback_data="create_subscription")],
+                [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
+            ])
+        
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text="🎀 Твоя підписка закінчилась.\n\nЩоб відновити доступ до студії та спільноти, потрібно оформити нову підписку. Якщо у тебе виникли будь-які питання — буду рада відповісти.",
+            reply_markup=keyboard
+        )
         
         return {"success": True, "message": "Test paused-expired renewal scenario sent successfully"}
     except HTTPException:
@@ -2280,44 +2232,43 @@ async def test_cancelled_expired_renewal(data: dict, admin: Dict = Depends(get_c
         from telegram import Bot
         from bot.keyboards import get_subscription_offer_keyboard
         
-        with DatabaseManager() as db:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
-            
-            bot = Bot(token=settings.telegram_bot_token)
-            
-            # Повідомлення про закінчення підписки з пропозицією оформлення
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-            from payments import StripeManager
-            
-            # Створюємо checkout session для оплати
-            bot_username = "upgrade21studio_bot"
-            success_url = f"https://t.me/{bot_username}"
-            cancel_url = f"https://t.me/{bot_username}?start=payment_cancelled"
-            
-            checkout_data = await StripeManager.create_checkout_session(
-                telegram_id=user.telegram_id,
-                success_url=success_url,
-                cancel_url=cancel_url
-            )
-            
-            if checkout_data:
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("💳 Оформити підписку", url=checkout_data['url'])],
-                    [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
-                ])
-            else:
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("💳 Оформити підписку", callback_data="create_subscription")],
-                    [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
-                ])
-            
-            await bot.send_message(
-                chat_id=user.telegram_id,
-                text="🎀 Твоя підписка закінчилась.\n\nЩоб відновити доступ до студії та спільноти, потрібно оформити нову підписку. Якщо у тебе виникли будь-які питання — буду рада відповісти.",
-                reply_markup=keyboard
-            )
+        user = await run_db(DatabaseManager.get_user_by_telegram_id, telegram_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        bot = Bot(token=settings.telegram_bot_token)
+        
+        # Повідомлення про закінчення підписки з пропозицією оформлення
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        from payments import StripeManager
+        
+        # Створюємо checkout session для оплати
+        bot_username = "upgrade21studio_bot"
+        success_url = f"https://t.me/{bot_username}"
+        cancel_url = f"https://t.me/{bot_username}?start=payment_cancelled"
+        
+        checkout_data = await StripeManager.create_checkout_session(
+            telegram_id=user.telegram_id,
+            success_url=success_url,
+            cancel_url=cancel_url
+        )
+        
+        if checkout_data:
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("💳 Оформити підписку", url=checkout_data['url'])],
+                [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
+            ])
+        else:
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("💳 Оформити підписку", callback_data="create_subscription")],
+                [InlineKeyboardButton("❓ Задати питання", url="https://t.me/alionakovaliova")]
+            ])
+        
+        await bot.send_message(
+            chat_id=user.telegram_id,
+            text="🎀 Твоя підписка закінчилась.\n\nЩоб відновити доступ до студії та спільноти, потрібно оформити нову підписку. Якщо у тебе виникли будь-які питання — буду рада відповісти.",
+            reply_markup=keyboard
+        )
         
         return {"success": True, "message": "Test cancelled-expired renewal scenario sent successfully"}
     except HTTPException:
@@ -0,0 +1,137 @@
+"""
+Статистика для адмін-панелі: лічильники користувачів і платежів одним проходом.
+
+Результат зберігається в stats_snapshots; кешу в пам'яті процесу немає, щоб позначку
+застарілості з будь-якого процесу (бот, webhook, планувальник) було видно одразу. Webhook-и, зміни користувачів в адмін-панелі, реєстрація та оплата в боті і
+щоденна перевірка закінчених підписок позначають знімок застарілим
+(DatabaseManager.mark_stats_stale), тож наступний запит перераховує його.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from config import settings
+from database.models import DatabaseManager, database_connection
+
+SNAPSHOT_NAME = 'dashboard'
+
+# Усі сегменти підписок за один прохід по users
+USER_STATS_SQL = """
+    SELECT
+        COUNT(*) AS total,
+        SUM(CASE WHEN subscription_active = 1 AND auto_payment_enabled = 1 THEN 1 ELSE 0 END) AS active_auto_payment,
+        SUM(CASE WHEN subscription_active = 0 OR auto_payment_enabled = 0 THEN 1 ELSE 0 END) AS inactive,
+        SUM(CASE WHEN subscription_active = 1 AND subscription_cancelled = 0 AND subscription_paused = 0 THEN 1 ELSE 0 END) AS active,
+        SUM(CASE WHEN subscription_cancelled = 1 THEN 1 ELSE 0 END) AS cancelled,
+        SUM(CASE WHEN subscription_paused = 1 THEN 1 ELSE 0 END) AS paused,
+        SUM(CASE WHEN subscription_active = 0 AND subscription_cancelled = 0 AND subscription_paused = 0 THEN 1 ELSE 0 END) AS no_subscription,
+        SUM(CASE WHEN (subscription_active = 1 AND auto_payment_enabled = 1)
+                   OR ((subscription_cancelled = 1 OR subscription_paused = 1) AND subscription_end_date >= NOW())
+                 THEN 1 ELSE 0 END) AS with_access,
+        SUM(CASE WHEN (subscription_active = 1 AND subscription_cancelled = 0 AND subscription_paused = 0)
+                   OR ((subscription_cancelled = 1 OR subscription_paused = 1) AND subscription_end_date >= NOW())
+                 THEN 1 ELSE 0 END) AS with_access_subscribers
+    FROM users
+"""
+
+# Виручка та платежі за сьогодні за один прохід по payments
+PAYMENT_STATS_SQL = """
+    SELECT
+        COALESCE(SUM(amount), 0) AS total_revenue,
+        SUM(CASE WHEN created_at >= CURDATE() THEN 1 ELSE 0 END) AS payments_today,
+        COALESCE(SUM(CASE WHEN created_at >= CURDATE() THEN amount ELSE 0 END), 0) AS revenue_today
+    FROM payments
+    WHERE status IN ('succeeded', 'completed')
+"""
+
+_compute_lock = threading.Lock()
+
+
+def compute_stats(cursor) -> Dict[str, Any]:
+    """Порахувати статистику (два запити замість окремого COUNT на кожен сегмент)"""
+    cursor.execute(USER_STATS_SQL)
+    users = cursor.fetchone() or {}
+    cursor.execute(PAYMENT_STATS_SQL)
+    payments = cursor.fetchone() or {}
+
+    # MySQL повертає SUM як Decimal (або NULL для порожньої таблиці)
+    stats = {key: int(value or 0) for key, value in users.items()}
+    stats['payments_today'] = int(payments.get('payments_today') or 0)
+    stats['total_revenue'] = float(payments.get('total_revenue') or 0)  # сума вже в євро
+    stats['revenue_today'] = float(payments.get('revenue_today') or 0)
+    return stats
+
+
+def _load_snapshot(cursor) -> Optional[Dict[str, Any]]:
+    """Збережений знімок, якщо він ще актуальний"""
+    cursor.execute(
+        "SELECT data, computed_at, invalidated_at FROM stats_snapshots WHERE name = %s",
+        (SNAPSHOT_NAME,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    computed_at = row['computed_at']
+    if row['invalidated_at'] and row['invalidated_at'] >= computed_at:
+        return None
+    if datetime.utcnow() - computed_at > timedelta(seconds=settings.stats_snapshot_ttl):
+        return None
+    # payments_today рахується від початку доби
+    if computed_at.date() != datetime.utcnow().date():
+        return None
+
+    stats = json.loads(row['data'])
+    stats['computed_at'] = computed_at.isoformat() + 'Z'
+    return stats
+
+
+def _refresh_snapshot(db) -> Dict[str, Any]:
+    """Перерахувати статистику та зберегти знімок"""
+    # Час фіксуємо до підрахунку: зміни під час підрахунку залишать знімок застарілим
+    computed_at = datetime.utcnow().replace(microsecond=0)
+    cursor = db.cursor(dictionary=True)
+    try:
+        stats = compute_stats(cursor)
+        cursor.execute("""
+            INSERT INTO stats_snapshots (name, data, computed_at, invalidated_at)
+            VALUES (%s, %s, %s, NULL)
+            ON DUPLICATE KEY UPDATE
+                data = VALUES(data),
+                computed_at = VALUES(computed_at)
+        """, (SNAPSHOT_NAME, json.dumps(stats), computed_at))
+        db.commit()
+    finally:
+        cursor.close()
+
+    stats['computed_at'] = computed_at.isoformat() + 'Z'
+    return stats
+
+
+def _read_snapshot(db) -> Optional[Dict[str, Any]]:
+    cursor = db.cursor(dictionary=True)
+    try:
+        return _load_snapshot(cursor)
+    finally:
+        cursor.close()
+
+
+def get_stats() -> Dict[str, Any]:
+    """Статистика зі збереженого знімка (запит за первинним ключем) або перерахована"""
+    with database_connection() as db:
+        stats = _read_snapshot(db)
+        if stats is not None:
+            return stats
+
+        # Одночасні запити чекають на один перерахунок замість запуску власних
+        with _compute_lock:
+            stats = _read_snapshot(db)
+            if stats is None:
+                stats = _refresh_snapshot(db)
+        return stats
+
+
+def invalidate_stats():
+    """Позначити знімок застарілим після змін користувачів чи платежів"""
+    DatabaseManager.mark_stats_stale()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк відправки розсилок без реальних користувачів.
+
+Запускає BroadcastHandler проти локального фейкового Telegram Bot API
+(налаштовувана затримка, 429 retry_after, частка заблокованих користувачів)
+на синтетичній SQLite базі з N отримувачів і виводить:
+msgs/sec, p50/p95/p99 затримки запитів, час у БД та пікове RSS.
+
+Приклад:
+    python benchmark_broadcast.py --recipients 5000 --latency-ms 40 --server-rate 30 --blocked-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+FAKE_TOKEN = "123456:BENCHMARK"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Broadcast sender benchmark with a fake Telegram Bot API")
+    parser.add_argument("--recipients", type=int, default=1000, help="кількість отримувачів")
+    parser.add_argument("--message", choices=("text", "photo", "album"), default="text",
+                        help="text - текст з кнопкою, photo - фото з підписом, album - текст + 3 фото")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="середня затримка відповіді Bot API")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="розкид затримки")
+    parser.add_argument("--server-rate", type=float, default=30.0,
+                        help="ліміт фейкового API (запитів/сек), понад нього - 429; 0 - без ліміту")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="частка випадкових 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after у відповідях 429 (секунд)")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="частка користувачів, що заблокували бота")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="частка 'chat not found'")
+    parser.add_argument("--workers", type=int, default=None, help="BROADCAST_WORKERS")
+    parser.add_argument("--rate-limit", type=float, default=None, help="BROADCAST_RATE_LIMIT")
+    parser.add_argument("--chunk-size", type=int, default=None, help="BROADCAST_CHUNK_SIZE")
+    parser.add_argument("--db", default=None, help="шлях до SQLite файлу (за замовчуванням тимчасовий)")
+    parser.add_argument("--port", type=int, default=8765, help="порт фейкового Bot API")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def configure_environment(args) -> str:
+    """Налаштувати оточення до імпорту config/database (SQLite замість робочої БД)"""
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="broadcast_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["TELEGRAM_BOT_TOKEN"] = FAKE_TOKEN
+    for key in ("PRIVATE_CHANNEL_ID", "PRIVATE_CHAT_ID", "ADMIN_CHAT_ID"):
+        os.environ.setdefault(key, "-1000000000000")
+    os.environ.setdefault("ADMIN_PASSWORD", "benchmark")
+    return db_path
+
+
+class FakeBotApi:
+    """Фейковий Telegram Bot API на aiohttp"""
+
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.message_id = 0
+        self.requests = 0
+        self.delivered = 0
+        self.responses = {}
+        self._window = []  # час запитів за останню секунду (для --server-rate)
+        self._unreachable = {}
+
+    def _unreachable_error(self, chat_id: str):
+        """Стабільний для користувача результат: заблокував / не існує / доступний"""
+        if chat_id not in self._unreachable:
+            roll = self.random.random()
+            if roll < self.args.blocked_rate:
+                self._unreachable[chat_id] = (403, "Forbidden: bot was blocked by the user")
+            elif roll < self.args.blocked_rate + self.args.not_found_rate:
+                self._unreachable[chat_id] = (400, "Bad Request: chat not found")
+            else:
+                self._unreachable[chat_id] = None
+        return self._unreachable[chat_id]
+
+    def _over_rate(self) -> bool:
+        if not self.args.server_rate:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        self._window.append(now)
+        return len(self._window) > self.args.server_rate
+
+    def _message(self, method: str, chat_id: str, params) -> dict:
+        self.message_id += 1
+        message = {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+        }
+        file_id = f"bench-file-{method}"
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+        elif method == "sendVideo":
+            message["video"] = {"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 360, "duration": 10}
+        elif method == "sendDocument":
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    def _reply(self, status: int, payload: dict):
+        from aiohttp import web
+        self.responses[status] = self.responses.get(status, 0) + 1
+        return web.json_response(payload, status=status)
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = await request.post()
+        self.requests += 1
+
+        delay = max(0.0, self.random.gauss(self.args.latency_ms, self.args.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if method == "getMe":
+            return self._reply(200, {"ok": True, "result": {
+                "id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"
+            }})
+
+        if self._over_rate() or self.random.random() < self.args.retry_after_rate:
+            return self._reply(429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.args.retry_after}",
+                "parameters": {"retry_after": self.args.retry_after}
+            })
+
+        chat_id = params.get("chat_id", "0")
+        error = self._unreachable_error(chat_id)
+        if error:
+            return self._reply(error[0], {"ok": False, "error_code": error[0], "description": error[1]})
+
+        self.delivered += 1
+        return self._reply(200, {"ok": True, "result": self._message(method, chat_id, params)})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", self.args.port).start()
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def create_dataset(args) -> int:
+    """Створити N користувачів і розсилку; повертає id розсилки"""
+    from sqlalchemy import insert, literal, select
+    from database.models import Base, engine, DatabaseManager, User, Broadcast, BroadcastQueue
+
+    Base.metadata.create_all(bind=engine)
+
+    now = time.time()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"telegram_id": 100000000 + i, "first_name": f"User {i}", "subscription_active": True,
+             "subscription_cancelled": False, "subscription_paused": False}
+            for i in range(args.recipients)
+        ])
+
+    blocks = [{"type": "text", "content": "*Benchmark* broadcast"}]
+    if args.message == "photo":
+        blocks.append({"type": "image", "fileUrl": "https://example.com/bench.jpg"})
+    elif args.message == "album":
+        blocks += [{"type": "image", "fileUrl": f"https://example.com/bench{i}.jpg"} for i in range(3)]
+    blocks.append({"type": "button", "buttonText": "Open", "buttonUrl": "https://example.com"})
+
+    with DatabaseManager() as db:
+        broadcast = Broadcast(
+            created_by=1, target_group="active", title="Benchmark",
+            message_blocks=json.dumps(blocks), status="pending"
+        )
+        db.add(broadcast)
+        db.flush()
+        result = db.execute(insert(BroadcastQueue).from_select(
+            ["broadcast_id", "user_id", "telegram_id", "status"],
+            select(literal(broadcast.id), User.id, User.telegram_id, literal("pending"))
+        ))
+        broadcast.total_recipients = result.rowcount
+        broadcast_id = broadcast.id
+
+    print(f"Dataset: {args.recipients} recipients, message={args.message} ({time.time() - now:.2f}s to create)")
+    return broadcast_id
+
+
+def instrument_database():
+    """Рахувати час і кількість SQL запитів"""
+    from sqlalchemy import event
+    from database.models import engine
+
+    stats = {"statements": 0, "seconds": 0.0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats["statements"] += 1
+        stats["seconds"] += time.perf_counter() - conn.info["query_start"].pop()
+
+    return stats
+
+
+def timed_request_class():
+    """HTTPXRequest, що записує тривалість кожного запиту до Bot API"""
+    from telegram.request import HTTPXRequest
+
+    class TimedRequest(HTTPXRequest):
+        durations = []
+
+        async def do_request(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().do_request(*args, **kwargs)
+            finally:
+                TimedRequest.durations.append(time.perf_counter() - started)
+
+    return TimedRequest
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+async def run_benchmark(args):
+    from telegram import Bot
+    from config import settings
+
+    if args.workers is not None:
+        settings.broadcast_workers = args.workers
+    if args.rate_limit is not None:
+        settings.broadcast_rate_limit = args.rate_limit
+    if args.chunk_size is not None:
+        settings.broadcast_chunk_size = args.chunk_size
+
+    from bot.broadcast_handler import BroadcastHandler
+    from database.models import DatabaseManager, Broadcast
+
+    broadcast_id = create_dataset(args)
+    db_stats = instrument_database()
+
+    api = FakeBotApi(args)
+    await api.start()
+
+    TimedRequest = timed_request_class()
+    request = TimedRequest(connection_pool_size=max(8, settings.broadcast_workers * 2))
+    bot = Bot(
+        token=FAKE_TOKEN,
+        base_url=f"http://127.0.0.1:{args.port}/bot",
+        base_file_url=f"http://127.0.0.1:{args.port}/file/bot",
+        request=request
+    )
+
+    try:
+        async with bot:
+            handler = BroadcastHandler(bot)
+            print(f"Sender: workers={handler.workers}, rate_limit={settings.broadcast_rate_limit}/s, "
+                  f"chunk={handler.chunk_size}; fake API: latency={args.latency_ms}±{args.jitter_ms}ms, "
+                  f"server_rate={args.server_rate or '∞'}/s")
+
+            started = time.perf_counter()
+            await handler._process_broadcast(broadcast_id)
+            elapsed = time.perf_counter() - started
+    finally:
+        await api.stop()
+
+    with DatabaseManager() as db:
+        broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
+        status, sent, failed = broadcast.status, broadcast.sent_count, broadcast.failed_count
+        error_counts = broadcast.error_counts
+
+    durations_ms = sorted(d * 1000 for d in TimedRequest.durations)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+    print("")
+    print(f"Status:            {status} (sent={sent}, failed={failed}, errors={error_counts or '{}'})")
+    print(f"Elapsed:           {elapsed:.2f}s")
+    print(f"Throughput:        {api.delivered / elapsed:.1f} msgs/s delivered, {(sent + failed) / elapsed:.1f} recipients/s")
+    print(f"HTTP requests:     {api.requests} (responses: {dict(sorted(api.responses.items()))})")
+    print(f"Request latency:   p50={percentile(durations_ms, 50):.1f}ms "
+          f"p95={percentile(durations_ms, 95):.1f}ms p99={percentile(durations_ms, 99):.1f}ms")
+    print(f"Database:          {db_stats['statements']} statements, {db_stats['seconds']:.2f}s "
+          f"({db_stats['seconds'] / elapsed * 100:.1f}% of run)")
+    print(f"Peak RSS:          {peak_rss_mb:.1f} MB")
+
+
+def main():
+    args = parse_args()
+    db_path = configure_environment(args)
+    print(f"SQLite database: {db_path}")
+    if os.path.exists(db_path) and os.path.getsize(db_path) > 0:
+        print("Database file already exists - use a new --db path for a clean run")
+        sys.exit(1)
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
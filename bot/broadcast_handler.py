@@ -2,22 +2,32 @@
 Обробник розсилок
 """
 import asyncio
+import json
 import logging
-from datetime import datetime
-from typing import Optional
-import os
+from datetime import datetime, timedelta
+from typing import Optional, Callable, Awaitable, Any, Iterable, List, Tuple
 from pathlib import Path
 
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
-from telegram.error import TelegramError
+from telegram import Bot
+from telegram.error import RetryAfter
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
 
+from config import settings
 from database.models import DatabaseManager, Broadcast, BroadcastQueue
+from bot.rate_limiter import RateLimiter
+from bot.media_cache import media_cache
+from bot.broadcast_plan import RenderPlan, SendOperation, compile_broadcast
+from bot.broadcast_progress import BroadcastProgress
+from bot.delivery_errors import ERROR_INTERRUPTED, ERROR_UNKNOWN, PERMANENT_ERRORS, classify_error, error_message
 
 logger = logging.getLogger(__name__)
 
-# Шлях до завантажених файлів
-PROJECT_ROOT = Path(__file__).parent.parent
-UPLOADS_DIR = PROJECT_ROOT / "uploads"
+# Помилка для записів, відправка яких була перервана зупинкою процесу
+INTERRUPTED_ERROR = 'Interrupted: delivery state unknown, not re-sent'
+# Спроби зберегти результати порції, перш ніж лишити розсилку для продовження
+SAVE_CHUNK_ATTEMPTS = 3
+SAVE_CHUNK_RETRY_DELAY = 2
 
 
 class BroadcastHandler:
@@ -25,490 +35,324 @@ class BroadcastHandler:
     
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.is_processing = False
-        self.delay_between_messages = 0.05  # 50ms затримка між повідомленнями (20 msg/sec)
+        self._bot_username: Optional[str] = None
+        # Кількість одночасних відправок; реальну швидкість обмежує rate_limiter
+        self.workers = max(1, settings.broadcast_workers)
+        self.max_retries = settings.broadcast_max_retries
+        self.chunk_size = max(1, settings.broadcast_chunk_size)
+        self.rate_limiter = RateLimiter(
+            global_rate=settings.broadcast_rate_limit,
+            per_chat_rate=settings.broadcast_per_chat_rate
+        )
+        self.progress_interval = max(1, settings.broadcast_progress_interval)
+        # Прогрес розсилки, що виконується зараз
+        self.progress: Optional[BroadcastProgress] = None
     
-    async def process_pending_broadcasts(self):
-        """Обробити всі pending розсилки"""
-        if self.is_processing:
-            logger.info("Broadcast processing already in progress")
-            return
+    async def _call_telegram(self, chat_id: int, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Виконати запит до Telegram з урахуванням лімітів.
         
+        На RetryAfter призупиняємо всю відправку на вказаний час і повторюємо
+        той самий запит, а не позначаємо отримувача як failed.
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(chat_id)
+            try:
+                return await request()
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logger.warning(f"Flood control for {chat_id}: pausing sends for {retry_after}s (attempt {attempt})")
+                self.rate_limiter.pause(float(retry_after))
+                if self.progress:
+                    self.progress.record_pause(float(retry_after))
+    
+    async def _run_workers(self, items: Iterable, send_item: Callable[[Any], Awaitable[bool]]) -> List[Tuple[Any, bool, Optional[BaseException]]]:
+        """Обробити items пулом конкурентних воркерів.
+        
+        Повертає список (item, success, exception) у порядку завершення.
+        """
+        iterator = iter(items)
+        results = []
+        
+        async def worker():
+            # Спільний ітератор: кожен воркер бере наступний item, коли звільняється
+            for item in iterator:
+                try:
+                    results.append((item, await send_item(item), None))
+                except Exception as e:
+                    results.append((item, False, e))
+        
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+        return results
+    
+    async def _process_broadcast(self, broadcast_id: int, resume: bool = False) -> bool:
+        """Обробити одну розсилку (resume=True - продовжити перервану).
+        
+        Повертає False, якщо розсилка лишилась у статусі processing для продовження
+        (помилка БД), і True, якщо її більше не потрібно обробляти.
+        """
         try:
-            self.is_processing = True
+            bot_username = await self._get_bot_username()
             
             with DatabaseManager() as db:
-                # Знаходимо pending розсилки
-                pending_broadcasts = db.query(Broadcast).filter(
-                    Broadcast.status == 'pending'
-                ).order_by(Broadcast.created_at).all()
+                broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
+                if not broadcast or broadcast.status not in ('pending', 'processing'):
+                    return True
                 
-                for broadcast in pending_broadcasts:
-                    await self._process_broadcast(broadcast)
-                    
-        except Exception as e:
-            logger.error(f"Error processing broadcasts: {e}")
-        finally:
-            self.is_processing = False
-    
-    async def _process_broadcast(self, broadcast: Broadcast):
-        """Обробити одну розсилку"""
-        try:
-            with DatabaseManager() as db:
-                # Оновлюємо статус на processing
+                now = datetime.utcnow()
                 broadcast.status = 'processing'
-                broadcast.started_at = datetime.utcnow()
-                db.commit()
+                broadcast.started_at = broadcast.started_at or now
+                broadcast.checkpoint_at = now
+                
+                # Блоки розбираються один раз, воркери виконують готовий план
+                plan = compile_broadcast(broadcast, bot_username=bot_username)
+                total_recipients = broadcast.total_recipients
+                progress = BroadcastProgress(
+                    total_recipients, len(plan),
+                    sent=broadcast.sent_count, failed=broadcast.failed_count
+                )
+                
+                if resume:
+                    # Записи, взяті в роботу до зупинки: невідомо чи доставлені, тому не відправляємо повторно
+                    interrupted = db.query(BroadcastQueue).filter(
+                        BroadcastQueue.broadcast_id == broadcast_id,
+                        BroadcastQueue.status == 'sending'
+                    ).update({
+                        BroadcastQueue.status: 'failed',
+                        BroadcastQueue.error_code: ERROR_INTERRUPTED,
+                        BroadcastQueue.error_message: INTERRUPTED_ERROR
+                    }, synchronize_session=False)
+                    progress.failed += interrupted
+                    logger.warning(f"Resuming broadcast {broadcast_id}: {interrupted} in-flight recipients marked as interrupted")
             
-            logger.info(f"Starting broadcast {broadcast.id} to {broadcast.total_recipients} users")
+            logger.info(f"Starting broadcast {broadcast_id} to {total_recipients} users ({len(plan)} operations per user)")
             
-            # Список для збору помилок та всіх логів
-            error_logs = []
-            full_logs = []
+            async def send_item(item) -> bool:
+                progress.start_item()
+                success = False
+                try:
+                    success = await self._execute_plan(plan, item.telegram_id)
+                    return success
+                finally:
+                    progress.finish_item(success)
             
-            # Отримуємо чергу
-            with DatabaseManager() as db:
-                queue_items = db.query(BroadcastQueue).filter(
-                    BroadcastQueue.broadcast_id == broadcast.id,
-                    BroadcastQueue.status == 'pending'
-                ).all()
-                
-                sent_count = 0
-                failed_count = 0
-                
-                for item in queue_items:
-                    try:
-                        # Перевіряємо чи є message_blocks для відправки кількох повідомлень
-                        if broadcast.message_blocks:
-                            import json
-                            logger.info(f"Raw message_blocks from DB: {broadcast.message_blocks[:500]}...")  # Перші 500 символів
-                            blocks = json.loads(broadcast.message_blocks)
-                            logger.info(f"Parsed {len(blocks)} blocks: {[b.get('type') for b in blocks]}")
-                            success = await self._send_multiple_messages(
-                                telegram_id=item.telegram_id,
-                                blocks=blocks
-                            )
-                        else:
-                            # Стара система - одне повідомлення
-                            success = await self._send_broadcast_message(
-                                telegram_id=item.telegram_id,
-                                message_text=broadcast.message_text,
-                                attachment_type=broadcast.attachment_type,
-                                attachment_url=broadcast.attachment_url,
-                                button_text=broadcast.button_text,
-                                button_url=broadcast.button_url
-                            )
-                        
-                        if success:
-                            item.status = 'sent'
-                            item.sent_at = datetime.utcnow()
-                            sent_count += 1
-                            # Додаємо успішний лог
-                            success_detail = f"✓ User ID: {item.telegram_id} - Successfully sent at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}"
-                            full_logs.append(success_detail)
-                        else:
-                            item.status = 'failed'
-                            item.error_message = 'Unknown error'
-                            failed_count += 1
-                            error_detail = f"✗ User ID: {item.telegram_id} - Failed: Unknown error"
-                            full_logs.append(error_detail)
-                            
-                    except Exception as e:
-                        item.status = 'failed'
-                        error_msg = str(e)
-                        item.error_message = error_msg
-                        failed_count += 1
-                        
-                        # Додаємо детальний лог помилки
-                        import traceback
-                        error_detail = f"User ID: {item.telegram_id}\nError: {error_msg}\nTraceback:\n{traceback.format_exc()}\n{'='*50}"
-                        error_logs.append(error_detail)
-                        
-                        # Додаємо короткий лог у загальний
-                        full_log_entry = f"✗ User ID: {item.telegram_id} - Failed: {error_msg}"
-                        full_logs.append(full_log_entry)
-                        
-                        logger.error(f"Error sending to {item.telegram_id}: {e}")
+            self.progress = progress
+            publisher = asyncio.create_task(self._publish_progress(broadcast_id))
+            try:
+                # Черга читається порціями по id, статуси зберігаються після кожної порції
+                last_id = 0
+                while True:
+                    chunk = await asyncio.to_thread(self._claim_chunk, broadcast_id, last_id)
+                    if not chunk:
+                        break
+                    last_id = chunk[-1].id
                     
-                    # Затримка між повідомленнями
-                    await asyncio.sleep(self.delay_between_messages)
-                
-                # Оновлюємо статистику
-                broadcast.sent_count = sent_count
-                broadcast.failed_count = failed_count
-                broadcast.status = 'completed'
-                broadcast.completed_at = datetime.utcnow()
-                
-                # Зберігаємо консолідований лог помилок
-                if error_logs:
-                    broadcast.error_log = "\n\n".join(error_logs)
-                
-                # Зберігаємо повний лог
-                if full_logs:
-                    full_log_header = f"Broadcast #{broadcast.id} - {broadcast.title or 'Untitled'}\n"
-                    full_log_header += f"Started: {broadcast.started_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    full_log_header += f"Completed: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    full_log_header += f"Total: {broadcast.total_recipients}, Sent: {sent_count}, Failed: {failed_count}\n"
-                    full_log_header += "=" * 60 + "\n\n"
-                    broadcast.full_log = full_log_header + "\n".join(full_logs)
-                
-                db.commit()
-                
-                logger.info(f"Broadcast {broadcast.id} completed: {sent_count} sent, {failed_count} failed")
-                
+                    # Відправляємо пулом воркерів; швидкість обмежує rate_limiter
+                    results = await self._run_workers(chunk, send_item)
+                    await self._save_chunk_results_with_retry(broadcast_id, results)
+            finally:
+                publisher.cancel()
+                self.progress = None
+            
+            await asyncio.to_thread(self._complete_broadcast, broadcast_id, progress)
+            return True
+        
+        except SQLAlchemyError as e:
+            # БД недоступна: розсилка лишається processing з останньою збереженою порцією,
+            # воркер звільняє lease і продовжує її з решти pending записів
+            logger.error(f"Database error in broadcast {broadcast_id}, leaving it for resume: {e}")
+            return False
+        
         except Exception as e:
-            logger.error(f"Error processing broadcast {broadcast.id}: {e}")
+            logger.error(f"Error processing broadcast {broadcast_id}: {e}")
             
             with DatabaseManager() as db:
-                broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast.id).first()
+                broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
                 if broadcast:
                     broadcast.status = 'failed'
                     db.commit()
-    
-    async def _send_broadcast_message(
-        self,
-        telegram_id: int,
-        message_text: Optional[str],
-        attachment_type: Optional[str],
-        attachment_url: Optional[str],
-        button_text: Optional[str],
-        button_url: Optional[str]
-    ) -> bool:
-        """Відправити повідомлення одному користувачу"""
-        try:
-            # Створюємо клавіатуру якщо є посилання
-            reply_markup = None
-            if button_url and button_text:
-                keyboard = [[InlineKeyboardButton(text=button_text, url=button_url)]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Визначаємо чи це локальний файл чи URL
-            is_local_file = False
-            file_path = None
-            
-            if attachment_url:
-                if attachment_url.startswith('/uploads/'):
-                    # Це локальний файл
-                    is_local_file = True
-                    # Видаляємо /uploads/ з початку
-                    relative_path = attachment_url.replace('/uploads/', '')
-                    file_path = UPLOADS_DIR / relative_path
-                    
-                    if not file_path.exists():
-                        logger.error(f"File not found: {file_path}")
-                        return False
-            
-            # Відправляємо залежно від типу
-            if attachment_type == 'image' and attachment_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as photo_file:
-                        await self.bot.send_photo(
-                            chat_id=telegram_id,
-                            photo=photo_file,
-                            caption=message_text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if message_text else None
-                        )
-                else:
-                    await self.bot.send_photo(
-                        chat_id=telegram_id,
-                        photo=attachment_url,
-                        caption=message_text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if message_text else None
-                    )
-                    
-            elif attachment_type == 'video' and attachment_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as video_file:
-                        await self.bot.send_video(
-                            chat_id=telegram_id,
-                            video=video_file,
-                            caption=message_text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if message_text else None,
-                            supports_streaming=True
-                        )
-                else:
-                    await self.bot.send_video(
-                        chat_id=telegram_id,
-                        video=attachment_url,
-                        caption=message_text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if message_text else None,
-                        supports_streaming=True
-                    )
-                    
-            elif attachment_type in ('file', 'document') and attachment_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as doc_file:
-                        await self.bot.send_document(
-                            chat_id=telegram_id,
-                            document=doc_file,
-                            caption=message_text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if message_text else None
-                        )
-                else:
-                    await self.bot.send_document(
-                        chat_id=telegram_id,
-                        document=attachment_url,
-                        caption=message_text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if message_text else None
-                    )
-                    
-            elif message_text:
-                await self.bot.send_message(
-                    chat_id=telegram_id,
-                    text=message_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            else:
-                logger.warning(f"No content to send for broadcast to {telegram_id}")
-                return False
-            
             return True
-            
-        except TelegramError as e:
-            logger.error(f"Telegram error sending to {telegram_id}: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Error sending to {telegram_id}: {e}")
-            return False
     
-    async def _send_multiple_messages(self, telegram_id: int, blocks: list) -> bool:
-        """Відправити кілька повідомлень на основі блоків"""
-        try:
-            logger.info(f"Processing {len(blocks)} blocks for user {telegram_id}")
+    async def _save_chunk_results_with_retry(self, broadcast_id: int, results: List[Tuple[Any, bool, Optional[BaseException]]]):
+        """Зберегти результати порції з повторами: вже доставлене не має стати interrupted через збій БД"""
+        for attempt in range(1, SAVE_CHUNK_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(self._save_chunk_results, broadcast_id, results)
+                return
+            except SQLAlchemyError as e:
+                if attempt == SAVE_CHUNK_ATTEMPTS:
+                    raise
+                logger.warning(f"Broadcast {broadcast_id}: cannot save chunk (attempt {attempt}): {e}")
+                await asyncio.sleep(SAVE_CHUNK_RETRY_DELAY * attempt)
+    
+    async def _publish_progress(self, broadcast_id: int):
+        """Періодично зберігати знімок прогресу в broadcasts.progress"""
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await asyncio.to_thread(self._save_progress, broadcast_id, self.progress.snapshot(self.rate_limiter.paused_for))
+            except Exception as e:
+                logger.warning(f"Cannot save progress of broadcast {broadcast_id}: {e}")
+    
+    def _save_progress(self, broadcast_id: int, snapshot: dict):
+        with DatabaseManager() as db:
+            db.query(Broadcast).filter(Broadcast.id == broadcast_id).update({
+                Broadcast.progress: json.dumps(snapshot)
+            }, synchronize_session=False)
+    
+    def _claim_chunk(self, broadcast_id: int, last_id: int) -> list:
+        """Взяти в роботу наступну порцію pending записів черги (позначаються як sending)"""
+        with DatabaseManager() as db:
+            chunk = db.query(BroadcastQueue.id, BroadcastQueue.telegram_id).filter(
+                BroadcastQueue.broadcast_id == broadcast_id,
+                BroadcastQueue.status == 'pending',
+                BroadcastQueue.id > last_id
+            ).order_by(BroadcastQueue.id).limit(self.chunk_size).all()
             
-            text_blocks = [b for b in blocks if b.get('type') == 'text']
-            media_blocks = [b for b in blocks if b.get('type') in ('image', 'video', 'document')]
-            button_blocks = [b for b in blocks if b.get('type') == 'button']
-            subscription_button_blocks = [b for b in blocks if b.get('type') == 'subscription_button']
+            if chunk:
+                db.query(BroadcastQueue).filter(
+                    BroadcastQueue.id.in_([item.id for item in chunk])
+                ).update({BroadcastQueue.status: 'sending'}, synchronize_session=False)
+            return chunk
+    
+    def _save_chunk_results(self, broadcast_id: int, results: List[Tuple[Any, bool, Optional[BaseException]]]):
+        """Зберегти статуси порції одним комітом"""
+        sent_ids = []
+        failed_ids = {}  # (error_code, error_message) -> [queue ids]
+        suppressed = []  # (telegram_id, error_code, error_message) для недоступних назавжди
+        
+        for item, success, error in results:
+            if error is None and success:
+                sent_ids.append(item.id)
+                continue
             
-            logger.info(f"Found: {len(text_blocks)} text, {len(media_blocks)} media, {len(button_blocks)} button, {len(subscription_button_blocks)} subscription_button blocks")
+            if error is not None:
+                logger.error(f"Error sending to {item.telegram_id}: {error}")
+            error_code, error_msg = classify_error(error), error_message(error)
+            failed_ids.setdefault((error_code, error_msg), []).append(item.id)
+            if error_code in PERMANENT_ERRORS:
+                suppressed.append((item.telegram_id, error_code, error_msg))
+        
+        now = datetime.utcnow()
+        with DatabaseManager() as db:
+            if sent_ids:
+                db.query(BroadcastQueue).filter(BroadcastQueue.id.in_(sent_ids)).update({
+                    BroadcastQueue.status: 'sent',
+                    BroadcastQueue.sent_at: now
+                }, synchronize_session=False)
             
-            # Якщо є кнопка підписки, створюємо спеціальне посилання на бот з callback
-            subscription_button = None
-            if subscription_button_blocks:
-                subscription_button = subscription_button_blocks[0]
-                # Генеруємо посилання на бот з параметром для показу підписки
-                bot_username = (await self.bot.get_me()).username
-                subscription_button_url = f"https://t.me/{bot_username}?start=subscription_offer"
-                subscription_button_text = subscription_button.get('buttonText') or 'Оформити підписку'
-                logger.info(f"Subscription button: text='{subscription_button_text}', url='{subscription_button_url}'")
+            error_counts = {}
+            for (error_code, error_msg), ids in failed_ids.items():
+                db.query(BroadcastQueue).filter(BroadcastQueue.id.in_(ids)).update({
+                    BroadcastQueue.status: 'failed',
+                    BroadcastQueue.error_code: error_code,
+                    BroadcastQueue.error_message: error_msg
+                }, synchronize_session=False)
+                error_counts[error_code] = error_counts.get(error_code, 0) + len(ids)
             
-            # Якщо є текст та медіа, відправляємо перше повідомлення з текстом + перше медіа + кнопка
-            if text_blocks and media_blocks:
-                first_media = media_blocks[0]
-                # Визначаємо яку кнопку використовувати
-                if subscription_button:
-                    button_text = subscription_button_text
-                    button_url = subscription_button_url
-                else:
-                    first_button = button_blocks[0] if button_blocks else None
-                    button_text = first_button.get('buttonText') if first_button else None
-                    button_url = first_button.get('buttonUrl') if first_button else None
-                
-                # Відправляємо перше повідомлення
-                await self._send_single_message(
-                    telegram_id=telegram_id,
-                    text=text_blocks[0].get('content'),
-                    media_type=first_media.get('type'),
-                    media_url=first_media.get('fileUrl'),
-                    button_text=button_text,
-                    button_url=button_url
-                )
-                
-                # Відправляємо решту медіа окремо
-                for media in media_blocks[1:]:
-                    await asyncio.sleep(0.1)  # Невелика затримка між повідомленнями
-                    await self._send_single_message(
-                        telegram_id=telegram_id,
-                        text=None,
-                        media_type=media.get('type'),
-                        media_url=media.get('fileUrl'),
-                        button_text=None,
-                        button_url=None
-                    )
+            failed_count = sum(error_counts.values())
+            broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
+            broadcast.sent_count = (broadcast.sent_count or 0) + len(sent_ids)
+            broadcast.failed_count = (broadcast.failed_count or 0) + failed_count
+            broadcast.checkpoint_at = now
+            if error_counts:
+                total_counts = json.loads(broadcast.error_counts) if broadcast.error_counts else {}
+                for error_code, count in error_counts.items():
+                    total_counts[error_code] = total_counts.get(error_code, 0) + count
+                broadcast.error_counts = json.dumps(total_counts)
             
-            # Якщо є тільки медіа
-            elif media_blocks:
-                # Визначаємо яку кнопку використовувати
-                if subscription_button:
-                    button_text = subscription_button_text
-                    button_url = subscription_button_url
-                else:
-                    first_button = button_blocks[0] if button_blocks else None
-                    button_text = first_button.get('buttonText') if first_button else None
-                    button_url = first_button.get('buttonUrl') if first_button else None
-                
-                # Перше медіа з кнопкою
-                await self._send_single_message(
-                    telegram_id=telegram_id,
-                    text=None,
-                    media_type=media_blocks[0].get('type'),
-                    media_url=media_blocks[0].get('fileUrl'),
-                    button_text=button_text,
-                    button_url=button_url
-                )
-                
-                # Решта медіа без кнопок
-                for media in media_blocks[1:]:
-                    await asyncio.sleep(0.1)
-                    await self._send_single_message(
-                        telegram_id=telegram_id,
-                        text=None,
-                        media_type=media.get('type'),
-                        media_url=media.get('fileUrl'),
-                        button_text=None,
-                        button_url=None
-                    )
+            # Заблокували бота / видалили акаунт - більше не відправляємо їм розсилки та нагадування
+            DatabaseManager.suppress_recipients(suppressed, db)
+        
+        logger.info(f"Broadcast {broadcast_id}: chunk saved ({len(sent_ids)} sent, {failed_count} failed, {len(suppressed)} suppressed)")
+    
+    def _complete_broadcast(self, broadcast_id: int, progress: BroadcastProgress):
+        """Завершити розсилку: підсумкова статистика з черги"""
+        with DatabaseManager() as db:
+            broadcast = db.query(Broadcast).filter(Broadcast.id == broadcast_id).first()
             
-            # Якщо є тільки текст
-            elif text_blocks:
-                # Визначаємо яку кнопку використовувати
-                if subscription_button:
-                    button_text = subscription_button_text
-                    button_url = subscription_button_url
-                else:
-                    first_button = button_blocks[0] if button_blocks else None
-                    button_text = first_button.get('buttonText') if first_button else None
-                    button_url = first_button.get('buttonUrl') if first_button else None
-                
-                await self._send_single_message(
-                    telegram_id=telegram_id,
-                    text=text_blocks[0].get('content'),
-                    media_type=None,
-                    media_url=None,
-                    button_text=button_text,
-                    button_url=button_url
-                )
-            elif subscription_button:
-                # Тільки кнопка підписки без тексту/медіа — відправляємо з текстом-запрошенням
-                await self._send_single_message(
-                    telegram_id=telegram_id,
-                    text='👇',
-                    media_type=None,
-                    media_url=None,
-                    button_text=subscription_button_text,
-                    button_url=subscription_button_url
-                )
-            else:
-                logger.warning(f"No content to send for broadcast to {telegram_id}")
-                return False
+            # Лічильники з черги (точні і після продовження перерваної розсилки)
+            counts = dict(db.query(BroadcastQueue.status, func.count(BroadcastQueue.id)).filter(
+                BroadcastQueue.broadcast_id == broadcast_id
+            ).group_by(BroadcastQueue.status).all())
+            error_counts = dict(db.query(BroadcastQueue.error_code, func.count(BroadcastQueue.id)).filter(
+                BroadcastQueue.broadcast_id == broadcast_id,
+                BroadcastQueue.status == 'failed'
+            ).group_by(BroadcastQueue.error_code).all())
             
-            return True
+            broadcast.sent_count = counts.get('sent', 0)
+            broadcast.failed_count = counts.get('failed', 0)
+            broadcast.error_counts = json.dumps({
+                (error_code or ERROR_UNKNOWN): count for error_code, count in error_counts.items()
+            }) if error_counts else None
+            broadcast.status = 'completed'
+            broadcast.completed_at = datetime.utcnow()
+            sent_count, failed_count = broadcast.sent_count, broadcast.failed_count
             
-        except Exception as e:
-            logger.error(f"Error sending multiple messages to {telegram_id}: {e}")
-            return False
+            # Фінальний знімок з точними лічильниками
+            progress.sent, progress.failed = sent_count, failed_count
+            broadcast.progress = json.dumps(progress.snapshot())
+        
+        logger.info(f"Broadcast {broadcast_id} completed: {sent_count} sent, {failed_count} failed")
     
-    async def _send_single_message(
+    async def _send_media(
         self,
+        send_method: Callable[..., Awaitable[Any]],
+        media_field: str,
         telegram_id: int,
-        text: str = None,
-        media_type: str = None,
-        media_url: str = None,
-        button_text: str = None,
-        button_url: str = None
-    ) -> bool:
-        """Відправити одне повідомлення"""
-        try:
-            # Створюємо клавіатуру якщо є кнопка
-            reply_markup = None
-            if button_url and button_text:
-                keyboard = [[InlineKeyboardButton(text=button_text, url=button_url)]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Визначаємо чи це локальний файл
-            is_local_file = False
-            file_path = None
-            
-            if media_url:
-                if media_url.startswith('/uploads/'):
-                    is_local_file = True
-                    relative_path = media_url.replace('/uploads/', '')
-                    file_path = UPLOADS_DIR / relative_path
-                    
-                    if not file_path.exists():
-                        logger.error(f"File not found: {file_path}")
-                        return False
-            
-            # Відправляємо залежно від типу
-            if media_type == 'image' and media_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as photo_file:
-                        await self.bot.send_photo(
-                            chat_id=telegram_id,
-                            photo=photo_file,
-                            caption=text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if text else None
-                        )
-                else:
-                    await self.bot.send_photo(
-                        chat_id=telegram_id,
-                        photo=media_url,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if text else None
-                    )
-                    
-            elif media_type == 'video' and media_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as video_file:
-                        await self.bot.send_video(
-                            chat_id=telegram_id,
-                            video=video_file,
-                            caption=text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if text else None,
-                            supports_streaming=True
-                        )
-                else:
-                    await self.bot.send_video(
-                        chat_id=telegram_id,
-                        video=media_url,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if text else None,
-                        supports_streaming=True
-                    )
-                    
-            elif media_type in ('file', 'document') and media_url:
-                if is_local_file:
-                    with open(file_path, 'rb') as doc_file:
-                        await self.bot.send_document(
-                            chat_id=telegram_id,
-                            document=doc_file,
-                            caption=text,
-                            reply_markup=reply_markup,
-                            parse_mode='Markdown' if text else None
-                        )
-                else:
-                    await self.bot.send_document(
-                        chat_id=telegram_id,
-                        document=media_url,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        parse_mode='Markdown' if text else None
-                    )
-                    
-            elif text:
-                await self.bot.send_message(
-                    chat_id=telegram_id,
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            else:
-                return False
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error sending single message to {telegram_id}: {e}")
-            raise
+        media_url: str,
+        file_path: Optional[Path],
+        **kwargs
+    ) -> Any:
+        """Відправити медіа (локальний файл або URL) через ліміти відправки.
+        
+        Локальні файли йдуть через media_cache: завантажуються в Telegram один раз,
+        решті отримувачів відправляється тільки file_id.
+        """
+        def request_for(media):
+            async def request():
+                if hasattr(media, 'seek'):
+                    # Повтор після RetryAfter має читати файл з початку
+                    media.seek(0)
+                return await send_method(chat_id=telegram_id, **{media_field: media}, **kwargs)
+            return request
+        
+        if file_path is not None:
+            return await media_cache.send(
+                file_path,
+                media_field,
+                lambda media: self._call_telegram(telegram_id, request_for(media))
+            )
+        return await self._call_telegram(telegram_id, request_for(media_url))
+    
+    async def _get_bot_username(self) -> str:
+        """Username бота (запитується в Telegram один раз)"""
+        if self._bot_username is None:
+            self._bot_username = (await self.bot.get_me()).username
+        return self._bot_username
+    
+    async def _execute_operation(self, operation: SendOperation, telegram_id: int):
+        """Виконати одну операцію плану для отримувача"""
+        send_method = getattr(self.bot, operation.method)
+        if operation.media_field:
+            await self._send_media(
+                send_method, operation.media_field, telegram_id,
+                operation.media_url, operation.file_path, **operation.kwargs
+            )
+        else:
+            await self._call_telegram(telegram_id, lambda: send_method(chat_id=telegram_id, **operation.kwargs))
+    
+    async def _execute_plan(self, plan: RenderPlan, telegram_id: int) -> bool:
+        """Відправити всі повідомлення плану одному користувачу"""
+        if not plan:
+            logger.warning(f"No content to send for broadcast to {telegram_id}")
+            return False
+        
+        for operation in plan.operations:
+            await self._execute_operation(operation, telegram_id)
+        return True
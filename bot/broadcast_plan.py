@@ -0,0 +1,190 @@
+"""
+План відправки розсилки: блоки повідомлення розбираються один раз на розсилку,
+воркери лише виконують готові операції для кожного telegram_id
+"""
+import json
+import logging
+from pathlib import Path
+from types import MappingProxyType
+from typing import Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from api.media import TELEGRAM_VARIANT, VIDEO_VARIANT_SUFFIX, variant_path
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+UPLOADS_DIR = PROJECT_ROOT / "uploads"
+
+MEDIA_BLOCK_TYPES = ('image', 'video', 'document')
+
+# Тип вкладення -> (метод Bot, назва параметра з файлом)
+MEDIA_METHODS = {
+    'image': ('send_photo', 'photo'),
+    'video': ('send_video', 'video'),
+    'file': ('send_document', 'document'),
+    'document': ('send_document', 'document'),
+}
+
+
+class SendOperation:
+    """Одне повідомлення плану (незмінне)"""
+
+    __slots__ = ('method', 'media_field', 'media_url', 'file_path', 'kwargs')
+
+    def __init__(
+        self,
+        method: str,
+        media_field: Optional[str] = None,
+        media_url: Optional[str] = None,
+        file_path: Optional[Path] = None,
+        **kwargs
+    ):
+        object.__setattr__(self, 'method', method)
+        object.__setattr__(self, 'media_field', media_field)
+        object.__setattr__(self, 'media_url', media_url)
+        object.__setattr__(self, 'file_path', file_path)
+        object.__setattr__(self, 'kwargs', MappingProxyType(kwargs))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SendOperation is immutable")
+
+    def __repr__(self):
+        return f"SendOperation({self.method}, {self.media_url or 'text'})"
+
+
+class RenderPlan:
+    """Впорядкований набір операцій для одного отримувача (незмінний)"""
+
+    __slots__ = ('broadcast_id', 'operations')
+
+    def __init__(self, broadcast_id: int, operations: Tuple[SendOperation, ...]):
+        object.__setattr__(self, 'broadcast_id', broadcast_id)
+        object.__setattr__(self, 'operations', tuple(operations))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RenderPlan is immutable")
+
+    def __bool__(self):
+        return bool(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+
+def resolve_local_file(media_url: Optional[str]) -> Optional[Path]:
+    """Шлях до локального файлу з /uploads/ (None якщо це зовнішній URL)"""
+    if media_url and media_url.startswith('/uploads/'):
+        return UPLOADS_DIR / media_url.replace('/uploads/', '', 1)
+    return None
+
+
+# Розширення готової для Telegram версії за типом медіа
+TELEGRAM_VARIANT_SUFFIXES = {'image': '.jpg', 'video': VIDEO_VARIANT_SUFFIX}
+
+
+def telegram_variant(file_path: Path, media_type: str = 'image') -> Path:
+    """Версія для Telegram: зображення в межах лімітів фото або оптимізоване відео.
+
+    API створює її лише коли вона потрібна (більший оригінал, менше відео); інакше - оригінал.
+    """
+    variant = variant_path(file_path, TELEGRAM_VARIANT, TELEGRAM_VARIANT_SUFFIXES[media_type])
+    return variant if variant.is_file() else file_path
+
+
+def build_keyboard(button_text: Optional[str], button_url: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Клавіатура з однією кнопкою-посиланням (None якщо кнопки немає)"""
+    if button_text and button_url:
+        return InlineKeyboardMarkup([[InlineKeyboardButton(text=button_text, url=button_url)]])
+    return None
+
+
+def build_operation(
+    text: Optional[str],
+    media_type: Optional[str],
+    media_url: Optional[str],
+    reply_markup: Optional[InlineKeyboardMarkup]
+) -> Optional[SendOperation]:
+    """Операція для тексту та/або медіа; None якщо відправляти нічого"""
+    parse_mode = 'Markdown' if text else None
+
+    if media_url and media_type in MEDIA_METHODS:
+        file_path = resolve_local_file(media_url)
+        if file_path is not None and not file_path.exists():
+            logger.error(f"File not found: {file_path}")
+            return None
+        if file_path is not None and media_type in TELEGRAM_VARIANT_SUFFIXES:
+            # Оригінал понад 2560px чи 10MB Telegram однаково зменшить, відео - після ffmpeg:
+            # відправляємо готову версію
+            file_path = telegram_variant(file_path, media_type)
+
+        method, media_field = MEDIA_METHODS[media_type]
+        kwargs = {'caption': text, 'reply_markup': reply_markup, 'parse_mode': parse_mode}
+        if media_field == 'video':
+            kwargs['supports_streaming'] = True
+        return SendOperation(method, media_field, media_url, file_path, **kwargs)
+
+    if text:
+        return SendOperation('send_message', text=text, reply_markup=reply_markup, parse_mode='Markdown')
+
+    return None
+
+
+def _compile_blocks(blocks: list, bot_username: Optional[str]) -> list:
+    """Операції для нової системи блоків (message_blocks)"""
+    text_blocks = [b for b in blocks if b.get('type') == 'text']
+    media_blocks = [b for b in blocks if b.get('type') in MEDIA_BLOCK_TYPES]
+    button_blocks = [b for b in blocks if b.get('type') == 'button']
+    subscription_button_blocks = [b for b in blocks if b.get('type') == 'subscription_button']
+
+    logger.info(f"Found: {len(text_blocks)} text, {len(media_blocks)} media, {len(button_blocks)} button, {len(subscription_button_blocks)} subscription_button blocks")
+
+    # Кнопка підписки веде на бот з параметром для показу підписки, інакше - перша звичайна кнопка
+    if subscription_button_blocks:
+        button_text = subscription_button_blocks[0].get('buttonText') or 'Оформити підписку'
+        button_url = f"https://t.me/{bot_username}?start=subscription_offer"
+    elif button_blocks:
+        button_text = button_blocks[0].get('buttonText')
+        button_url = button_blocks[0].get('buttonUrl')
+    else:
+        button_text = button_url = None
+    reply_markup = build_keyboard(button_text, button_url)
+
+    text = text_blocks[0].get('content') if text_blocks else None
+
+    if media_blocks:
+        # Перше медіа з текстом і кнопкою, решта медіа окремо
+        first_media = media_blocks[0]
+        operations = [build_operation(text, first_media.get('type'), first_media.get('fileUrl'), reply_markup)]
+        for media in media_blocks[1:]:
+            operations.append(build_operation(None, media.get('type'), media.get('fileUrl'), None))
+        return operations
+
+    if text:
+        return [build_operation(text, None, None, reply_markup)]
+
+    if subscription_button_blocks:
+        # Тільки кнопка підписки без тексту/медіа — відправляємо з текстом-запрошенням
+        return [build_operation('👇', None, None, reply_markup)]
+
+    return []
+
+
+def compile_broadcast(broadcast, bot_username: Optional[str] = None) -> RenderPlan:
+    """Скомпілювати розсилку в план відправки"""
+    if broadcast.message_blocks:
+        blocks = json.loads(broadcast.message_blocks)
+        logger.info(f"Broadcast {broadcast.id}: parsed {len(blocks)} blocks: {[b.get('type') for b in blocks]}")
+        operations = _compile_blocks(blocks, bot_username)
+    else:
+        # Стара система - одне повідомлення
+        operations = [build_operation(
+            broadcast.message_text,
+            broadcast.attachment_type,
+            broadcast.attachment_url,
+            build_keyboard(broadcast.button_text, broadcast.button_url)
+        )]
+
+    return RenderPlan(broadcast.id, tuple(op for op in operations if op is not None))
+
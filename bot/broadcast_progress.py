@@ -0,0 +1,69 @@
+"""
+Прогрес розсилки: лічильники та швидкість відправки для адмін-панелі
+"""
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict
+
+
+class BroadcastProgress:
+    """Живі лічильники однієї розсилки (оновлюються воркерами, публікуються знімками)"""
+
+    # За скільки останніх секунд рахується поточна швидкість
+    RATE_WINDOW = 30.0
+
+    def __init__(self, total: int, operations_per_recipient: int = 1, sent: int = 0, failed: int = 0):
+        self.total = total or 0
+        self.operations_per_recipient = max(1, operations_per_recipient)
+        self.sent = sent or 0
+        self.failed = failed or 0
+        self.in_flight = 0
+        self.retry_after_pauses = 0
+        self.retry_after_seconds = 0.0
+        self.started_at = time.monotonic()
+        self._completed_at = deque()  # monotonic час завершення кожного отримувача за RATE_WINDOW
+
+    def start_item(self):
+        self.in_flight += 1
+
+    def finish_item(self, success: bool):
+        self.in_flight -= 1
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self._completed_at.append(time.monotonic())
+
+    def record_pause(self, seconds: float):
+        """Врахувати паузу після RetryAfter від Telegram"""
+        self.retry_after_pauses += 1
+        self.retry_after_seconds += seconds
+
+    def rate(self) -> float:
+        """Отримувачів за секунду за останні RATE_WINDOW секунд"""
+        now = time.monotonic()
+        while self._completed_at and now - self._completed_at[0] > self.RATE_WINDOW:
+            self._completed_at.popleft()
+        window = min(self.RATE_WINDOW, now - self.started_at)
+        if window <= 0:
+            return 0.0
+        return len(self._completed_at) / window
+
+    def snapshot(self, paused_for: float = 0.0) -> Dict[str, Any]:
+        """Знімок прогресу для збереження в broadcasts.progress"""
+        rate = self.rate()
+        remaining = max(0, self.total - self.sent - self.failed)
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'in_flight': self.in_flight,
+            'remaining': remaining,
+            'recipients_per_second': round(rate, 2),
+            'messages_per_second': round(rate * self.operations_per_recipient, 2),
+            'eta_seconds': int(remaining / rate) if rate > 0 else None,
+            'retry_after_pauses': self.retry_after_pauses,
+            'retry_after_seconds': round(self.retry_after_seconds, 1),
+            'paused_for': round(paused_for, 1),
+            'updated_at': datetime.utcnow().isoformat(),
+        }
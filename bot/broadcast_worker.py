@@ -0,0 +1,149 @@
+"""
+Воркер розсилок: бере розсилки з таблиці broadcasts як з черги задач.
+
+Розсилка захоплюється через SELECT ... FOR UPDATE SKIP LOCKED і отримує lease
+(lease_owner + lease_expires_at), який воркер продовжує heartbeat-ом. Якщо воркер
+зупинився, після закінчення lease розсилку продовжує інший воркер.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+from telegram import Bot
+
+from config import settings
+from database.models import DatabaseManager, Broadcast
+from bot.broadcast_handler import BroadcastHandler
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastWorker:
+    """Процес, що виконує розсилки з черги"""
+
+    def __init__(self, bot: Bot, worker_id: Optional[str] = None):
+        self.bot = bot
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.handler = BroadcastHandler(bot)
+        self.lease_seconds = max(10, settings.broadcast_lease_seconds)
+        self.poll_interval = max(1, settings.broadcast_poll_interval)
+        self._running = False
+        self._current_task: Optional[asyncio.Task] = None
+
+    def _lease_next(self) -> Optional[Tuple[int, bool]]:
+        """Захопити наступну розсилку: pending або processing з простроченим lease.
+
+        Повертає (broadcast_id, resume) або None, якщо черга порожня.
+        """
+        now = datetime.utcnow()
+        with DatabaseManager() as db:
+            broadcast = db.query(Broadcast).filter(
+                or_(
+                    Broadcast.status == 'pending',
+                    and_(
+                        Broadcast.status == 'processing',
+                        or_(Broadcast.lease_expires_at == None, Broadcast.lease_expires_at < now)
+                    )
+                )
+            ).order_by(Broadcast.created_at).with_for_update(skip_locked=True).first()
+
+            if not broadcast:
+                return None
+
+            resume = broadcast.status == 'processing'
+            if resume:
+                logger.warning(f"Broadcast {broadcast.id}: lease of {broadcast.lease_owner} expired, taking over")
+
+            broadcast.status = 'processing'
+            broadcast.lease_owner = self.worker_id
+            broadcast.lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+            broadcast.heartbeat_at = now
+            return broadcast.id, resume
+
+    def _renew_lease(self, broadcast_id: int) -> bool:
+        """Продовжити lease; False якщо розсилку вже захопив інший воркер"""
+        now = datetime.utcnow()
+        with DatabaseManager() as db:
+            updated = db.query(Broadcast).filter(
+                Broadcast.id == broadcast_id,
+                Broadcast.lease_owner == self.worker_id
+            ).update({
+                Broadcast.lease_expires_at: now + timedelta(seconds=self.lease_seconds),
+                Broadcast.heartbeat_at: now
+            }, synchronize_session=False)
+        return updated == 1
+
+    def _release_lease(self, broadcast_id: int):
+        """Звільнити lease (розсилку одразу зможе продовжити інший воркер, якщо вона не завершена)"""
+        with DatabaseManager() as db:
+            db.query(Broadcast).filter(
+                Broadcast.id == broadcast_id,
+                Broadcast.lease_owner == self.worker_id
+            ).update({
+                Broadcast.lease_owner: None,
+                Broadcast.lease_expires_at: None
+            }, synchronize_session=False)
+
+    async def _run_job(self, broadcast_id: int, resume: bool) -> bool:
+        """Виконати розсилку, продовжуючи lease поки вона триває.
+
+        Повертає False, якщо розсилка не завершена і лишилась для продовження.
+        """
+        task = asyncio.create_task(self.handler._process_broadcast(broadcast_id, resume=resume))
+        self._current_task = task
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.lease_seconds / 3)
+                if task.done():
+                    break
+
+                try:
+                    lease_kept = await asyncio.to_thread(self._renew_lease, broadcast_id)
+                except Exception as e:
+                    # БД тимчасово недоступна - спробуємо на наступному heartbeat, lease ще діє
+                    logger.error(f"Broadcast {broadcast_id}: heartbeat failed: {e}")
+                    continue
+
+                if not lease_kept:
+                    logger.error(f"Broadcast {broadcast_id}: lease lost, stopping delivery")
+                    task.cancel()
+
+            result, = await asyncio.gather(task, return_exceptions=True)
+            return result is True
+        finally:
+            self._current_task = None
+            await asyncio.to_thread(self._release_lease, broadcast_id)
+
+    async def run(self):
+        """Основний цикл: брати розсилки з черги, поки воркер не зупинено"""
+        self._running = True
+        logger.info(f"Broadcast worker {self.worker_id} started (lease {self.lease_seconds}s, poll {self.poll_interval}s)")
+
+        while self._running:
+            try:
+                job = await asyncio.to_thread(self._lease_next)
+            except Exception as e:
+                logger.error(f"Error leasing broadcast: {e}")
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            broadcast_id, resume = job
+            logger.info(f"Broadcast {broadcast_id} leased by {self.worker_id}{' (resume)' if resume else ''}")
+            if not await self._run_job(broadcast_id, resume):
+                # Розсилку продовжить наступна ітерація (цей або інший воркер) - без миттєвих повторів
+                await asyncio.sleep(self.poll_interval)
+
+        logger.info(f"Broadcast worker {self.worker_id} stopped")
+
+    def stop(self):
+        """Зупинити воркер; поточна розсилка переривається і звільняє lease"""
+        self._running = False
+        if self._current_task and not self._current_task.done():
+            self._current_task.cancel()
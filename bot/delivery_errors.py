@@ -0,0 +1,56 @@
+"""
+Класифікація помилок доставки повідомлень розсилки
+"""
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+# Коди помилок, що зберігаються в broadcast_queue.error_code
+ERROR_BLOCKED = 'blocked'                # користувач заблокував бота
+ERROR_DEACTIVATED = 'deactivated'        # акаунт користувача видалено
+ERROR_CHAT_NOT_FOUND = 'chat_not_found'  # чат не існує / бот ніколи не писав користувачу
+ERROR_FORBIDDEN = 'forbidden'            # інші заборони Telegram
+ERROR_BAD_REQUEST = 'bad_request'        # некоректне повідомлення (розмітка, файл тощо)
+ERROR_FLOOD = 'flood'                    # вичерпано спроби після RetryAfter
+ERROR_NETWORK = 'network'                # таймаут / мережева помилка
+ERROR_NO_CONTENT = 'no_content'          # у розсилці нема що відправляти
+ERROR_INTERRUPTED = 'interrupted'        # відправку перервала зупинка процесу
+ERROR_UNKNOWN = 'unknown'
+
+# Помилки, після яких повторна відправка цьому користувачу не має сенсу
+PERMANENT_ERRORS = (ERROR_BLOCKED, ERROR_DEACTIVATED, ERROR_CHAT_NOT_FOUND)
+
+# Максимальна довжина тексту помилки, що зберігається в черзі
+MAX_ERROR_MESSAGE_LENGTH = 500
+
+
+def classify_error(error: Optional[BaseException]) -> str:
+    """Код помилки доставки для винятку (None - відправляти не було чого)"""
+    if error is None:
+        return ERROR_NO_CONTENT
+
+    message = str(error).lower()
+
+    if isinstance(error, Forbidden):
+        if 'blocked' in message:
+            return ERROR_BLOCKED
+        if 'deactivated' in message:
+            return ERROR_DEACTIVATED
+        return ERROR_FORBIDDEN
+    if isinstance(error, BadRequest):
+        if 'chat not found' in message or 'user not found' in message:
+            return ERROR_CHAT_NOT_FOUND
+        return ERROR_BAD_REQUEST
+    if isinstance(error, RetryAfter):
+        return ERROR_FLOOD
+    # BadRequest теж NetworkError у python-telegram-bot, тому мережеві помилки перевіряємо в кінці
+    if isinstance(error, (TimedOut, NetworkError)):
+        return ERROR_NETWORK
+    return ERROR_UNKNOWN
+
+
+def error_message(error: Optional[BaseException]) -> str:
+    """Короткий текст помилки для збереження в черзі"""
+    if error is None:
+        return 'No content to send'
+    return str(error)[:MAX_ERROR_MESSAGE_LENGTH]
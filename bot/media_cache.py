@@ -0,0 +1,202 @@
+"""
+Кеш медіафайлів: локальний файл завантажується в Telegram один раз,
+далі всі відправки йдуть за збереженим file_id
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from database.models import DatabaseManager, MediaFileCache
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Атрибути Message, в яких Telegram повертає завантажений файл
+MESSAGE_MEDIA_ATTRIBUTES = ('photo', 'video', 'document', 'video_note', 'animation')
+
+# Тексти BadRequest, за якими Telegram відхиляє сам file_id (решта помилок стосується отримувача)
+INVALID_FILE_ID_ERRORS = ('wrong file identifier', 'wrong remote file', 'file reference expired')
+
+
+def is_invalid_file_id_error(error: BadRequest) -> bool:
+    """Чи означає помилка, що збережений file_id більше не дійсний"""
+    message = str(error).lower()
+    return any(text in message for text in INVALID_FILE_ID_ERRORS)
+
+
+def extract_file_id(message: Message, media_type: str) -> Optional[str]:
+    """Дістати file_id завантаженого файлу з відповіді Telegram"""
+    if message is None:
+        return None
+
+    # Спочатку очікуваний тип, потім решта (Telegram може, наприклад, перетворити mp4-документ на animation)
+    attributes = (media_type,) + tuple(a for a in MESSAGE_MEDIA_ATTRIBUTES if a != media_type)
+    for attribute in attributes:
+        media = getattr(message, attribute, None)
+        if not media:
+            continue
+        if isinstance(media, (list, tuple)):
+            # Для фото Telegram повертає кілька розмірів - беремо найбільший
+            media = media[-1]
+        return media.file_id
+    return None
+
+
+class MediaCache:
+    """Кеш Telegram file_id для локальних файлів (ключ: шлях + SHA-256 вмісту + тип медіа)"""
+
+    def __init__(self):
+        self._file_ids: Dict[Tuple[str, str, str], str] = {}
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}  # path -> (mtime_ns, size, sha256)
+        self._locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+
+    @staticmethod
+    def _relative_path(path: Path) -> str:
+        """Шлях відносно кореня проєкту (щоб ключ не залежав від робочої директорії)"""
+        resolved = Path(path).resolve()
+        try:
+            return str(resolved.relative_to(PROJECT_ROOT.resolve()))
+        except ValueError:
+            return str(resolved)
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    async def _content_hash(self, path: Path) -> str:
+        """SHA-256 вмісту файлу; перераховується тільки якщо файл змінився"""
+        stat = os.stat(path)
+        key = str(path)
+        cached = self._hashes.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        content_hash = await asyncio.to_thread(self._hash_file, path)
+        self._hashes[key] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
+
+    @staticmethod
+    def _read_file_id(key: Tuple[str, str, str]) -> Optional[str]:
+        with DatabaseManager() as db:
+            record = db.query(MediaFileCache).filter(
+                MediaFileCache.file_path == key[0],
+                MediaFileCache.content_hash == key[1],
+                MediaFileCache.media_type == key[2]
+            ).first()
+            return record.file_id if record else None
+
+    @staticmethod
+    def _write_file_id(key: Tuple[str, str, str], file_id: str):
+        with DatabaseManager() as db:
+            record = db.query(MediaFileCache).filter(
+                MediaFileCache.file_path == key[0],
+                MediaFileCache.content_hash == key[1],
+                MediaFileCache.media_type == key[2]
+            ).first()
+            if record:
+                record.file_id = file_id
+            else:
+                db.add(MediaFileCache(
+                    file_path=key[0],
+                    content_hash=key[1],
+                    media_type=key[2],
+                    file_id=file_id
+                ))
+            db.commit()
+
+    @staticmethod
+    def _delete_file_id(key: Tuple[str, str, str]):
+        with DatabaseManager() as db:
+            db.query(MediaFileCache).filter(
+                MediaFileCache.file_path == key[0],
+                MediaFileCache.content_hash == key[1],
+                MediaFileCache.media_type == key[2]
+            ).delete()
+            db.commit()
+
+    async def _load_file_id(self, key: Tuple[str, str, str]) -> Optional[str]:
+        file_id = self._file_ids.get(key)
+        if file_id:
+            return file_id
+
+        # Запити до БД - у потоці, щоб не блокувати event loop під час розсилки
+        try:
+            file_id = await asyncio.to_thread(self._read_file_id, key)
+        except Exception as e:
+            logger.warning(f"Cannot read media cache for {key[0]}: {e}")
+            return None
+        if file_id:
+            self._file_ids[key] = file_id
+        return file_id
+
+    async def _store_file_id(self, key: Tuple[str, str, str], file_id: str):
+        self._file_ids[key] = file_id
+
+        try:
+            await asyncio.to_thread(self._write_file_id, key, file_id)
+        except Exception as e:
+            logger.warning(f"Cannot save media cache for {key[0]}: {e}")
+
+    async def _forget(self, key: Tuple[str, str, str]):
+        self._file_ids.pop(key, None)
+
+        try:
+            await asyncio.to_thread(self._delete_file_id, key)
+        except Exception as e:
+            logger.warning(f"Cannot drop media cache for {key[0]}: {e}")
+
+    async def send(
+        self,
+        path: Path,
+        media_type: str,
+        send: Callable[[Any], Awaitable[Message]]
+    ) -> Message:
+        """Відправити локальний файл, використовуючи file_id якщо файл вже завантажувався.
+
+        `send` отримує або file_id (str), або відкритий файл і повертає Message.
+        """
+        path = Path(path)
+        key = (self._relative_path(path), await self._content_hash(path), media_type)
+
+        file_id = await self._load_file_id(key)
+        if file_id:
+            try:
+                return await send(file_id)
+            except BadRequest as e:
+                # Помилки отримувача (наприклад, "Chat not found") не стосуються file_id
+                if not is_invalid_file_id_error(e):
+                    raise
+                # file_id став недійсним (наприклад, змінився токен бота) - завантажуємо заново
+                logger.warning(f"Cached file_id for {key[0]} rejected ({e}), re-uploading")
+                await self._forget(key)
+
+        # Завантажуємо тільки одним воркером, решта чекає та використовує отриманий file_id
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            file_id = self._file_ids.get(key)
+            if not file_id:
+                with open(path, 'rb') as media_file:
+                    message = await send(media_file)
+
+                file_id = extract_file_id(message, media_type)
+                if file_id:
+                    await self._store_file_id(key, file_id)
+                    logger.info(f"Uploaded {key[0]} as {media_type}, file_id cached")
+                return message
+
+        return await send(file_id)
+
+
+# Глобальний кеш для процесу
+media_cache = MediaCache()
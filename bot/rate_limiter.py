@@ -0,0 +1,93 @@
+"""
+Обмежувач швидкості відправки повідомлень (token bucket)
+"""
+import asyncio
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """Token bucket: `rate` токенів за секунду, не більше `capacity` накопичених"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        """Поповнити токени відповідно до часу, що минув"""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def is_idle(self) -> bool:
+        """Чи відновився bucket повністю (ним давно не користувались)"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+    async def acquire(self):
+        """Дочекатися та забрати один токен"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Призупинити видачу токенів (наприклад, після RetryAfter від Telegram)"""
+        now = time.monotonic()
+        self._refill(now)
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+        self.updated_at = self.paused_until
+
+
+class RateLimiter:
+    """Глобальний ліміт повідомлень за секунду + окремий ліміт на кожен чат"""
+
+    # Після скількох чатів прибирати bucket-и, якими вже не користуються
+    MAX_IDLE_CHAT_BUCKETS = 1000
+
+    def __init__(self, global_rate: float, per_chat_rate: float = 1.0, per_chat_burst: float = 3.0):
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.MAX_IDLE_CHAT_BUCKETS:
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items() if not value.is_idle()
+                }
+            bucket = TokenBucket(self.per_chat_rate, capacity=self.per_chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def acquire(self, chat_id: int):
+        """Дочекатися дозволу на відправку одного повідомлення в чат"""
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def pause(self, seconds: float):
+        """Призупинити всю відправку на `seconds` секунд"""
+        self.global_bucket.pause(seconds)
+
+    @property
+    def paused_for(self) -> float:
+        """Скільки секунд ще триває пауза (0 якщо паузи немає)"""
+        return max(0.0, self.global_bucket.paused_until - time.monotonic())
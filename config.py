@@ -3,7 +3,9 @@
 """
 import os
 import logging
-from typing import Optional, Any, List
+import threading
+import time
+from typing import Optional, Any, Dict, List, Tuple
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -53,126 +55,154 @@ class Settings(BaseSettings):
     db_encryption_key: Optional[str] = Field(default=None, env="DB_ENCRYPTION_KEY")
     jwt_secret: Optional[str] = Field(default=None, env="JWT_SECRET")
     admin_default_password: str = Field(default="admin123", env="ADMIN_DEFAULT_PASSWORD")
-    
+
+    # Розсилки - ліміти відправки (Telegram дозволяє ~30 повідомлень/сек і ~1 повідомлення/сек в один чат)
+    broadcast_rate_limit: float = Field(default=25.0, env="BROADCAST_RATE_LIMIT")
+    broadcast_per_chat_rate: float = Field(default=1.0, env="BROADCAST_PER_CHAT_RATE")
+    broadcast_workers: int = Field(default=10, env="BROADCAST_WORKERS")
+    broadcast_max_retries: int = Field(default=5, env="BROADCAST_MAX_RETRIES")
+    # Черга обробляється порціями: статуси зберігаються після кожної порції
+    broadcast_chunk_size: int = Field(default=500, env="BROADCAST_CHUNK_SIZE")
+    # Воркер розсилок (start_broadcast_worker.py): тривалість lease та інтервал опитування черги
+    broadcast_lease_seconds: int = Field(default=60, env="BROADCAST_LEASE_SECONDS")
+    broadcast_poll_interval: int = Field(default=5, env="BROADCAST_POLL_INTERVAL")
+    # Як часто (секунд) воркер зберігає прогрес розсилки для адмін-панелі
+    broadcast_progress_interval: int = Field(default=2, env="BROADCAST_PROGRESS_INTERVAL")
+
+    # Пул з'єднань з БД (спільний для ORM та raw-запитів get_database())
+    db_pool_size: int = Field(default=5, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=10, env="DB_MAX_OVERFLOW")
+    db_pool_timeout: int = Field(default=30, env="DB_POOL_TIMEOUT")  # секунд очікування вільного з'єднання
+    db_pool_recycle: int = Field(default=3600, env="DB_POOL_RECYCLE")  # перевідкривати з'єднання старші за N секунд
+    # Ліміт часу SELECT-запиту API (секунд, MAX_EXECUTION_TIME) та кількість потоків API для блокуючих запитів
+    # (не більше db_pool_size + db_max_overflow, інакше обмежується розміром пулу)
+    db_query_timeout: int = Field(default=30, env="DB_QUERY_TIMEOUT")
+    api_thread_limit: int = Field(default=15, env="API_THREAD_LIMIT")
+    # Ліміт часу запиту експорту користувачів/платежів (секунд, 0 - без ліміту)
+    export_query_timeout: int = Field(default=600, env="EXPORT_QUERY_TIMEOUT")
+    # Фонові експорти: кількість потоків і скільки секунд зберігається готовий файл
+    export_workers: int = Field(default=2, env="EXPORT_WORKERS")
+    export_artifact_ttl: int = Field(default=3600, env="EXPORT_ARTIFACT_TTL")
+    # Медіа розсилок: процеси для обробки зображень, одночасні ffmpeg та їх ліміт часу (секунд)
+    media_process_workers: int = Field(default=2, env="MEDIA_PROCESS_WORKERS")
+    media_transcode_concurrency: int = Field(default=1, env="MEDIA_TRANSCODE_CONCURRENCY")
+    media_transcode_timeout: int = Field(default=300, env="MEDIA_TRANSCODE_TIMEOUT")
+    # Очищення файлів розсилок без посилань: вік файлу (годин) і максимум видалень за запуск
+    upload_gc_grace_hours: int = Field(default=72, env="UPLOAD_GC_GRACE_HOURS")
+    upload_gc_max_files: int = Field(default=2000, env="UPLOAD_GC_MAX_FILES")
+    # Скільки секунд API кешує авторизованих адмінів (0 - без кешу)
+    admin_auth_cache_ttl: int = Field(default=60, env="ADMIN_AUTH_CACHE_TTL")
+    # Статистика дашборду: максимальний вік збереженого знімка (секунд)
+    stats_snapshot_ttl: int = Field(default=300, env="STATS_SNAPSHOT_TTL")
+    # Скільки секунд процес використовує знімок налаштувань з адмін панелі (токени, ціна, webhook URL)
+    db_settings_cache_ttl: int = Field(default=60, env="DB_SETTINGS_CACHE_TTL")
+
     # Використовуємо model_config замість Config class
     model_config = {"extra": "allow", "env_file": ".env", "env_file_encoding": "utf-8"}
         
-    def __init__(self, **kwargs):
-        """Ініціалізуємо з автоматичним заповненням полів з БД"""
-        # Спочатку ініціалізуємо базові налаштування
-        super().__init__(**kwargs)
-        
-        # Заповнюємо обов'язкові поля з БД якщо вони не встановлені
-        if not self.telegram_bot_token:
-            self.telegram_bot_token = self._get_db_setting_simple('bot_token')
-        if not self.stripe_secret_key:
-            self.stripe_secret_key = self._get_db_setting_simple('stripe_secret_key')
-        if not self.stripe_publishable_key:
-            self.stripe_publishable_key = self._get_db_setting_simple('stripe_publishable_key')
-        if not self.stripe_webhook_secret:
-            self.stripe_webhook_secret = self._get_db_setting_simple('stripe_webhook_secret')
-        if not self.webhook_url:
-            self.webhook_url = self._get_db_setting_simple('webhook_url')
-    
-    def _get_db_setting_simple(self, key: str) -> Optional[str]:
-        """Простий метод для отримання налаштування з БД без fallback"""
-        try:
-            from database.models import get_database
-            from database.encryption import decrypt_setting
-            
-            db = get_database()
-            cursor = db.cursor(dictionary=True)
-            
-            try:
-                cursor.execute(
-                    "SELECT value_type, encrypted_value FROM system_settings WHERE `key` = %s",
-                    (key,)
-                )
-                result = cursor.fetchone()
-                
-                if result:
-                    return decrypt_setting(
-                        result['encrypted_value'], 
-                        result['value_type']
-                    )
-                return None
-                    
-            finally:
-                cursor.close()
-                db.close()
-                
-        except Exception as e:
-            logger.debug(f"Помилка при отриманні налаштування '{key}' з БД: {e}")
-            return None
-    
-    def _get_db_setting(self, key: str, fallback_value: Any) -> Any:
-        """Отримати налаштування з бази даних з fallback до .env"""
-        try:
-            from database.models import get_database
-            from database.encryption import decrypt_setting
-            
-            db = get_database()
-            cursor = db.cursor(dictionary=True)
-            
-            try:
-                cursor.execute(
-                    "SELECT value_type, encrypted_value FROM system_settings WHERE `key` = %s",
-                    (key,)
-                )
-                result = cursor.fetchone()
-                
-                if result:
-                    # Дешифруємо значення
-                    decrypted_value = decrypt_setting(
-                        result['encrypted_value'], 
-                        result['value_type']
-                    )
-                    return decrypted_value
-                else:
-                    logger.debug(f"Налаштування '{key}' не знайдено в базі, використовуємо .env")
-                    return fallback_value
-                    
-            finally:
-                cursor.close()
-                db.close()
-                
-        except Exception as e:
-            logger.debug(f"Помилка при отриманні налаштування '{key}' з БД: {e}, використовуємо .env")
-            return fallback_value
-    
     # Перевизначаємо ТІЛЬКИ ті поля, що керуються через адмін панель (6 штук)
     def __getattribute__(self, name):
         """Перехоплюємо доступ до полів, що керуються через адмін панель"""
-        # Поля з адмін панелі - беремо з БД
-        if name == 'telegram_bot_token':
-            return self._get_db_setting('bot_token', super().__getattribute__(name))
-        elif name == 'stripe_secret_key':
-            return self._get_db_setting('stripe_secret_key', super().__getattribute__(name))
-        elif name == 'stripe_publishable_key':
-            return self._get_db_setting('stripe_publishable_key', super().__getattribute__(name))
-        elif name == 'stripe_webhook_secret':
-            return self._get_db_setting('stripe_webhook_secret', super().__getattribute__(name))
-        elif name == 'subscription_price':
+        db_key = DB_MANAGED_SETTINGS.get(name)
+        if db_key is None:
+            # Всі інші поля - беремо з .env як завжди
+            return super().__getattribute__(name)
+        
+        # Поля з адмін панелі - беремо зі знімка налаштувань БД (звичайний dict, без запиту)
+        db_settings = _get_db_settings()
+        if name == 'subscription_price':
             # Особлива логіка для ціни - в БД в євро, в .env в центах
-            db_price = self._get_db_setting('subscription_price', None)
+            db_price = db_settings.get(db_key)
             if db_price is not None:
                 return float(db_price)  # З БД - вже в євро
-            else:
-                return super().__getattribute__(name) / 100.0  # З .env - конвертуємо центи в євро
-        elif name == 'webhook_url':
-            return self._get_db_setting('webhook_url', super().__getattribute__(name))
-        
-        # Всі інші поля - беремо з .env як завжди
+            return super().__getattribute__(name) / 100.0  # З .env - конвертуємо центи в євро
+        if db_key in db_settings:
+            return db_settings[db_key]
         return super().__getattribute__(name)
 
-
     def invalidate_cache(self):
-        """Очистити кеш налаштувань (просто recreate екземпляр)"""
-        # Pydantic автоматично перезавантажить .env, а БД буде перевірена знову
+        """Очистити кеш налаштувань: перечитати .env, а БД - при наступному зверненні"""
         self.__init__()
+        _invalidate_db_settings()
         logger.info("Кеш налаштувань очищено")
 
 
+# Поле Settings -> ключ у system_settings
+DB_MANAGED_SETTINGS = {
+    'telegram_bot_token': 'bot_token',
+    'stripe_secret_key': 'stripe_secret_key',
+    'stripe_publishable_key': 'stripe_publishable_key',
+    'stripe_webhook_secret': 'stripe_webhook_secret',
+    'subscription_price': 'subscription_price',
+    'webhook_url': 'webhook_url',
+}
+
+# Знімок налаштувань з БД: (monotonic час закінчення, {ключ: значення}).
+# Оновлюється раз на db_settings_cache_ttl секунд одним запитом; PUT /api/settings/{key}
+# скидає його одразу, інші процеси (бот, webhook) підхоплюють зміну після TTL.
+_db_settings_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+_db_settings_lock = threading.Lock()
+# Через скільки секунд повторити спробу, якщо БД недоступна
+DB_SETTINGS_RETRY_INTERVAL = 5
+
+
+def _load_db_settings() -> Optional[Dict[str, Any]]:
+    """Прочитати та розшифрувати налаштування з адмін панелі одним запитом (None якщо БД недоступна)"""
+    try:
+        from database.models import database_connection
+        from database.encryption import decrypt_setting
+        
+        keys = tuple(DB_MANAGED_SETTINGS.values())
+        with database_connection() as db:
+            cursor = db.cursor(dictionary=True)
+            try:
+                cursor.execute(
+                    f"SELECT `key`, value_type, encrypted_value FROM system_settings "
+                    f"WHERE `key` IN ({', '.join(['%s'] * len(keys))})",
+                    keys
+                )
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        
+        return {
+            row['key']: decrypt_setting(row['encrypted_value'], row['value_type'])
+            for row in rows
+        }
+    except Exception as e:
+        logger.debug(f"Помилка при отриманні налаштувань з БД: {e}, використовуємо .env")
+        return None
+
+
+def _get_db_settings() -> Dict[str, Any]:
+    """Актуальний знімок налаштувань з БД (при недоступній БД - останній успішний)"""
+    global _db_settings_cache
+    cache = _db_settings_cache
+    if cache and cache[0] > time.monotonic():
+        return cache[1]
+    
+    with _db_settings_lock:
+        cache = _db_settings_cache
+        if cache and cache[0] > time.monotonic():
+            return cache[1]
+        
+        values = _load_db_settings()
+        if values is None:
+            values = cache[1] if cache else {}
+            expires_at = time.monotonic() + DB_SETTINGS_RETRY_INTERVAL
+        else:
+            expires_at = time.monotonic() + settings.db_settings_cache_ttl
+        _db_settings_cache = (expires_at, values)
+        return values
+
+
+def _invalidate_db_settings():
+    """Скинути знімок налаштувань з БД (зміна в адмін панелі)"""
+    global _db_settings_cache
+    with _db_settings_lock:
+        _db_settings_cache = None
+
+
 # Глобальні налаштування - тепер з автоматичною підтримкою БД
 settings = Settings()
 
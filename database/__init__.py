@@ -3,10 +3,12 @@ Database package
 """
 from .models import (
     User, Reminder, Payment, InviteLink,
-    DatabaseManager, create_tables, get_db
+    DatabaseManager, create_tables, get_db,
+    get_database, database_connection
 )
 
 __all__ = [
     "User", "Reminder", "Payment", "InviteLink",
-    "DatabaseManager", "create_tables", "get_db"
+    "DatabaseManager", "create_tables", "get_db",
+    "get_database", "database_connection"
 ]
\ No newline at end of file
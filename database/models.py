@@ -1,13 +1,20 @@
 """
 Моделі бази даних для бота
 """
+import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey
+from typing import Optional, List, Tuple
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index, exists, event, func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 
@@ -56,6 +63,25 @@ class User(Base):
     reminders = relationship("Reminder", back_populates="user")
     payments = relationship("Payment", back_populates="user")
     
+    __table_args__ = (
+        # Пошук в адмін-панелі: точний email, префікси імен, повнотекстовий пошук
+        Index('idx_users_email', 'email'),
+        Index('idx_users_username', 'username'),
+        Index('idx_users_first_name', 'first_name'),
+        Index('idx_users_last_name', 'last_name'),
+        Index('ft_users_search', 'first_name', 'last_name', 'username', 'email', mysql_prefix='FULLTEXT'),
+        # Пошук користувача зі Stripe webhook-ів
+        Index('idx_users_stripe_customer', 'stripe_customer_id'),
+        Index('idx_users_stripe_subscription', 'stripe_subscription_id'),
+        # Планувальник: закінчення підписок і наближення оплати
+        Index('idx_users_active_end_date', 'subscription_active', 'subscription_end_date'),
+        Index('idx_users_active_billing', 'subscription_active', 'next_billing_date'),
+        # Списки в адмін-панелі (сортування та курсор)
+        Index('idx_users_created', 'created_at', 'id'),
+        # Відбиток даних експорту (MAX(updated_at))
+        Index('idx_users_updated', 'updated_at'),
+    )
+    
     def __repr__(self):
         return f"<User(telegram_id={self.telegram_id}, username={self.username})>"
     
@@ -90,6 +116,11 @@ class Reminder(Base):
     # Зв'язки
     user = relationship("User", back_populates="reminders")
     
+    __table_args__ = (
+        # Вибірка нагадувань, час яких настав
+        Index('idx_reminders_due', 'is_active', 'scheduled_at'),
+    )
+    
     def __repr__(self):
         return f"<Reminder(user_id={self.user_id}, type={self.reminder_type}, scheduled_at={self.scheduled_at})>"
 
@@ -119,6 +150,17 @@ class Payment(Base):
     # Зв'язки
     user = relationship("User", back_populates="payments")
     
+    __table_args__ = (
+        # Кількість платежів користувача за статусом (webhook-и)
+        Index('idx_payments_user_status', 'user_id', 'status'),
+        # Виручка / платежі за період та фільтр за статусом
+        Index('idx_payments_status_created', 'status', 'created_at'),
+        # Списки в адмін-панелі (сортування та курсор)
+        Index('idx_payments_created', 'created_at', 'id'),
+        # Відбиток даних експорту (MAX(updated_at))
+        Index('idx_payments_updated', 'updated_at'),
+    )
+    
     def __repr__(self):
         return f"<Payment(user_id={self.user_id}, amount={self.amount}, status={self.status})>"
 
@@ -257,10 +299,11 @@ class SystemSettings(Base):
 engine = create_engine(
     settings.database_url, 
     echo=False,  # Завжди False для production, інакше генерує ~90GB трафіку/день!
-    pool_size=5,  # Базовий розмір пулу з'єднань
-    max_overflow=10,  # Максимальна кількість додаткових з'єднань
+    pool_size=settings.db_pool_size,  # Базовий розмір пулу з'єднань
+    max_overflow=settings.db_max_overflow,  # Максимальна кількість додаткових з'єднань
+    pool_timeout=settings.db_pool_timeout,
     pool_pre_ping=True,  # Перевірка з'єднань перед використанням
-    pool_recycle=3600,  # Переробляти з'єднання кожну годину
+    pool_recycle=settings.db_pool_recycle,  # Переробляти старі з'єднання (MySQL wait_timeout)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -314,6 +357,11 @@ class DatabaseManager:
                 db.refresh(user)
                 # Відключаємо об'єкт від сесії для безпечного використання
                 db.expunge(user)
+                # Новий користувач - статистика адмін-панелі перерахується при наступному запиті
+                try:
+                    DatabaseManager.mark_stats_stale()
+                except Exception as e:
+                    logger.error(f"Не вдалося позначити статистику застарілою: {e}")
             else:
                 # Оновити дані користувача якщо вони змінилися
                 updated = False
@@ -424,11 +472,30 @@ class DatabaseManager:
         """Отримати обмежену кількість нагадувань для надсилання"""
         with DatabaseManager() as db:
             now = datetime.utcnow()
-            reminders = db.query(Reminder).filter(
+            due = (
                 Reminder.is_active == True,
                 Reminder.sent_at.is_(None),
                 Reminder.scheduled_at <= now,
-                Reminder.attempts < Reminder.max_attempts
+            )
+            # Нагадування недоступним користувачам закриваються (їх видалить cleanup_old_reminders),
+            # інакше вони лишались би активними й перевірялись при кожному запуску
+            cancelled = db.query(Reminder).filter(
+                *due,
+                exists().where(
+                    User.id == Reminder.user_id,
+                    SuppressedRecipient.telegram_id == User.telegram_id
+                )
+            ).update({Reminder.is_active: False}, synchronize_session=False)
+            if cancelled:
+                db.commit()
+                logger.info(f"Скасовано {cancelled} нагадувань недоступним користувачам")
+            
+            reminders = db.query(Reminder).join(User, User.id == Reminder.user_id).filter(
+                Reminder.is_active == True,
+                Reminder.sent_at.is_(None),
+                Reminder.scheduled_at <= now,
+                Reminder.attempts < Reminder.max_attempts,
+                recipient_not_suppressed()
             ).limit(limit).all()
             
             # Створюємо список кортежів (reminder_id, user_id, reminder_type, attempts, max_attempts)
@@ -820,6 +887,144 @@ class DatabaseManager:
             db.commit()
             db.refresh(log)
             return log
+    
+    # Методи для роботи зі списком недоступних отримувачів
+    @staticmethod
+    def suppress_recipients(recipients: List[Tuple[int, str, Optional[str]]], db: Session = None):
+        """Додати недоступних отримувачів: список (telegram_id, reason, error_message)"""
+        if not recipients:
+            return
+        if db is None:
+            with DatabaseManager() as db:
+                DatabaseManager.suppress_recipients(recipients, db)
+            return
+        
+        now = datetime.utcnow()
+        by_id = {telegram_id: (reason, error_message) for telegram_id, reason, error_message in recipients}
+        values = [
+            {
+                'telegram_id': telegram_id,
+                'reason': reason,
+                'error_message': error_message,
+                'failures': 1,
+                'created_at': now,
+                'updated_at': now,
+            }
+            for telegram_id, (reason, error_message) in by_id.items()
+        ]
+        # Один upsert: паралельні воркери не конфліктують на унікальному telegram_id
+        if db.bind.dialect.name == 'sqlite':
+            statement = sqlite_insert(SuppressedRecipient).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[SuppressedRecipient.telegram_id],
+                set_={
+                    'reason': statement.excluded.reason,
+                    'error_message': statement.excluded.error_message,
+                    'failures': func.coalesce(SuppressedRecipient.failures, 0) + 1,
+                    'updated_at': statement.excluded.updated_at,
+                }
+            )
+        else:
+            statement = mysql_insert(SuppressedRecipient).values(values)
+            statement = statement.on_duplicate_key_update(
+                reason=statement.inserted.reason,
+                error_message=statement.inserted.error_message,
+                failures=func.coalesce(SuppressedRecipient.failures, 0) + 1,
+                updated_at=statement.inserted.updated_at
+            )
+        db.execute(statement)
+    
+    @staticmethod
+    def unsuppress_recipient(telegram_id: int) -> bool:
+        """Прибрати користувача зі списку недоступних (він знову написав боту)"""
+        with DatabaseManager() as db:
+            deleted = db.query(SuppressedRecipient).filter(
+                SuppressedRecipient.telegram_id == telegram_id
+            ).delete(synchronize_session=False)
+            return deleted > 0
+    
+    @staticmethod
+    def get_suppressed_telegram_ids(telegram_ids: List[int]) -> set:
+        """Які з переданих telegram_id позначені як недоступні для повідомлень"""
+        if not telegram_ids:
+            return set()
+        with DatabaseManager() as db:
+            rows = db.query(SuppressedRecipient.telegram_id).filter(
+                SuppressedRecipient.telegram_id.in_(telegram_ids)
+            ).all()
+            return {row.telegram_id for row in rows}
+    
+    @staticmethod
+    def mark_stats_stale():
+        """Позначити знімки статистики адмін-панелі застарілими (змінились користувачі чи платежі)"""
+        with DatabaseManager() as db:
+            db.query(StatsSnapshot).update(
+                {StatsSnapshot.invalidated_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+    
+    @staticmethod
+    def count_media_references(file_url: str) -> int:
+        """Кількість розсилок, що використовують завантажений файл (вкладення або блок повідомлення)"""
+        with DatabaseManager() as db:
+            return db.query(Broadcast).filter(
+                or_(
+                    Broadcast.attachment_url == file_url,
+                    Broadcast.message_blocks.contains(file_url, autoescape=True)
+                )
+            ).count()
+
+
+class StatsSnapshot(Base):
+    """Збережений знімок агрегованої статистики для дашборду адмін-панелі"""
+    __tablename__ = "stats_snapshots"
+    
+    name = Column(String(50), primary_key=True)  # 'dashboard'
+    data = Column(Text, nullable=False)  # JSON з лічильниками
+    computed_at = Column(DateTime, nullable=False)
+    invalidated_at = Column(DateTime, nullable=True)  # знімок застарів, якщо invalidated_at >= computed_at
+
+
+class ExportJob(Base):
+    """Фонова задача експорту користувачів/платежів і файл, який вона створила"""
+    __tablename__ = "export_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    created_by = Column(Integer, nullable=True)  # ID адміна
+    
+    # Що експортується: 'users' / 'payments', 'xlsx' / 'csv', фільтри (JSON) та їх хеш
+    export_type = Column(String(20), nullable=False)
+    export_format = Column(String(10), nullable=False)
+    filters = Column(Text, nullable=True)
+    filters_hash = Column(String(64), nullable=False)
+    
+    # Відбиток даних таблиць на момент запуску: файл повторно використовується, поки він не змінився
+    data_version = Column(String(64), nullable=False)
+    
+    # Статус: 'pending', 'processing', 'completed', 'failed', 'expired'
+    status = Column(String(20), default='pending')
+    
+    # Результат
+    file_path = Column(String(500), nullable=True)  # відносно кореня проєкту
+    file_size = Column(BigInteger, nullable=True)
+    row_count = Column(Integer, nullable=True)
+    error_message = Column(Text, nullable=True)
+    
+    # Дати
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)  # після цього файл видаляється
+    
+    __table_args__ = (
+        # Пошук готового файлу з тими ж фільтрами
+        Index('idx_export_jobs_lookup', 'export_type', 'export_format', 'filters_hash', 'status'),
+        # Видалення прострочених файлів
+        Index('idx_export_jobs_expires', 'status', 'expires_at'),
+    )
+    
+    def __repr__(self):
+        return f"<ExportJob(id={self.id}, export={self.export_type}, status={self.status})>"
 
 
 class Broadcast(Base):
@@ -851,8 +1056,23 @@ class Broadcast(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
-    error_log = Column(Text, nullable=True)  # Лог помилок
-    full_log = Column(Text, nullable=True)  # Повний лог розсилки (успішні + помилки)
+    checkpoint_at = Column(DateTime, nullable=True)  # Час останньої збереженої порції черги
+    
+    # Lease воркера розсилок (start_broadcast_worker.py)
+    lease_owner = Column(String(100), nullable=True)  # host:pid воркера
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    error_counts = Column(Text, nullable=True)  # JSON: код помилки -> кількість (деталі по отримувачах в broadcast_queue)
+    progress = Column(Text, nullable=True)  # JSON: останній знімок прогресу від воркера (швидкість, ETA, паузи)
+    error_log = Column(Text, nullable=True)  # Застаріле: лог помилок старих розсилок
+    full_log = Column(Text, nullable=True)  # Застаріле: повний лог старих розсилок
+    
+    __table_args__ = (
+        # Вибірка наступної розсилки воркером
+        Index('idx_broadcasts_lease', 'status', 'lease_expires_at'),
+        # Список розсилок в адмін-панелі
+        Index('idx_broadcasts_created', 'created_at', 'id'),
+    )
 
 
 class BroadcastQueue(Base):
@@ -864,7 +1084,8 @@ class BroadcastQueue(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     telegram_id = Column(BigInteger, nullable=False)
     
-    status = Column(String(20), default='pending')  # 'pending', 'sent', 'failed'
+    status = Column(String(20), default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    error_code = Column(String(50), nullable=True)  # 'blocked', 'chat_not_found', 'network', ... (bot/delivery_errors.py)
     error_message = Column(Text, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -873,6 +1094,30 @@ class BroadcastQueue(Base):
     # Relationships
     broadcast = relationship("Broadcast")
     user = relationship("User")
+    
+    __table_args__ = (
+        # Порційна вибірка черги: broadcast_id + status + id > last_id
+        Index('idx_broadcast_queue_claim', 'broadcast_id', 'status', 'id'),
+    )
+
+
+class SuppressedRecipient(Base):
+    """Користувачі, яким неможливо доставити повідомлення (заблокували бота, видалили акаунт)"""
+    __tablename__ = "suppressed_recipients"
+    
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, unique=True, nullable=False)
+    reason = Column(String(50), nullable=False)  # код помилки: 'blocked', 'deactivated', 'chat_not_found'
+    error_message = Column(Text, nullable=True)
+    failures = Column(Integer, default=1)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+def recipient_not_suppressed():
+    """Умова для запитів по User: користувач не в списку недоступних"""
+    return ~exists().where(SuppressedRecipient.telegram_id == User.telegram_id)
 
 
 class SystemLog(Base):
@@ -899,22 +1144,53 @@ class SystemLog(Base):
     # Дати
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Список логів в адмін-панелі (з фільтром за типом задачі) та статистика за 24 години
+        Index('idx_system_logs_created', 'created_at', 'id'),
+        Index('idx_system_logs_task_created', 'task_type', 'created_at'),
+    )
+    
     def __repr__(self):
         return f"<SystemLog(task={self.task_type}, status={self.status}, created_at={self.created_at})>"
 
 
-def get_database():
-    """
-    Отримати з'єднання з базою даних для адмін-панелі
-    Повертає raw MySQL connection для простих запитів
-    """
-    import mysql.connector
+class MediaFileCache(Base):
+    """Кеш Telegram file_id для локальних медіафайлів (файл завантажується в Telegram один раз)"""
+    __tablename__ = "media_file_cache"
+    
+    id = Column(Integer, primary_key=True)
+    
+    # Шлях до файлу відносно кореня проєкту та SHA-256 його вмісту
+    file_path = Column(String(500), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    
+    # Як файл був відправлений: 'photo', 'video', 'document', 'video_note'
+    media_type = Column(String(20), nullable=False)
+    
+    # file_id, який повернув Telegram після першого завантаження
+    file_id = Column(String(255), nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('file_path', 'content_hash', 'media_type', name='uq_media_file_cache'),
+    )
+    
+    def __repr__(self):
+        return f"<MediaFileCache(file_path={self.file_path}, media_type={self.media_type})>"
+
+
+# Пул raw MySQL з'єднань для get_database() (створюється при першому зверненні)
+_raw_engine = None
+_raw_engine_lock = threading.Lock()
+
+
+def _mysql_connect_args() -> dict:
+    """Параметри mysql.connector з DATABASE_URL"""
     from urllib.parse import urlparse
     
-    # Парсимо DATABASE_URL
     parsed = urlparse(settings.database_url)
-    
-    config = {
+    return {
         'host': parsed.hostname,
         'port': parsed.port or 3306,
         'user': parsed.username,
@@ -923,5 +1199,90 @@ def get_database():
         'charset': 'utf8mb4',
         'autocommit': False
     }
-    
-    return mysql.connector.connect(**config)
\ No newline at end of file
+
+
+def _get_raw_engine():
+    """Engine з пулом mysql.connector з'єднань (pre-ping, recycle, розмір з налаштувань)"""
+    global _raw_engine
+    if _raw_engine is None:
+        with _raw_engine_lock:
+            if _raw_engine is None:
+                import mysql.connector
+                
+                connect_args = _mysql_connect_args()
+                _raw_engine = create_engine(
+                    "mysql+mysqlconnector://",
+                    creator=lambda: mysql.connector.connect(**connect_args),
+                    echo=False,
+                    pool_size=settings.db_pool_size,
+                    max_overflow=settings.db_max_overflow,
+                    pool_timeout=settings.db_pool_timeout,
+                    pool_pre_ping=True,
+                    pool_recycle=settings.db_pool_recycle,
+                )
+                event.listen(_raw_engine, "checkout", _set_query_timeout)
+    return _raw_engine
+
+
+def set_query_timeout(connection, seconds: int):
+    """Ліміт часу SELECT-запитів на рівні сесії MySQL (0 - без ліміту)"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (max(0, seconds) * 1000,))
+    except Exception as e:
+        # MariaDB та старі версії MySQL не мають MAX_EXECUTION_TIME
+        logger.warning(f"Could not set MAX_EXECUTION_TIME: {e}")
+    finally:
+        cursor.close()
+        # Запам'ятовуємо на з'єднанні пулу (і після невдачі - без повторних спроб),
+        # щоб при наступній видачі повернути ліміт процесу
+        connection.info['query_timeout'] = max(0, seconds)
+
+
+# Ліміт часу запитів вмикає лише API (enable_query_timeout при старті); бот, воркер розсилок,
+# планувальник і webhook працюють з тими самими пулами без ліміту
+_query_timeout = 0
+
+
+def enable_query_timeout(seconds: int):
+    """Обмежити час SELECT-запитів усіх сесій цього процесу (ORM і raw-пул)"""
+    global _query_timeout
+    _query_timeout = max(0, int(seconds))
+
+
+def _apply_query_timeout(dbapi_connection):
+    """Встановити ліміт процесу на з'єднанні, якщо він ще не встановлений"""
+    # SET виконується лише якщо ліміт з'єднання відрізняється (див. set_query_timeout)
+    if dbapi_connection.info.get('query_timeout', 0) != _query_timeout:
+        set_query_timeout(dbapi_connection, _query_timeout)
+
+
+def _set_query_timeout(dbapi_connection, connection_record, connection_proxy):
+    """Ліміт для з'єднання raw-пулу при кожній видачі з пулу"""
+    _apply_query_timeout(connection_proxy)
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _set_session_query_timeout(session, transaction, connection):
+    """Ліміт для ORM-сесії (DatabaseManager, SessionLocal) на початку транзакції"""
+    if connection.dialect.name == 'mysql':
+        _apply_query_timeout(connection.connection)
+
+
+def get_database():
+    """
+    Отримати з'єднання з базою даних для адмін-панелі
+    Повертає raw MySQL connection з пулу для простих запитів.
+    close() повертає з'єднання в пул (незакомічені зміни відкочуються).
+    """
+    return _get_raw_engine().raw_connection()
+
+
+@contextmanager
+def database_connection():
+    """Взяти raw MySQL з'єднання з пулу на час блоку with"""
+    db = get_database()
+    try:
+        yield db
+    finally:
+        db.close()
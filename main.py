@@ -19,6 +19,7 @@ from config import settings, UserState, Messages, Buttons
 from database import DatabaseManager, User, create_tables
 from payments import StripeManager
 from tasks import TaskScheduler
+from bot.media_cache import media_cache
 from bot.keyboards import (
     get_main_menu_keyboard, get_cancelled_subscription_keyboard, get_welcome_keyboard, get_survey_goals_keyboard,
     get_survey_injuries_keyboard, get_subscription_offer_keyboard,
@@ -188,6 +189,10 @@ class UpgradeStudioBot:
             last_name=user.last_name
         )
         
+        # Користувач знову написав боту (наприклад, розблокував) - повертаємо його в розсилки
+        if not is_new_user and DatabaseManager.unsuppress_recipient(user.id):
+            logger.info(f"User {user.id} removed from suppressed recipients after /start")
+        
         # Якщо новий користувач - відправляємо повідомлення в Tech групу
         if is_new_user:
             user_info = f"@{user.username}" if user.username else user.full_name or f"ID: {user.id}"
@@ -279,9 +284,9 @@ class UpgradeStudioBot:
                     # Надсилаємо відео кружечок
                     video_path = "assets/welcome_video.mp4"
                     if os.path.exists(video_path):
-                        await self.bot.send_video_note(
-                            chat_id=user.id,
-                            video_note=open(video_path, "rb")
+                        await media_cache.send(
+                            video_path, 'video_note',
+                            lambda video_note: self.bot.send_video_note(chat_id=user.id, video_note=video_note)
                         )
                         # Затримка 5 секунд
                         await asyncio.sleep(5)
@@ -356,8 +361,9 @@ class UpgradeStudioBot:
         # Надсилаємо відео-привітання (кружечок)
         video_path = "assets/welcome_video.mp4"
         if os.path.exists(video_path):
-            await update.message.reply_video_note(
-                video_note=open(video_path, "rb")
+            await media_cache.send(
+                video_path, 'video_note',
+                lambda video_note: update.message.reply_video_note(video_note=video_note)
             )
         
         # Оновлюємо стан користувача на вибір цілей
@@ -2540,6 +2546,12 @@ UPGRADE21 STUDIO — це не просто фітнес, це ваша тран
                               f"next_billing_date={next_billing.strftime('%Y-%m-%d')}, "
                               f"subscription_end_date={db_user.subscription_end_date.strftime('%Y-%m-%d')}")
             
+            # Підписка активована - статистика адмін-панелі перерахується при наступному запиті
+            try:
+                DatabaseManager.mark_stats_stale()
+            except Exception as e:
+                logger.error(f"Не вдалося позначити статистику застарілою: {e}")
+            
             # Скасовуємо всі нагадування про підписку, оскільки оплата пройшла
             cancelled_count = DatabaseManager.cancel_subscription_reminders_if_active(telegram_id)
             if cancelled_count > 0:
@@ -3216,9 +3228,9 @@ PRIVATE_CHANNEL_ID={forward_chat.id}"""
                             # Надсилаємо відео кружечок замість текстового повідомлення
                             video_path = "assets/welcome_video.mp4"
                             if os.path.exists(video_path):
-                                await self.bot.send_video_note(
-                                    chat_id=user_id,
-                                    video_note=open(video_path, "rb")
+                                await media_cache.send(
+                                    video_path, 'video_note',
+                                    lambda video_note: self.bot.send_video_note(chat_id=user_id, video_note=video_note)
                                 )
                             
                             # Затримка 5 секунд, щоб людина встигла подивитись кружечок
@@ -3530,9 +3542,9 @@ PRIVATE_CHANNEL_ID={forward_chat.id}"""
         # Перше приєднання - надсилаємо відео кружечок
         video_path = "assets/welcome_video.mp4"
         if os.path.exists(video_path):
-            await self.bot.send_video_note(
-                chat_id=user_id,
-                video_note=open(video_path, "rb")
+            await media_cache.send(
+                video_path, 'video_note',
+                lambda video_note: self.bot.send_video_note(chat_id=user_id, video_note=video_note)
             )
         
         # Затримка 5 секунд, щоб людина встигла подивитись кружечок
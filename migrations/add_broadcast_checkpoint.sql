@@ -0,0 +1,8 @@
+-- Міграція: порційна обробка черги розсилок з можливістю продовження після перезапуску
+-- checkpoint_at оновлюється після кожної збереженої порції черги
+
+ALTER TABLE broadcasts
+ADD COLUMN checkpoint_at DATETIME NULL COMMENT 'Час останньої збереженої порції черги';
+
+-- Вибірка порцій: WHERE broadcast_id = ? AND status = 'pending' AND id > ? ORDER BY id
+CREATE INDEX idx_broadcast_queue_claim ON broadcast_queue (broadcast_id, status, id);
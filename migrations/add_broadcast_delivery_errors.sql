@@ -0,0 +1,9 @@
+-- Міграція: структурований лог доставки розсилок
+-- Результат по кожному отримувачу зберігається тільки в broadcast_queue (status, error_code, sent_at),
+-- в broadcasts - агреговані лічильники помилок за кодом. full_log / error_log більше не заповнюються.
+
+ALTER TABLE broadcast_queue
+ADD COLUMN error_code VARCHAR(50) NULL COMMENT 'Код помилки доставки' AFTER status;
+
+ALTER TABLE broadcasts
+ADD COLUMN error_counts TEXT NULL COMMENT 'JSON: код помилки -> кількість' AFTER checkpoint_at;
@@ -0,0 +1,4 @@
+-- Міграція: знімок прогресу розсилки (оновлюється воркером кожні BROADCAST_PROGRESS_INTERVAL секунд)
+
+ALTER TABLE broadcasts
+ADD COLUMN progress TEXT NULL COMMENT 'JSON: sent, failed, in_flight, швидкість, ETA, паузи RetryAfter' AFTER error_counts;
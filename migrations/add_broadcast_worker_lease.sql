@@ -0,0 +1,10 @@
+-- Міграція: lease для воркера розсилок (start_broadcast_worker.py)
+-- Воркер захоплює розсилку через SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8+)
+-- і продовжує lease heartbeat-ом; прострочений lease може забрати інший воркер.
+
+ALTER TABLE broadcasts
+ADD COLUMN lease_owner VARCHAR(100) NULL COMMENT 'host:pid воркера, що виконує розсилку' AFTER checkpoint_at,
+ADD COLUMN lease_expires_at DATETIME NULL COMMENT 'До якого часу діє lease' AFTER lease_owner,
+ADD COLUMN heartbeat_at DATETIME NULL COMMENT 'Останній heartbeat воркера' AFTER lease_expires_at;
+
+CREATE INDEX idx_broadcasts_lease ON broadcasts (status, lease_expires_at);
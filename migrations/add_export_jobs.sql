@@ -0,0 +1,24 @@
+-- Міграція: фонові задачі експорту користувачів і платежів
+-- Готовий файл зберігається в exports/ до expires_at і повторно віддається для тих самих
+-- фільтрів, поки data_version (відбиток таблиць) не змінився.
+
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    created_by INT NULL,
+    export_type VARCHAR(20) NOT NULL,
+    export_format VARCHAR(10) NOT NULL,
+    filters TEXT NULL,
+    filters_hash VARCHAR(64) NOT NULL,
+    data_version VARCHAR(64) NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',
+    file_path VARCHAR(500) NULL,
+    file_size BIGINT NULL,
+    row_count INT NULL,
+    error_message TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    completed_at DATETIME NULL,
+    expires_at DATETIME NULL,
+    INDEX idx_export_jobs_lookup (export_type, export_format, filters_hash, status),
+    INDEX idx_export_jobs_expires (status, expires_at)
+);
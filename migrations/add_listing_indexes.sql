@@ -0,0 +1,26 @@
+-- Міграція: індекси для списків адмін-панелі та запитів планувальника
+-- Фільтри за датами переписані на діапазони (created_at >= ... AND created_at < ...),
+-- тому ці індекси використовуються замість повного сканування таблиць.
+-- broadcast_queue(broadcast_id, status) покриває idx_broadcast_queue_claim.
+
+-- users
+CREATE INDEX idx_users_stripe_customer ON users(stripe_customer_id);
+CREATE INDEX idx_users_stripe_subscription ON users(stripe_subscription_id);
+CREATE INDEX idx_users_active_end_date ON users(subscription_active, subscription_end_date);
+CREATE INDEX idx_users_active_billing ON users(subscription_active, next_billing_date);
+CREATE INDEX idx_users_created ON users(created_at, id);
+
+-- reminders
+CREATE INDEX idx_reminders_due ON reminders(is_active, scheduled_at);
+
+-- payments
+CREATE INDEX idx_payments_user_status ON payments(user_id, status);
+CREATE INDEX idx_payments_status_created ON payments(status, created_at);
+CREATE INDEX idx_payments_created ON payments(created_at, id);
+
+-- broadcasts
+CREATE INDEX idx_broadcasts_created ON broadcasts(created_at, id);
+
+-- system_logs
+CREATE INDEX idx_system_logs_created ON system_logs(created_at, id);
+CREATE INDEX idx_system_logs_task_created ON system_logs(task_type, created_at);
@@ -0,0 +1,13 @@
+-- Міграція: кеш Telegram file_id для локальних медіафайлів
+-- Кожен файл з uploads/ та assets/ завантажується в Telegram один раз,
+-- далі відправляється за file_id
+
+CREATE TABLE IF NOT EXISTS media_file_cache (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    file_path VARCHAR(500) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    media_type VARCHAR(20) NOT NULL,
+    file_id VARCHAR(255) NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_media_file_cache (file_path, content_hash, media_type)
+);
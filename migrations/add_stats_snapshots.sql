@@ -0,0 +1,10 @@
+-- Міграція: знімки статистики для дашборду адмін-панелі
+-- Лічильники користувачів і платежів рахуються одним проходом і зберігаються тут.
+-- Webhook-и та зміни в адмін-панелі позначають знімок застарілим через invalidated_at.
+
+CREATE TABLE IF NOT EXISTS stats_snapshots (
+    name VARCHAR(50) NOT NULL PRIMARY KEY,
+    data TEXT NOT NULL,
+    computed_at DATETIME NOT NULL,
+    invalidated_at DATETIME NULL
+);
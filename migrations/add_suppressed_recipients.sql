@@ -0,0 +1,14 @@
+-- Міграція: список недоступних отримувачів
+-- Користувачі, що заблокували бота / видалили акаунт, не потрапляють у розсилки та нагадування.
+-- Запис видаляється, коли користувач знову надсилає /start.
+
+CREATE TABLE IF NOT EXISTS suppressed_recipients (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    telegram_id BIGINT NOT NULL,
+    reason VARCHAR(50) NOT NULL COMMENT 'blocked, deactivated, chat_not_found',
+    error_message TEXT NULL,
+    failures INT DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_suppressed_recipients_telegram_id (telegram_id)
+);
@@ -0,0 +1,6 @@
+-- Міграція: індекси updated_at для відбитку даних експорту
+-- data_version порівнює MAX(updated_at) користувачів і платежів, тож готовий файл
+-- експорту не віддається повторно після зміни існуючих рядків.
+
+CREATE INDEX idx_users_updated ON users(updated_at);
+CREATE INDEX idx_payments_updated ON payments(updated_at);
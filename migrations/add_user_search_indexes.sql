@@ -0,0 +1,8 @@
+-- Міграція: індекси для пошуку користувачів в адмін-панелі
+-- Префіксний пошук по іменах/username та повнотекстовий пошук замість LIKE '%...%'.
+-- idx_users_email створюється в add_email_to_users.sql.
+
+CREATE INDEX idx_users_username ON users(username);
+CREATE INDEX idx_users_first_name ON users(first_name);
+CREATE INDEX idx_users_last_name ON users(last_name);
+CREATE FULLTEXT INDEX ft_users_search ON users(first_name, last_name, username, email);
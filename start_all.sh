@@ -2,7 +2,7 @@
 set -euo pipefail
 
 # start_all.sh
-# Послідовний запуск всіх сервісів: API, Webhook, Bot, Admin Panel
+# Послідовний запуск всіх сервісів: API, Webhook, Broadcast Worker, Bot, Admin Panel
 
 SCRIPT_DIR="$(cd "$(dirname "${0}")" && pwd)"
 cd "$SCRIPT_DIR"
@@ -79,6 +79,11 @@ echo "2. Webhook Server (Stripe + Telegram)"
 start_service "webhook" "webhook_server.py" "${SCRIPT_DIR}/logs/webhook.log" "8000"
 echo ""
 
+# 2a. Broadcast Worker - відправка розсилок (окремо від API)
+echo "2a. Broadcast Worker"
+start_service "broadcast_worker" "start_broadcast_worker.py" "${SCRIPT_DIR}/logs/broadcast_worker.log" ""
+echo ""
+
 # 3. Telegram Bot через Webhook (НЕ polling!)
 echo "ℹ️  Telegram Bot працює через webhook (інтегровано в Webhook Server)"
 echo "   Polling режим (main.py) вимкнено для уникнення конфліктів"
@@ -128,6 +133,8 @@ echo "API Server (8001):"
 ps aux | grep "start_api.py" | grep -v grep | awk '{print "  PID " $2}' || echo "  Не запущено"
 echo "Webhook Server (8000) - Telegram + Stripe:"
 ps aux | grep "webhook_server.py" | grep -v grep | awk '{print "  PID " $2}' || echo "  Не запущено"
+echo "Broadcast Worker:"
+ps aux | grep "start_broadcast_worker.py" | grep -v grep | awk '{print "  PID " $2}' || echo "  Не запущено"
 echo "Admin Panel (3000):"
 ps aux | grep "next" | grep -v grep | awk '{print "  PID " $2}' | head -1 || echo "  Не запущено"
 
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Upgrade Studio Bot - воркер розсилок
+
+Відправляє розсилки, створені в адмін-панелі. Можна запускати кілька
+воркерів: кожна розсилка захоплюється одним воркером через lease у БД.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+PROJECT_ROOT = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from telegram import Bot
+
+from config import settings
+from bot.broadcast_worker import BroadcastWorker
+
+# Configure logging
+logging.basicConfig(
+    level=getattr(logging, settings.log_level.upper()),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('broadcast_worker.log')
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker():
+    """Запустити воркер до отримання SIGTERM/SIGINT"""
+    async with Bot(token=settings.telegram_bot_token) as bot:
+        worker = BroadcastWorker(bot)
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+
+        await worker.run()
+
+
+def main():
+    """Start the broadcast worker"""
+    try:
+        logger.info("Starting Upgrade Studio Bot broadcast worker...")
+        asyncio.run(run_worker())
+    except Exception as e:
+        logger.error(f"Broadcast worker failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,7 @@ check_process() {
 # Перевірка сервісів
 check_process "API Server" "start_api.py" "8001"
 check_process "Webhook Server (Telegram + Stripe)" "webhook_server.py" "8000"
+check_process "Broadcast Worker" "start_broadcast_worker.py" ""
 check_process "Admin Panel (Next.js)" "next.*3000" "3000"
 
 # Перевірка polling bot (не має бути запущеним)
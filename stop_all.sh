@@ -2,7 +2,7 @@
 set -euo pipefail
 
 # stop_all.sh
-# Зупинка всіх сервісів: API, Webhook, Admin Panel
+# Зупинка всіх сервісів: API, Webhook, Broadcast Worker, Admin Panel
 
 SCRIPT_DIR="$(cd "$(dirname "${0}")" && pwd)"
 cd "$SCRIPT_DIR"
@@ -30,6 +30,7 @@ stop_by_pidfile() {
 echo "1. Зупинка за PID файлами..."
 stop_by_pidfile ".pids_api" "API Server"
 stop_by_pidfile ".pids_webhook" "Webhook Server"
+stop_by_pidfile ".pids_broadcast_worker" "Broadcast Worker"
 stop_by_pidfile ".pids_admin_panel" "Admin Panel"
 echo ""
 
@@ -46,6 +47,11 @@ if ps aux | grep "webhook_server.py" | grep -v grep >/dev/null; then
   ps aux | grep "webhook_server.py" | grep -v grep | awk '{print $2}' | xargs kill -9 2>/dev/null && echo "✓ Зупинено Webhook Server" || true
 fi
 
+# Broadcast Worker (SIGTERM: поточна розсилка звільняє lease і продовжиться після запуску)
+if ps aux | grep "start_broadcast_worker.py" | grep -v grep >/dev/null; then
+  ps aux | grep "start_broadcast_worker.py" | grep -v grep | awk '{print $2}' | xargs kill -TERM 2>/dev/null && echo "✓ Зупинено Broadcast Worker" || true
+fi
+
 # ВАЖЛИВО: НЕ зупиняємо main.py оскільки він більше не використовується (webhooks замість polling)
 # Якщо main.py запущено - це помилка, попереджаємо
 if ps aux | grep "main.py" | grep -v grep >/dev/null; then
@@ -71,9 +77,9 @@ echo ""
 echo "=== Всі сервіси зупинено ==="
 echo ""
 echo "Перевірка процесів:"
-if ps aux | grep -E "start_api.py|webhook_server.py|main.py|next" | grep -v grep >/dev/null; then
+if ps aux | grep -E "start_api.py|webhook_server.py|start_broadcast_worker.py|main.py|next" | grep -v grep >/dev/null; then
   echo "⚠️  Деякі процеси все ще працюють:"
-  ps aux | grep -E "start_api.py|webhook_server.py|main.py|next" | grep -v grep | awk '{print "  PID " $2 ": " $11}'
+  ps aux | grep -E "start_api.py|webhook_server.py|start_broadcast_worker.py|main.py|next" | grep -v grep | awk '{print "  PID " $2 ": " $11}'
 else
   echo "✓ Всі процеси зупинено"
 fi
@@ -15,8 +15,11 @@ from telegram.error import TelegramError
 
 from config import settings, Messages
 from database import DatabaseManager, Reminder, User
+from database.models import recipient_not_suppressed
+from bot.delivery_errors import PERMANENT_ERRORS, classify_error, error_message
 # from database.chain_loader import get_text  # Removed - chain_loader doesn't exist
 from payments import StripeManager
+from tasks.upload_gc import collect_upload_garbage
 
 logger = logging.getLogger(__name__)
 
@@ -72,12 +75,7 @@ class TaskScheduler:
         # Stripe надсилає події payment.succeeded напряму в webhook_server.py
         # Це економить ~200 запитів/годину та усуває затримки
         
-        # ✅ Планувальник обробки розсилок кожні 5 хвилин
-        self.scheduler.add_job(
-            self.process_broadcasts,
-            CronTrigger(minute='*/5'),  # Кожні 5 хвилин
-            id='process_broadcasts'
-        )
+        # Розсилки обробляє окремий воркер (start_broadcast_worker.py)
         
         # Планувальник очищення старих подій оплат кожен день о 03:00
         self.scheduler.add_job(
@@ -86,6 +84,20 @@ class TaskScheduler:
             id='cleanup_payment_events'
         )
         
+        # Видалення завантажених файлів, які не використовує жодна розсилка, кожен день о 04:00
+        self.scheduler.add_job(
+            self.cleanup_orphaned_uploads,
+            CronTrigger(hour=4, minute=0),
+            id='cleanup_orphaned_uploads'
+        )
+        
+        # Видалення прострочених файлів фонових експортів адмін-панелі щогодини
+        self.scheduler.add_job(
+            self.cleanup_expired_exports,
+            CronTrigger(minute=30),
+            id='cleanup_expired_exports'
+        )
+        
         self.scheduler.start()
         logger.info("Планувальник задач запущено")
     
@@ -100,6 +112,19 @@ class TaskScheduler:
             self.scheduler.shutdown()
         logger.info("Планувальник задач зупинено")
     
+    def _suppress_if_unreachable(self, telegram_id: int, error: Exception) -> bool:
+        """Додати користувача до списку недоступних, якщо помилка постійна (заблокував бота тощо)"""
+        error_code = classify_error(error)
+        if error_code not in PERMANENT_ERRORS:
+            return False
+        
+        try:
+            DatabaseManager.suppress_recipients([(telegram_id, error_code, error_message(error))])
+            logger.info(f"Користувача {telegram_id} додано до списку недоступних ({error_code})")
+        except Exception as e:
+            logger.error(f"Не вдалося додати {telegram_id} до списку недоступних: {e}")
+        return True
+    
     async def process_reminders(self):
         """Обробити всі нагадування"""
         try:
@@ -159,6 +184,7 @@ class TaskScheduler:
                 
         except TelegramError as e:
             logger.error(f"Помилка Telegram при надсиланні нагадування {reminder_data['id']}: {e}")
+            self._suppress_if_unreachable(telegram_id, e)
         except Exception as e:
             logger.error(f"Помилка при надсиланні нагадування {reminder_data['id']}: {e}")
     
@@ -429,8 +455,8 @@ class TaskScheduler:
         except Exception as e:
             logger.error(f"Помилка при плануванні нагадування про повторну оплату: {e}")
     
-    async def _remove_user_from_chats(self, telegram_id: int):
-        """Видалити користувача з приватних каналів та чатів"""
+    async def _remove_user_from_chats(self, telegram_id: int, notify: bool = True):
+        """Видалити користувача з приватних каналів та чатів (notify - надіслати пропозицію підписки)"""
         try:
             # Видаляємо з приватного каналу
             if settings.private_channel_id:
@@ -470,6 +496,9 @@ class TaskScheduler:
                 except Exception as e:
                     logger.warning(f"Помилка при видаленні з чату {telegram_id}: {e}")
             
+            if not notify:
+                return
+            
             # Надсилаємо повідомлення користувачу
             try:
                 # Створюємо checkout session для оплати
@@ -502,6 +531,7 @@ class TaskScheduler:
                 )
             except Exception as e:
                 logger.warning(f"Не вдалось надіслати повідомлення користувачу {telegram_id}: {e}")
+                self._suppress_if_unreachable(telegram_id, e)
                 
         except Exception as e:
             logger.error(f"Помилка при видаленні користувача {telegram_id} з чатів: {e}")
@@ -540,11 +570,18 @@ class TaskScheduler:
                     if not expired_batch:
                         break  # Немає більше користувачів
                     
+                    # Недоступним користувачам (заблокували бота) повідомлення не надсилаємо
+                    suppressed_ids = DatabaseManager.get_suppressed_telegram_ids(
+                        [user.telegram_id for user in expired_batch]
+                    )
+                    
                     for user in expired_batch:
                         try:
+                            reachable = user.telegram_id not in suppressed_ids
+                            
                             # Видаляємо з каналів/чатів
                             if user.joined_channel or user.joined_chat:
-                                await self._remove_user_from_chats(user.telegram_id)
+                                await self._remove_user_from_chats(user.telegram_id, notify=reachable)
                             
                             # Скидаємо статуси доступу
                             user.subscription_active = False
@@ -556,13 +593,16 @@ class TaskScheduler:
                             
                             # Відправляємо пропозицію оформити підписку знову
                             try:
-                                if self.bot_instance:
+                                if not reachable:
+                                    logger.info(f"Пропускаємо пропозицію підписки для недоступного користувача {user.telegram_id}")
+                                elif self.bot_instance:
                                     await self.bot_instance.show_subscription_offer(user.telegram_id)
                                     logger.info(f"Відправлено пропозицію підписки користувачу {user.telegram_id}")
                                 else:
                                     logger.warning(f"bot_instance не встановлено, не можемо відправити пропозицію підписки для {user.telegram_id}")
                             except Exception as e:
                                 logger.error(f"Помилка відправки пропозиції підписки користувачу {user.telegram_id}: {e}")
+                                self._suppress_if_unreachable(user.telegram_id, e)
                             
                             # Невелика затримка між користувачами (50ms)
                             await asyncio.sleep(0.05)
@@ -579,6 +619,13 @@ class TaskScheduler:
                     # Затримка між пакетами (100ms)
                     await asyncio.sleep(0.1)
             
+            if expired_count:
+                # Активні підписки змінились - статистика адмін-панелі перерахується при наступному запиті
+                try:
+                    DatabaseManager.mark_stats_stale()
+                except Exception as e:
+                    logger.error(f"Не вдалося позначити статистику застарілою: {e}")
+            
             # ЧЕРГА 2: Нагадування про призупинені підписки
             # Обробляємо також пакетами
             offset = 0
@@ -589,7 +636,8 @@ class TaskScheduler:
                         User.subscription_paused == True,
                         User.subscription_active == True,
                         User.auto_payment_enabled == False,
-                        User.subscription_end_date.isnot(None)
+                        User.subscription_end_date.isnot(None),
+                        recipient_not_suppressed()
                     ).limit(batch_size).offset(offset).all()
                     
                     if not paused_batch:
@@ -620,6 +668,7 @@ class TaskScheduler:
                                     
                                 except Exception as e:
                                     logger.error(f"Помилка надсилання нагадування користувачу {user.telegram_id}: {e}")
+                                    self._suppress_if_unreachable(user.telegram_id, e)
                                     continue
                         except Exception as e:
                             logger.error(f"Помилка обробки призупиненого користувача {user.telegram_id}: {e}")
@@ -690,7 +739,8 @@ class TaskScheduler:
                         User.auto_payment_enabled == True,
                         User.next_billing_date.isnot(None),
                         User.next_billing_date >= date_from,
-                        User.next_billing_date < date_to
+                        User.next_billing_date < date_to,
+                        recipient_not_suppressed()
                     ).limit(batch_size).offset(offset).all()
                     
                     if not users_batch:
@@ -725,6 +775,7 @@ class TaskScheduler:
                             
                         except Exception as e:
                             logger.error(f"Помилка відправки нагадування користувачу {user.telegram_id}: {e}")
+                            self._suppress_if_unreachable(user.telegram_id, e)
                             continue
                     
                     offset += batch_size
@@ -762,71 +813,98 @@ class TaskScheduler:
     # Замість polling використовуємо Stripe webhooks напряму
     # Події обробляються в webhook_server.py при отриманні payment.succeeded
     
-    async def process_broadcasts(self):
-        """Обробити pending розсилки"""
+    async def cleanup_old_payment_events(self):
+        """Очистити старі оброблені події оплат"""
         start_time = datetime.utcnow()
         try:
             DatabaseManager.create_system_log(
-                task_type='process_broadcasts',
+                task_type='cleanup_payment_events',
                 status='started',
-                message='Розпочато обробку розсилок'
+                message='Розпочато очищення старих подій оплат'
             )
             
-            # Імпорт тут щоб уникнути circular imports
-            from bot.broadcast_handler import BroadcastHandler
-            
-            handler = BroadcastHandler(self.bot)
-            await handler.process_pending_broadcasts()
+            from payment_events import cleanup_old_events
+            deleted_count = cleanup_old_events(days=7)
             
             duration = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             DatabaseManager.create_system_log(
-                task_type='process_broadcasts',
+                task_type='cleanup_payment_events',
                 status='completed',
-                message='Обробку розсилок завершено',
+                message=f'Видалено {deleted_count} старих подій оплат',
+                details={'deleted_count': deleted_count},
                 duration_ms=duration
             )
             
-            logger.info(f"✅ Broadcasts processed, time={duration}ms")
+            logger.info(f"Видалено {deleted_count} старих подій оплат")
             
         except Exception as e:
-            logger.error(f"Помилка при обробці розсилок: {e}")
+            logger.error(f"Помилка при очищенні подій оплат: {e}")
             duration = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             DatabaseManager.create_system_log(
-                task_type='process_broadcasts',
+                task_type='cleanup_payment_events',
                 status='failed',
                 message=f'Помилка: {str(e)}',
                 duration_ms=duration
             )
     
-    async def cleanup_old_payment_events(self):
-        """Очистити старі оброблені події оплат"""
+    async def cleanup_expired_exports(self):
+        """Видалити файли фонових експортів, строк зберігання яких минув"""
+        try:
+            from api.export_jobs import cleanup_expired_exports
+            
+            # Робота з файлами та БД блокуюча - виконуємо в окремому потоці
+            expired_count = await asyncio.to_thread(cleanup_expired_exports)
+            if expired_count:
+                DatabaseManager.create_system_log(
+                    task_type='cleanup_expired_exports',
+                    status='completed',
+                    message=f'Видалено {expired_count} прострочених файлів експорту',
+                    details={'expired_count': expired_count}
+                )
+                logger.info(f"Видалено {expired_count} прострочених файлів експорту")
+            
+        except Exception as e:
+            logger.error(f"Помилка при очищенні файлів експорту: {e}")
+            DatabaseManager.create_system_log(
+                task_type='cleanup_expired_exports',
+                status='failed',
+                message=f'Помилка: {str(e)}'
+            )
+    
+    async def cleanup_orphaned_uploads(self):
+        """Видалити файли розсилок без посилань (старші за період очікування)"""
         start_time = datetime.utcnow()
         try:
             DatabaseManager.create_system_log(
-                task_type='cleanup_payment_events',
+                task_type='cleanup_orphaned_uploads',
                 status='started',
-                message='Розпочато очищення старих подій оплат'
+                message='Розпочато очищення файлів розсилок без посилань'
             )
             
-            from payment_events import cleanup_old_events
-            deleted_count = cleanup_old_events(days=7)
+            # Робота з файлами та БД блокуюча - виконуємо в окремому потоці
+            stats = await asyncio.to_thread(
+                collect_upload_garbage,
+                settings.upload_gc_grace_hours * 3600,
+                settings.upload_gc_max_files
+            )
             
+            reclaimed_mb = stats['reclaimed_bytes'] / (1024 * 1024)
             duration = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             DatabaseManager.create_system_log(
-                task_type='cleanup_payment_events',
+                task_type='cleanup_orphaned_uploads',
                 status='completed',
-                message=f'Видалено {deleted_count} старих подій оплат',
-                details={'deleted_count': deleted_count},
+                message=f"Видалено {stats['deleted_files']} файлів, звільнено {reclaimed_mb:.1f} МБ",
+                details=stats,
                 duration_ms=duration
             )
             
-            logger.info(f"Видалено {deleted_count} старих подій оплат")
+            logger.info(f"Видалено {stats['deleted_files']} файлів розсилок без посилань ({reclaimed_mb:.1f} МБ)")
             
         except Exception as e:
-            logger.error(f"Помилка при очищенні подій оплат: {e}")
+            logger.error(f"Помилка при очищенні файлів розсилок: {e}")
             duration = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             DatabaseManager.create_system_log(
-                task_type='cleanup_payment_events',
+                task_type='cleanup_orphaned_uploads',
                 status='failed',
                 message=f'Помилка: {str(e)}',
                 duration_ms=duration
@@ -0,0 +1,200 @@
+"""
+Видалення завантажених файлів розсилок, які не використовує жодна розсилка.
+
+Каталог uploads/broadcasts переглядається потоково (os.scandir), кандидати
+видаляються порціями. Файл видаляється лише якщо він старший за період очікування
+(чернетка розсилки ще може на нього посилатись) і відсутній у broadcasts.attachment_url
+та message_blocks. Похідні версії видаляються разом з оригіналом, а версії, оригіналу
+яких уже немає (перервана обробка, видалення вручну), - окремим переглядом variants/.
+За один запуск видаляється не більше max_deletions файлів - решту прибере наступний запуск.
+"""
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import or_
+
+from api.media import VARIANTS_DIR_NAME
+from database.models import DatabaseManager, Broadcast, MediaFileCache
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+BROADCAST_UPLOADS_DIR = PROJECT_ROOT / "uploads" / "broadcasts"
+UPLOAD_URL_PREFIX = '/uploads/broadcasts/'
+
+# Ім'я файлу в URL вкладення (також у повних URL та JSON блоків повідомлення)
+UPLOAD_REFERENCE = re.compile(r'/uploads/broadcasts/([^"\'\s?#/\\]+)')
+GC_BATCH_SIZE = 500
+
+
+def referenced_uploads(since: Optional[datetime] = None) -> Set[str]:
+    """Імена файлів, на які посилаються розсилки (створені після since, якщо задано)"""
+    names = set()
+    pattern = f"%{UPLOAD_URL_PREFIX}%"
+    with DatabaseManager() as db:
+        query = db.query(Broadcast.attachment_url, Broadcast.message_blocks).filter(
+            or_(Broadcast.attachment_url.like(pattern), Broadcast.message_blocks.like(pattern))
+        )
+        if since is not None:
+            query = query.filter(Broadcast.created_at >= since)
+        for attachment_url, message_blocks in query.yield_per(GC_BATCH_SIZE):
+            for text in (attachment_url, message_blocks):
+                if text:
+                    names.update(UPLOAD_REFERENCE.findall(text))
+    return names
+
+
+def _delete_batch(batch: List[os.DirEntry], referenced: Set[str], since: datetime, stats: Dict[str, Any]):
+    """Видалити порцію кандидатів, перевіривши розсилки, створені під час перегляду"""
+    referenced = referenced | referenced_uploads(since)
+    deleted_paths = []
+    for entry in batch:
+        if entry.name in referenced:
+            stats['referenced_files'] += 1
+            continue
+        try:
+            size = entry.stat().st_size
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Не вдалося видалити {entry.name}: {e}")
+            stats['errors'] += 1
+            continue
+        stats['deleted_files'] += 1
+        stats['reclaimed_bytes'] += size
+        deleted_paths.append(f"uploads/broadcasts/{entry.name}")
+
+        # Похідні версії (прев'ю, версії зображення та відео для Telegram)
+        for variant in Path(entry.path).parent.joinpath(VARIANTS_DIR_NAME).glob(f"{Path(entry.name).stem}_*"):
+            try:
+                variant_size = variant.stat().st_size
+                variant.unlink()
+            except OSError:
+                continue
+            stats['reclaimed_bytes'] += variant_size
+            stats['reclaimed_variant_bytes'] += variant_size
+            deleted_paths.append(f"uploads/broadcasts/{VARIANTS_DIR_NAME}/{variant.name}")
+
+    _forget_file_ids(deleted_paths)
+
+
+def _forget_file_ids(deleted_paths: List[str]):
+    """file_id видалених файлів більше не знадобляться"""
+    if deleted_paths:
+        with DatabaseManager() as db:
+            db.query(MediaFileCache).filter(
+                MediaFileCache.file_path.in_(deleted_paths)
+            ).delete(synchronize_session=False)
+
+
+def _delete_orphaned_variants(directory: Path, original_stems: Set[str], cutoff: float,
+                              max_deletions: int, stats: Dict[str, Any]):
+    """Видалити похідні версії (<ім'я>_<версія>.<розширення>), оригіналу яких немає в каталозі"""
+    variants_dir = directory / VARIANTS_DIR_NAME
+    if not variants_dir.is_dir():
+        return
+    deleted_paths = []
+    with os.scandir(variants_dir) as entries:
+        for entry in entries:
+            if '_' not in entry.name or entry.name.rsplit('_', 1)[0] in original_stems:
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                info = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            # Версії створюються після оригіналу - свіжі могли з'явитись уже після перегляду
+            if info.st_mtime > cutoff:
+                continue
+            if stats['deleted_files'] + stats['orphaned_variants'] >= max_deletions:
+                stats['limit_reached'] = True
+                break
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Не вдалося видалити {VARIANTS_DIR_NAME}/{entry.name}: {e}")
+                stats['errors'] += 1
+                continue
+            stats['orphaned_variants'] += 1
+            stats['reclaimed_bytes'] += info.st_size
+            stats['reclaimed_variant_bytes'] += info.st_size
+            deleted_paths.append(f"uploads/broadcasts/{VARIANTS_DIR_NAME}/{entry.name}")
+            if len(deleted_paths) >= GC_BATCH_SIZE:
+                _forget_file_ids(deleted_paths)
+                deleted_paths = []
+    _forget_file_ids(deleted_paths)
+
+
+def collect_upload_garbage(grace_seconds: int, max_deletions: int,
+                           directory: Path = BROADCAST_UPLOADS_DIR) -> Dict[str, Any]:
+    """Видалити файли без посилань, старші за grace_seconds; повертає статистику для system_logs"""
+    stats = {
+        'scanned_files': 0,
+        'scanned_bytes': 0,
+        'recent_files': 0,
+        'referenced_files': 0,
+        'deleted_files': 0,
+        'orphaned_variants': 0,
+        'reclaimed_bytes': 0,
+        'reclaimed_variant_bytes': 0,
+        'errors': 0,
+        'limit_reached': False,
+    }
+    if not directory.is_dir():
+        return stats
+
+    started_at = datetime.utcnow()
+    cutoff = time.time() - grace_seconds
+    referenced = referenced_uploads()
+    # Імена (без розширення) оригіналів у каталозі - для пошуку осиротілих версій
+    original_stems: Set[str] = set()
+
+    batch: List[os.DirEntry] = []
+    queued = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                info = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+
+            stats['scanned_files'] += 1
+            stats['scanned_bytes'] += info.st_size
+            # Версії оригіналів, видалених нижче, видаляються разом з ними в _delete_batch
+            original_stems.add(Path(entry.name).stem)
+
+            if info.st_mtime > cutoff:
+                stats['recent_files'] += 1
+                continue
+            if entry.name in referenced:
+                stats['referenced_files'] += 1
+                continue
+            if queued >= max_deletions:
+                # Рахуємо зайнятий простір далі, але видалення лишаємо наступному запуску
+                stats['limit_reached'] = True
+                continue
+
+            batch.append(entry)
+            queued += 1
+            if len(batch) >= GC_BATCH_SIZE:
+                _delete_batch(batch, referenced, started_at, stats)
+                batch = []
+
+    if batch:
+        _delete_batch(batch, referenced, started_at, stats)
+
+    _delete_orphaned_variants(directory, original_stems, cutoff, max_deletions, stats)
+
+    stats['remaining_bytes'] = stats['scanned_bytes'] - (stats['reclaimed_bytes'] - stats['reclaimed_variant_bytes'])
+    return stats
@@ -0,0 +1,20 @@
+"""
+Спільні налаштування тестів: обов'язкові змінні оточення для config.Settings,
+щоб модулі, які імпортують settings, завантажувались без .env
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+for name, value in {
+    'PRIVATE_CHANNEL_ID': '-1001',
+    'PRIVATE_CHAT_ID': '-1002',
+    'ADMIN_CHAT_ID': '-1003',
+    'ADMIN_PASSWORD': 'test',
+    # Модулі API створюють engine при імпорті - не лишаємо файл БД у корені проєкту
+    'DATABASE_URL': f"sqlite:///{Path(tempfile.gettempdir()) / 'upgrade_studio_bot_tests.db'}",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,174 @@
+"""Тести компіляції розсилки в план: ті самі повідомлення, що надсилала стара відправка по блоках"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from bot import broadcast_plan
+from bot.broadcast_plan import RenderPlan, SendOperation, build_operation, compile_broadcast
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """Тимчасовий каталог uploads/ з одним зображенням і одним відео"""
+    directory = tmp_path / "broadcasts"
+    directory.mkdir()
+    (directory / "photo.png").write_bytes(b"png")
+    (directory / "clip.mp4").write_bytes(b"mp4")
+    monkeypatch.setattr(broadcast_plan, 'UPLOADS_DIR', tmp_path)
+    return directory
+
+
+def make_broadcast(blocks=None, **fields):
+    values = {
+        'id': 7,
+        'message_blocks': json.dumps(blocks) if blocks is not None else None,
+        'message_text': None,
+        'attachment_type': None,
+        'attachment_url': None,
+        'button_text': None,
+        'button_url': None,
+    }
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def button_of(operation):
+    markup = operation.kwargs['reply_markup']
+    if markup is None:
+        return None
+    button = markup.inline_keyboard[0][0]
+    return button.text, button.url
+
+
+def test_legacy_text_with_button():
+    plan = compile_broadcast(make_broadcast(message_text='Привіт', button_text='Сайт', button_url='https://example.com'))
+
+    assert len(plan) == 1
+    operation = plan.operations[0]
+    assert operation.method == 'send_message'
+    assert operation.kwargs['text'] == 'Привіт'
+    assert operation.kwargs['parse_mode'] == 'Markdown'
+    assert button_of(operation) == ('Сайт', 'https://example.com')
+
+
+def test_legacy_external_media_keeps_url():
+    plan = compile_broadcast(make_broadcast(
+        message_text='Дивись', attachment_type='video', attachment_url='https://cdn.example.com/a.mp4'
+    ))
+
+    operation = plan.operations[0]
+    assert operation.method == 'send_video'
+    assert operation.media_url == 'https://cdn.example.com/a.mp4'
+    assert operation.file_path is None
+    assert operation.kwargs['caption'] == 'Дивись'
+    assert operation.kwargs['supports_streaming'] is True
+
+
+def test_blocks_first_media_gets_text_and_button(uploads):
+    plan = compile_broadcast(make_broadcast([
+        {'type': 'text', 'content': 'Новини'},
+        {'type': 'image', 'fileUrl': '/uploads/broadcasts/photo.png'},
+        {'type': 'video', 'fileUrl': '/uploads/broadcasts/clip.mp4'},
+        {'type': 'button', 'buttonText': 'Детальніше', 'buttonUrl': 'https://example.com'},
+    ]))
+
+    first, second = plan.operations
+    assert (first.method, first.media_field) == ('send_photo', 'photo')
+    assert first.file_path == uploads / 'photo.png'
+    assert first.kwargs['caption'] == 'Новини'
+    assert first.kwargs['parse_mode'] == 'Markdown'
+    assert button_of(first) == ('Детальніше', 'https://example.com')
+
+    assert second.method == 'send_video'
+    assert second.kwargs['caption'] is None
+    assert second.kwargs['parse_mode'] is None
+    assert second.kwargs['reply_markup'] is None
+
+
+def test_blocks_media_only_gets_button(uploads):
+    plan = compile_broadcast(make_broadcast([
+        {'type': 'image', 'fileUrl': '/uploads/broadcasts/photo.png'},
+        {'type': 'button', 'buttonText': 'Кнопка', 'buttonUrl': 'https://example.com'},
+    ]))
+
+    assert len(plan) == 1
+    assert plan.operations[0].kwargs['caption'] is None
+    assert button_of(plan.operations[0]) == ('Кнопка', 'https://example.com')
+
+
+def test_subscription_button_overrides_regular_button():
+    plan = compile_broadcast(make_broadcast([
+        {'type': 'text', 'content': 'Підпишись'},
+        {'type': 'button', 'buttonText': 'Сайт', 'buttonUrl': 'https://example.com'},
+        {'type': 'subscription_button'},
+    ]), bot_username='studio_bot')
+
+    assert button_of(plan.operations[0]) == (
+        'Оформити підписку', 'https://t.me/studio_bot?start=subscription_offer'
+    )
+
+
+def test_subscription_button_alone_sends_invitation_text():
+    plan = compile_broadcast(make_broadcast([
+        {'type': 'subscription_button', 'buttonText': 'Хочу'},
+    ]), bot_username='studio_bot')
+
+    operation = plan.operations[0]
+    assert operation.method == 'send_message'
+    assert operation.kwargs['text'] == '👇'
+    assert button_of(operation) == ('Хочу', 'https://t.me/studio_bot?start=subscription_offer')
+
+
+def test_missing_local_file_is_skipped(uploads):
+    plan = compile_broadcast(make_broadcast([
+        {'type': 'text', 'content': 'Текст'},
+        {'type': 'image', 'fileUrl': '/uploads/broadcasts/photo.png'},
+        {'type': 'document', 'fileUrl': '/uploads/broadcasts/deleted.pdf'},
+    ]))
+
+    assert [operation.method for operation in plan.operations] == ['send_photo']
+
+
+def test_empty_blocks_give_empty_plan():
+    plan = compile_broadcast(make_broadcast([{'type': 'button', 'buttonText': 'x', 'buttonUrl': 'https://x.y'}]))
+
+    assert not plan
+    assert plan.broadcast_id == 7
+
+
+def test_image_uses_telegram_variant_when_present(uploads):
+    variants = uploads / 'variants'
+    variants.mkdir()
+    (variants / 'photo_telegram.jpg').write_bytes(b"jpg")
+
+    operation = build_operation(None, 'image', '/uploads/broadcasts/photo.png', None)
+
+    assert operation.file_path == variants / 'photo_telegram.jpg'
+    assert operation.media_url == '/uploads/broadcasts/photo.png'
+
+
+def test_video_uses_optimized_variant_when_present(uploads):
+    operation = build_operation(None, 'video', '/uploads/broadcasts/clip.mp4', None)
+    assert operation.file_path == uploads / 'clip.mp4'
+
+    variants = uploads / 'variants'
+    variants.mkdir()
+    (variants / 'clip_telegram.mp4').write_bytes(b"mp4")
+
+    operation = build_operation(None, 'video', '/uploads/broadcasts/clip.mp4', None)
+
+    assert operation.file_path == variants / 'clip_telegram.mp4'
+    assert operation.kwargs['supports_streaming'] is True
+
+
+def test_plan_is_immutable():
+    operation = SendOperation('send_message', text='a')
+    plan = RenderPlan(1, (operation,))
+
+    with pytest.raises(AttributeError):
+        operation.method = 'send_photo'
+    with pytest.raises(AttributeError):
+        plan.operations = ()
+    with pytest.raises(TypeError):
+        operation.kwargs['text'] = 'b'
@@ -0,0 +1,36 @@
+"""Тести класифікації помилок доставки розсилки"""
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from bot.delivery_errors import (
+    ERROR_BAD_REQUEST, ERROR_BLOCKED, ERROR_CHAT_NOT_FOUND, ERROR_DEACTIVATED, ERROR_FLOOD,
+    ERROR_FORBIDDEN, ERROR_NETWORK, ERROR_NO_CONTENT, ERROR_UNKNOWN, MAX_ERROR_MESSAGE_LENGTH,
+    PERMANENT_ERRORS, classify_error, error_message
+)
+
+
+@pytest.mark.parametrize('error, expected', [
+    (Forbidden("Forbidden: bot was blocked by the user"), ERROR_BLOCKED),
+    (Forbidden("Forbidden: user is deactivated"), ERROR_DEACTIVATED),
+    (Forbidden("Forbidden: bot can't initiate conversation with a user"), ERROR_FORBIDDEN),
+    (BadRequest("Chat not found"), ERROR_CHAT_NOT_FOUND),
+    (BadRequest("User not found"), ERROR_CHAT_NOT_FOUND),
+    (BadRequest("Can't parse entities: can't find end of the entity"), ERROR_BAD_REQUEST),
+    (RetryAfter(30), ERROR_FLOOD),
+    (TimedOut(), ERROR_NETWORK),
+    (NetworkError("Connection reset by peer"), ERROR_NETWORK),
+    (ValueError("boom"), ERROR_UNKNOWN),
+    (None, ERROR_NO_CONTENT),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+
+def test_only_unreachable_recipients_are_permanent():
+    assert set(PERMANENT_ERRORS) == {ERROR_BLOCKED, ERROR_DEACTIVATED, ERROR_CHAT_NOT_FOUND}
+    assert classify_error(BadRequest("Wrong file identifier/http url specified")) not in PERMANENT_ERRORS
+
+
+def test_error_message_is_truncated():
+    assert error_message(None) == 'No content to send'
+    assert len(error_message(BadRequest("x" * 2000))) == MAX_ERROR_MESSAGE_LENGTH
@@ -0,0 +1,86 @@
+"""Тести фільтрів і запитів експорту користувачів та платежів"""
+import io
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from api import exports
+from api.exports import build_export_query, normalize_filters, write_csv
+
+
+def test_normalize_filters_drops_empty_values():
+    filters = normalize_filters('users', {'search': '  anna ', 'subscription_status': '', 'date_from': None})
+
+    assert filters == {'search': 'anna'}
+
+
+def test_normalize_filters_converts_amounts():
+    assert normalize_filters('payments', {'min_amount': '10', 'max_amount': 25}) == {
+        'min_amount': 10.0, 'max_amount': 25.0
+    }
+
+
+@pytest.mark.parametrize('export, filters', [
+    ('orders', {}),
+    ('users', {'status': 'paid'}),
+    ('payments', {'min_amount': 'ten'}),
+])
+def test_normalize_filters_rejects_invalid_input(export, filters):
+    with pytest.raises(HTTPException) as exc_info:
+        normalize_filters(export, filters)
+    assert exc_info.value.status_code == 400
+
+
+def test_users_query_without_filters():
+    sql, params = build_export_query('users', {})
+
+    assert ' '.join(sql.split()).endswith("FROM users WHERE 1=1 ORDER BY created_at DESC, id DESC")
+    assert params == ()
+
+
+def test_users_query_with_filters():
+    sql, params = build_export_query('users', normalize_filters('users', {
+        'search': '123', 'subscription_status': 'paused', 'date_from': '2024-01-01', 'date_to': '2024-01-31'
+    }))
+
+    assert "WHERE (telegram_id = %s) AND subscription_paused = 1 AND created_at >= %s AND created_at < %s" in sql
+    assert params == (123, datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+def test_payments_query_with_filters():
+    sql, params = build_export_query('payments', normalize_filters('payments', {
+        'status': 'succeeded', 'min_amount': '5', 'max_amount': '50'
+    }))
+
+    assert "WHERE p.status = %s AND p.amount >= %s AND p.amount <= %s ORDER BY p.created_at DESC, p.id DESC" in sql
+    assert params == ('succeeded', 5.0, 50.0)
+
+
+def test_invalid_date_is_rejected():
+    with pytest.raises(HTTPException) as exc_info:
+        build_export_query('users', {'date_from': '01.02.2024'})
+    assert exc_info.value.status_code == 400
+
+
+def test_write_csv_streams_rows(monkeypatch):
+    queries = []
+
+    def fake_rows(sql, params=()):
+        queries.append((sql, params))
+        yield {
+            'id': 1, 'telegram_id': 555, 'username': 'anna', 'first_name': 'Анна', 'last_name': None,
+            'subscription_status': None, 'subscription_active': 1,
+            'subscription_end_date': datetime(2024, 3, 1, 12, 0), 'created_at': datetime(2024, 1, 1),
+            'updated_at': None,
+        }
+
+    monkeypatch.setattr(exports, 'iter_export_rows', fake_rows)
+    target = io.BytesIO()
+
+    assert write_csv('users', {'search': 'anna'}, target) == 1
+
+    lines = target.getvalue().decode('utf-8').splitlines()
+    assert lines[0].startswith('\ufeffID,Telegram ID,Username')
+    assert lines[1] == '1,555,anna,Анна,,inactive,Так,2024-03-01 12:00:00,2024-01-01 00:00:00,'
+    assert queries[0][1] == ('+anna*',)
@@ -0,0 +1,118 @@
+"""Тести читання логів з кінця файлу та від зміщення"""
+import random
+
+import pytest
+
+from api import log_reader
+from api.log_reader import read_after, read_tail
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Маленькі блоки, щоб рядки перетинали межі блоків
+    monkeypatch.setattr(log_reader, 'BLOCK_SIZE', 7)
+
+
+def write_log(tmp_path, content: bytes):
+    path = tmp_path / 'service.log'
+    path.write_bytes(content)
+    return path
+
+
+def test_tail_returns_last_complete_lines(tmp_path):
+    path = write_log(tmp_path, b'one\ntwo\nthree\nfour\npartial')
+
+    chunk = read_tail(path, 2)
+
+    assert chunk['lines'] == ['three', 'four']
+    assert chunk['start_offset'] == len(b'one\ntwo\n')
+    assert chunk['end_offset'] == len(b'one\ntwo\nthree\nfour\n')
+    assert chunk['has_more'] is True
+    assert chunk['reset'] is False
+
+
+def test_tail_before_offset_pages_backwards(tmp_path):
+    path = write_log(tmp_path, b'one\ntwo\nthree\nfour\n')
+    latest = read_tail(path, 2)
+
+    older = read_tail(path, 2, before=latest['start_offset'])
+
+    assert older['lines'] == ['one', 'two']
+    assert older['start_offset'] == 0
+    assert older['end_offset'] == latest['start_offset']
+    assert older['has_more'] is False
+
+
+def test_tail_with_grep(tmp_path):
+    path = write_log(tmp_path, b'INFO a\nERROR b\nINFO c\nerror d\nINFO e\n')
+
+    chunk = read_tail(path, 5, grep='Error')
+
+    assert chunk['lines'] == ['ERROR b', 'error d']
+
+
+def test_tail_of_file_without_newline(tmp_path):
+    path = write_log(tmp_path, b'only partial')
+
+    chunk = read_tail(path, 10)
+
+    assert chunk['lines'] == []
+    assert chunk['end_offset'] == 0
+
+
+def test_after_returns_appended_lines(tmp_path):
+    path = write_log(tmp_path, b'one\ntwo\n')
+    end = read_tail(path, 10)['end_offset']
+    with open(path, 'ab') as f:
+        f.write(b'three\nfour\nfi')
+
+    chunk = read_after(path, end, 10)
+
+    assert chunk['lines'] == ['three', 'four']
+    assert chunk['start_offset'] == end
+    assert chunk['end_offset'] == len(b'one\ntwo\nthree\nfour\n')
+    assert chunk['has_more'] is False
+
+
+def test_after_limit_sets_has_more(tmp_path):
+    path = write_log(tmp_path, b'a\nb\nc\nd\n')
+
+    chunk = read_after(path, 0, 2)
+
+    assert chunk['lines'] == ['a', 'b']
+    assert chunk['end_offset'] == 4
+    assert chunk['has_more'] is True
+    assert read_after(path, chunk['end_offset'], 2)['lines'] == ['c', 'd']
+
+
+@pytest.mark.parametrize('after', [-1, 3, 1000])
+def test_after_invalid_offset_resets_to_tail(tmp_path, after):
+    # 3 - середина рядка (файл обрізали й дописали), 1000 - за кінцем файлу
+    path = write_log(tmp_path, b'first\nsecond\n')
+
+    chunk = read_after(path, after, 1)
+
+    assert chunk['reset'] is True
+    assert chunk['lines'] == ['second']
+
+
+def test_tail_matches_naive_split(tmp_path):
+    rng = random.Random(20)
+    words = ['', 'x', 'info', 'ERROR disk full', 'довгий рядок ' * 3]
+    content = ''.join(rng.choice(words) + '\n' for _ in range(200)).encode('utf-8') + b'tail'
+    path = write_log(tmp_path, content)
+    complete = content[:content.rfind(b'\n') + 1].decode('utf-8').split('\n')[:-1]
+
+    for lines in (1, 7, 50, 500):
+        assert read_tail(path, lines)['lines'] == complete[-lines:]
+        assert read_tail(path, lines, grep='error')['lines'] == [line for line in complete if 'error' in line.lower()][-lines:]
+
+    collected = []
+    offset = 0
+    while True:
+        chunk = read_after(path, offset, 13)
+        collected.extend(chunk['lines'])
+        offset = chunk['end_offset']
+        if not chunk['has_more']:
+            break
+    assert collected == complete
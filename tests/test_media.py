@@ -0,0 +1,46 @@
+"""Тести збереження завантажень і похідних версій зображень"""
+import hashlib
+import io
+
+from PIL import Image
+
+from api.media import create_image_variants, existing_variants, store_upload, variant_path
+
+
+def image_bytes(size, image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_store_upload_names_file_by_content_hash(tmp_path):
+    content = b'x' * 1000
+
+    filename, size, deduplicated = store_upload(io.BytesIO(content), tmp_path, 'pdf', 10_000)
+
+    assert filename == f"{hashlib.sha256(content).hexdigest()}.pdf"
+    assert (size, deduplicated) == (1000, False)
+    assert store_upload(io.BytesIO(content), tmp_path, 'pdf', 10_000) == (filename, 1000, True)
+    assert [path.name for path in tmp_path.iterdir()] == [filename]
+
+
+def test_variants_leave_original_untouched(tmp_path):
+    content = image_bytes((3000, 1000))
+    filename, _, _ = store_upload(io.BytesIO(content), tmp_path, 'png', len(content))
+    path = tmp_path / filename
+
+    created = create_image_variants(str(path))
+
+    assert sorted(created) == ['preview', 'telegram']
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == path.stem
+    with Image.open(variant_path(path, 'telegram')) as img:
+        assert img.size == (2560, 853)
+    assert existing_variants(path) == {name: variant_path(path, name) for name in created}
+
+
+def test_small_jpeg_has_no_variants(tmp_path):
+    path = tmp_path / 'small.jpg'
+    path.write_bytes(image_bytes((400, 300), 'JPEG'))
+
+    assert create_image_variants(str(path)) == []
+    assert existing_variants(path) == {}
@@ -0,0 +1,87 @@
+"""Тести курсорної пагінації списків адмін-панелі"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from api.server import decode_page_cursor, encode_page_cursor, paginate_query
+
+
+class FakeCursor:
+    """Курсор, що запам'ятовує запити й повертає підготовлені рядки"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=()):
+        self.queries.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return {'total': len(self.rows)}
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 9, 30, 15, 123456)
+    token = encode_page_cursor(created_at, 42)
+
+    assert '=' not in token
+    assert decode_page_cursor(token) == (created_at, 42)
+
+
+def test_cursor_without_created_at():
+    assert decode_page_cursor(encode_page_cursor(None, 9)) == (None, 9)
+
+
+@pytest.mark.parametrize('token', ['not-base64!!', 'bm8tc2VwYXJhdG9y', 'eHx5'])
+def test_invalid_cursor_is_rejected(token):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_page_cursor(token)
+    assert exc_info.value.status_code == 400
+
+
+def test_next_cursor_points_at_last_row_of_page():
+    rows = [{'id': row_id, 'created_at': datetime(2024, 1, row_id)} for row_id in (5, 4, 3)]
+    cursor = FakeCursor(rows)
+
+    result = paginate_query(cursor, "SELECT id, created_at", "FROM broadcasts", "1=1", [], limit=2, count='none')
+
+    assert [row['id'] for row in result['rows']] == [5, 4]
+    assert decode_page_cursor(result['next_cursor']) == (datetime(2024, 1, 4), 4)
+    assert result['total'] is None
+    sql, params = cursor.queries[-1]
+    assert 'ORDER BY created_at DESC, id DESC' in sql
+    assert params == (3, 0)
+
+
+def test_after_cursor_continues_past_rows_without_date():
+    cursor = FakeCursor([])
+    after = encode_page_cursor(datetime(2024, 1, 4), 4)
+
+    paginate_query(cursor, "SELECT b.id", "FROM broadcasts b", "b.status = %s", ['sent'],
+                   limit=10, after=after, count='none', alias='b')
+
+    sql, params = cursor.queries[-1]
+    assert "(b.created_at < %s OR (b.created_at = %s AND b.id < %s) OR b.created_at IS NULL)" in sql
+    assert params == ('sent', datetime(2024, 1, 4), datetime(2024, 1, 4), 4, 11, 0)
+
+
+def test_after_null_cursor_pages_by_id():
+    cursor = FakeCursor([{'id': 2, 'created_at': None}, {'id': 1, 'created_at': None}])
+
+    result = paginate_query(cursor, "SELECT id", "FROM broadcasts", "1=1", [],
+                            limit=1, after=encode_page_cursor(None, 3), count='none')
+
+    sql, params = cursor.queries[-1]
+    assert "created_at IS NULL AND id < %s" in sql
+    assert params == (3, 2, 0)
+    assert decode_page_cursor(result['next_cursor']) == (None, 2)
+
+
+def test_invalid_count_mode_is_rejected():
+    with pytest.raises(HTTPException) as exc_info:
+        paginate_query(FakeCursor([]), "SELECT id", "FROM broadcasts", "1=1", [], limit=10, count='all')
+    assert exc_info.value.status_code == 400
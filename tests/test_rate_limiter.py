@@ -0,0 +1,109 @@
+"""Тести token bucket та обмежувача швидкості розсилки"""
+import asyncio
+
+import pytest
+
+from bot import rate_limiter
+from bot.rate_limiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """Керований час: asyncio.sleep лише зсуває годинник"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        # Справжній час завжди йде вперед; без мінімального кроку похибка float зациклила б очікування
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(rate_limiter.asyncio, 'sleep', fake.sleep)
+    return fake
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_bucket_spends_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    run(take(2))
+    assert clock.slept == []
+
+    run(take(1))
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_bucket_refill_is_capped_by_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    bucket.tokens = 0
+    clock.now += 60
+
+    assert bucket.is_idle()
+    assert bucket.tokens == 3
+
+
+def test_pause_blocks_until_deadline(clock):
+    bucket = TokenBucket(rate=5)
+    bucket.pause(3)
+    started = clock.now
+
+    run(bucket.acquire())
+
+    assert clock.now - started >= 3
+    assert not bucket.is_idle()
+
+
+def test_chat_buckets_are_independent(clock):
+    limiter = RateLimiter(global_rate=100, per_chat_rate=1, per_chat_burst=2)
+
+    async def send(chat_id, count):
+        for _ in range(count):
+            await limiter.acquire(chat_id)
+
+    run(send(1, 2))
+    run(send(2, 2))
+    assert clock.slept == []
+
+    run(send(1, 1))
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_global_pause_reported_and_applied(clock):
+    limiter = RateLimiter(global_rate=30)
+    limiter.pause(5)
+    assert limiter.paused_for == pytest.approx(5)
+
+    run(limiter.acquire(42))
+    assert limiter.paused_for == 0
+
+
+def test_idle_chat_buckets_are_dropped(clock, monkeypatch):
+    monkeypatch.setattr(RateLimiter, 'MAX_IDLE_CHAT_BUCKETS', 3)
+    limiter = RateLimiter(global_rate=100, per_chat_rate=1, per_chat_burst=1)
+
+    for chat_id in range(3):
+        run(limiter.acquire(chat_id))
+    clock.now += 10  # bucket-и чатів 0..2 повністю відновились
+    run(limiter.acquire(99))
+
+    assert list(limiter.chat_buckets) == [99]
@@ -0,0 +1,76 @@
+"""Тести списку недоступних отримувачів на SQLite-базі тестів (tests/conftest.py)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.models import DatabaseManager, Reminder, SuppressedRecipient, User, create_tables
+
+
+@pytest.fixture
+def suppressed():
+    create_tables()
+    with DatabaseManager() as db:
+        db.query(SuppressedRecipient).delete()
+        db.commit()
+    yield
+    with DatabaseManager() as db:
+        db.query(SuppressedRecipient).delete()
+        db.commit()
+
+
+def load():
+    with DatabaseManager() as db:
+        return {
+            record.telegram_id: (record.reason, record.error_message, record.failures)
+            for record in db.query(SuppressedRecipient).all()
+        }
+
+
+def test_suppress_inserts_then_updates(suppressed):
+    DatabaseManager.suppress_recipients([(1, 'blocked', 'bot was blocked'), (2, 'deactivated', None)])
+    DatabaseManager.suppress_recipients([(1, 'chat_not_found', 'Chat not found')])
+
+    assert load() == {
+        1: ('chat_not_found', 'Chat not found', 2),
+        2: ('deactivated', None, 1),
+    }
+
+
+def test_duplicates_in_one_call_count_once(suppressed):
+    DatabaseManager.suppress_recipients([(5, 'blocked', 'first'), (5, 'blocked', 'second')])
+
+    assert load() == {5: ('blocked', 'second', 1)}
+
+
+def test_unsuppress(suppressed):
+    DatabaseManager.suppress_recipients([(7, 'blocked', None)])
+
+    assert DatabaseManager.unsuppress_recipient(7) is True
+    assert DatabaseManager.unsuppress_recipient(7) is False
+    assert load() == {}
+
+
+def test_due_reminders_of_suppressed_users_are_cancelled(suppressed):
+    due = datetime.utcnow() - timedelta(minutes=1)
+    with DatabaseManager() as db:
+        users = [User(telegram_id=telegram_id) for telegram_id in (901, 902)]
+        db.add_all(users)
+        db.flush()
+        reminders = [Reminder(user_id=user.id, reminder_type='join_channel', scheduled_at=due) for user in users]
+        db.add_all(reminders)
+        db.commit()
+        reminder_ids = [reminder.id for reminder in reminders]
+    DatabaseManager.suppress_recipients([(902, 'blocked', None)])
+
+    try:
+        pending = DatabaseManager.get_pending_reminders_limited(limit=10)
+
+        assert [reminder['id'] for reminder in pending] == reminder_ids[:1]
+        with DatabaseManager() as db:
+            active = dict(db.query(Reminder.id, Reminder.is_active).filter(Reminder.id.in_(reminder_ids)).all())
+        assert active == {reminder_ids[0]: True, reminder_ids[1]: False}
+    finally:
+        with DatabaseManager() as db:
+            db.query(Reminder).filter(Reminder.id.in_(reminder_ids)).delete(synchronize_session=False)
+            db.query(User).filter(User.telegram_id.in_([901, 902])).delete(synchronize_session=False)
+            db.commit()
@@ -0,0 +1,63 @@
+"""Тести очищення файлів розсилок без посилань на SQLite-базі тестів (tests/conftest.py)"""
+import os
+import time
+
+import pytest
+
+from database.models import create_tables
+from tasks.upload_gc import collect_upload_garbage
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    create_tables()
+    (tmp_path / 'variants').mkdir()
+    return tmp_path
+
+
+def put(path, age):
+    path.write_bytes(b'x' * 10)
+    timestamp = time.time() - age
+    os.utime(path, (timestamp, timestamp))
+    return path
+
+
+def test_deletes_unreferenced_original_with_variants(uploads):
+    original = put(uploads / 'old.png', 2 * DAY)
+    variant = put(uploads / 'variants' / 'old_preview.jpg', 2 * DAY)
+    recent = put(uploads / 'new.png', 60)
+    recent_variant = put(uploads / 'variants' / 'new_preview.jpg', 60)
+
+    stats = collect_upload_garbage(DAY, 100, uploads)
+
+    assert not original.exists() and not variant.exists()
+    assert recent.exists() and recent_variant.exists()
+    assert (stats['deleted_files'], stats['recent_files'], stats['orphaned_variants']) == (1, 1, 0)
+    assert stats['reclaimed_bytes'] == 20
+
+
+def test_deletes_old_variants_without_original(uploads):
+    kept = put(uploads / 'kept.png', 60)
+    kept_variant = put(uploads / 'variants' / 'kept_telegram.jpg', 2 * DAY)
+    orphan = put(uploads / 'variants' / 'gone_telegram.mp4', 2 * DAY)
+    fresh_orphan = put(uploads / 'variants' / 'uploading_preview.jpg', 60)
+
+    stats = collect_upload_garbage(DAY, 100, uploads)
+
+    assert kept.exists() and kept_variant.exists() and fresh_orphan.exists()
+    assert not orphan.exists()
+    assert stats['orphaned_variants'] == 1
+    assert stats['reclaimed_variant_bytes'] == 10
+
+
+def test_orphaned_variants_respect_deletion_limit(uploads):
+    for name in ('a', 'b', 'c'):
+        put(uploads / 'variants' / f'{name}_preview.jpg', 2 * DAY)
+
+    stats = collect_upload_garbage(DAY, 2, uploads)
+
+    assert stats['orphaned_variants'] == 2
+    assert stats['limit_reached'] is True
+    assert len(list((uploads / 'variants').iterdir())) == 1
@@ -0,0 +1,48 @@
+"""Тести побудови умови пошуку користувачів"""
+import pytest
+
+from api.filters import build_user_search, escape_like
+
+
+@pytest.mark.parametrize('search', [None, '', '   ', '+-*"'])
+def test_empty_search_gives_no_condition(search):
+    assert build_user_search(search) == (None, [])
+
+
+def test_digits_match_telegram_id_exactly():
+    assert build_user_search(' 123456789 ') == ("telegram_id = %s", [123456789])
+
+
+def test_email_matches_exactly():
+    assert build_user_search('anna@example.com') == ("email = %s", ['anna@example.com'])
+
+
+def test_username_with_at_is_prefix_search():
+    assert build_user_search('@ann_a') == ("username LIKE %s", ['ann\\_a%'])
+
+
+def test_long_terms_use_fulltext_with_required_prefixes():
+    condition, params = build_user_search('Anna Koval')
+
+    assert condition == "MATCH(first_name, last_name, username, email) AGAINST (%s IN BOOLEAN MODE)"
+    assert params == ['+Anna* +Koval*']
+
+
+def test_short_terms_fall_back_to_prefix_like():
+    condition, params = build_user_search('Anna K%')
+
+    assert condition == (
+        "MATCH(first_name, last_name, username, email) AGAINST (%s IN BOOLEAN MODE)"
+        " AND (first_name LIKE %s OR last_name LIKE %s OR username LIKE %s)"
+    )
+    assert params == ['+Anna*', 'K\\%%', 'K\\%%', 'K\\%%']
+
+
+def test_fulltext_operators_are_stripped():
+    _, params = build_user_search('-Anna "Koval"*')
+
+    assert params == ['+Anna* +Koval*']
+
+
+def test_escape_like():
+    assert escape_like('50%_off\\') == '50\\%\\_off\\\\'
@@ -872,6 +872,11 @@ async def stripe_webhook(request: Request):
         success = False
     
     if success:
+        try:
+            # Платежі/підписки змінились - статистика адмін-панелі перерахується при наступному запиті
+            DatabaseManager.mark_stats_stale()
+        except Exception as e:
+            logger.error(f"Не вдалося позначити статистику застарілою: {e}")
         return JSONResponse(content={"status": "success", "event_type": event_type})
     else:
         raise HTTPException(status_code=500, detail=f"Failed to process {event_type}")